@@ -3,43 +3,67 @@
 
 cd 2_cmaes_validation
 
+# Number of replays run in parallel by validate.py
+JOBS=1
+
+# Seed drawing the simulation seeds (empty for random seeds). With a seed, the
+# simulations saved in the result cache (cache folder) are not run again.
+# Without a seed, the result cache is not used
+SEED=
+
+# Models validated by a previous run of this script are skipped (marker file
+# <scenario>.done, remove it to validate the models again), and an interrupted
+# validation is resumed from its estimations_all.txt file
+
 ################################################
 
 #--------------------------------------#
 # 1) Validate the isotropic model      #
 #--------------------------------------#
-echo "> Validate the isotropic models"
-python ../scripts/validate.py -models ../1_simulation_results/1-isotropic_best.txt -input ../resources/input_files -model-run ../build/bin/HMD_model_run -model-reps 1000 -validation-reps 100 -validation-range 100
-mv estimations_all.txt 1-isotropic_all.txt
-mv estimations_mean.txt 1-isotropic_mean.txt
-mv rebuilt_list_of_parameter_sets.txt 1-isotropic_replayed.txt
+if [ ! -f 1-isotropic.done ]; then
+  echo "> Validate the isotropic models"
+  python3 ../scripts/validate.py -models ../1_simulation_results/1-isotropic_best.txt -input ../resources/input_files -model-run ../build/bin/HMD_model_run -model-reps 1000 -validation-reps 100 -validation-range 100 -jobs $JOBS -resume ${SEED:+-seed $SEED} || exit 1
+  mv estimations_all.txt 1-isotropic_all.txt
+  mv estimations_mean.txt 1-isotropic_mean.txt
+  mv rebuilt_list_of_parameter_sets.txt 1-isotropic_replayed.txt
+  touch 1-isotropic.done
+fi
 
 #--------------------------------------#
 # 2) Validate the human activity model #
 #--------------------------------------#
-echo "> Validate the human activity models"
-python ../scripts/validate.py -models ../1_simulation_results/2-human_activity_best.txt -input ../resources/input_files -model-run ../build/bin/HMD_model_run -model-reps 1000 -validation-reps 100 -validation-range 100
-mv estimations_all.txt 2-human_activity_all.txt
-mv estimations_mean.txt 2-human_activity_mean.txt
-mv rebuilt_list_of_parameter_sets.txt 2-human_activity_replayed.txt
+if [ ! -f 2-human_activity.done ]; then
+  echo "> Validate the human activity models"
+  python3 ../scripts/validate.py -models ../1_simulation_results/2-human_activity_best.txt -input ../resources/input_files -model-run ../build/bin/HMD_model_run -model-reps 1000 -validation-reps 100 -validation-range 100 -jobs $JOBS -resume ${SEED:+-seed $SEED} || exit 1
+  mv estimations_all.txt 2-human_activity_all.txt
+  mv estimations_mean.txt 2-human_activity_mean.txt
+  mv rebuilt_list_of_parameter_sets.txt 2-human_activity_replayed.txt
+  touch 2-human_activity.done
+fi
 
 #--------------------------------------#
 # 3) Validate the road network model   #
 #--------------------------------------#
-echo "> Validate the road network models"
-python ../scripts/validate.py -models ../1_simulation_results/3-road_network_best.txt -input ../resources/input_files -model-run ../build/bin/HMD_model_run -model-reps 1000 -validation-reps 100 -validation-range 100
-mv estimations_all.txt 3-road_network_all.txt
-mv estimations_mean.txt 3-road_network_mean.txt
-mv rebuilt_list_of_parameter_sets.txt 3-road_network_replayed.txt
+if [ ! -f 3-road_network.done ]; then
+  echo "> Validate the road network models"
+  python3 ../scripts/validate.py -models ../1_simulation_results/3-road_network_best.txt -input ../resources/input_files -model-run ../build/bin/HMD_model_run -model-reps 1000 -validation-reps 100 -validation-range 100 -jobs $JOBS -resume ${SEED:+-seed $SEED} || exit 1
+  mv estimations_all.txt 3-road_network_all.txt
+  mv estimations_mean.txt 3-road_network_mean.txt
+  mv rebuilt_list_of_parameter_sets.txt 3-road_network_replayed.txt
+  touch 3-road_network.done
+fi
 
 #--------------------------------------#
 # 4) Validate the combined model       #
 #--------------------------------------#
-echo "> Validate the combined models"
-python ../scripts/validate.py -models ../1_simulation_results/4-combined_best.txt -input ../resources/input_files -model-run ../build/bin/HMD_model_run -model-reps 1000 -validation-reps 100 -validation-range 100
-mv estimations_all.txt 4-combined_all.txt
-mv estimations_mean.txt 4-combined_mean.txt
-mv rebuilt_list_of_parameter_sets.txt 4-combined_replayed.txt
+if [ ! -f 4-combined.done ]; then
+  echo "> Validate the combined models"
+  python3 ../scripts/validate.py -models ../1_simulation_results/4-combined_best.txt -input ../resources/input_files -model-run ../build/bin/HMD_model_run -model-reps 1000 -validation-reps 100 -validation-range 100 -jobs $JOBS -resume ${SEED:+-seed $SEED} || exit 1
+  mv estimations_all.txt 4-combined_all.txt
+  mv estimations_mean.txt 4-combined_mean.txt
+  mv rebuilt_list_of_parameter_sets.txt 4-combined_replayed.txt
+  touch 4-combined.done
+fi
 
 ################################################
 
@@ -3,6 +3,14 @@
 
 cd 3_best_models
 
+# Number of shards of repetitions run in parallel by best_model.py
+SHARDS=1
+
+# Seed drawing the simulation seeds (empty for random seeds). With a seed, the
+# simulations saved in the result cache (cache folder) are not run again.
+# Without a seed, the result cache is not used
+SEED=
+
 ################################################
 
 #--------------------------------------#
@@ -13,9 +21,7 @@ mkdir 1-isotropic
 cp -r ../resources/input_files 1-isotropic/input
 echo "> Run the best isotropic model (N=1000)"
 cd 1-isotropic
-python ../../scripts/best_model.py -validation ../../2_cmaes_validation/1-isotropic_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-reps 1000
-rm output/observed_euclidean_distribution.txt
-rm output/simulated_euclidean_distribution.txt
+python3 ../../scripts/best_model.py -validation ../../2_cmaes_validation/1-isotropic_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-reps 1000 -model-shards $SHARDS ${SEED:+-seed $SEED}
 cd ..
 
 #--------------------------------------#
@@ -26,9 +32,7 @@ mkdir 2-human_activity
 cp -r ../resources/input_files 2-human_activity/input
 echo "> Run the best human activity model (N=1000)"
 cd 2-human_activity
-python ../../scripts/best_model.py -validation ../../2_cmaes_validation/2-human_activity_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-reps 1000
-rm output/observed_euclidean_distribution.txt
-rm output/simulated_euclidean_distribution.txt
+python3 ../../scripts/best_model.py -validation ../../2_cmaes_validation/2-human_activity_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-reps 1000 -model-shards $SHARDS ${SEED:+-seed $SEED}
 cd ..
 
 #--------------------------------------#
@@ -39,9 +43,7 @@ mkdir 3-road_network
 cp -r ../resources/input_files 3-road_network/input
 echo "> Run the best road network model (N=1000)"
 cd 3-road_network
-python ../../scripts/best_model.py -validation ../../2_cmaes_validation/3-road_network_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-reps 1000
-rm output/observed_euclidean_distribution.txt
-rm output/simulated_euclidean_distribution.txt
+python3 ../../scripts/best_model.py -validation ../../2_cmaes_validation/3-road_network_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-reps 1000 -model-shards $SHARDS ${SEED:+-seed $SEED}
 cd ..
 
 #--------------------------------------#
@@ -52,9 +54,7 @@ mkdir 4-combined
 cp -r ../resources/input_files 4-combined/input
 echo "> Run the best combined model (N=1000)"
 cd 4-combined
-python ../../scripts/best_model.py -validation ../../2_cmaes_validation/4-combined_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-reps 1000
-rm output/observed_euclidean_distribution.txt
-rm output/simulated_euclidean_distribution.txt
+python3 ../../scripts/best_model.py -validation ../../2_cmaes_validation/4-combined_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-reps 1000 -model-shards $SHARDS ${SEED:+-seed $SEED}
 cd ..
 
 ################################################
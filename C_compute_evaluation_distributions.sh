@@ -3,6 +3,17 @@
 
 cd 4_models_evaluation
 
+# Engine computing the evaluation metrics (R or python)
+METRICS_ENGINE=R
+
+# Number of simulations run in parallel by evaluate.py
+JOBS=1
+
+# Seed drawing the simulation seeds (empty for random seeds). With a seed, the
+# simulations saved in the result cache (cache folder) are not run again.
+# Without a seed, the result cache is not used
+SEED=
+
 ################################################
 
 #-------------------------------------------#
@@ -13,7 +24,7 @@ mkdir 1-isotropic
 cp -r ../resources/input_files 1-isotropic/input
 echo "> Evaluate the best isotropic model"
 cd 1-isotropic
-python ../../scripts/evaluate.py -validation ../../2_cmaes_validation/1-isotropic_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-eval ../../scripts/evaluation.R -model-reps 1000 -eval-reps 100
+python3 ../../scripts/evaluate.py -validation ../../2_cmaes_validation/1-isotropic_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-eval ../../scripts/evaluation.R -model-reps 1000 -eval-reps 100 -metrics-engine $METRICS_ENGINE -jobs $JOBS ${SEED:+-seed $SEED}
 cd ..
 
 ################################################
@@ -26,7 +37,7 @@ mkdir 2-human_activity
 cp -r ../resources/input_files 2-human_activity/input
 echo "> Evaluate the best human activity model"
 cd 2-human_activity
-python ../../scripts/evaluate.py -validation ../../2_cmaes_validation/2-human_activity_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-eval ../../scripts/evaluation.R -model-reps 1000 -eval-reps 100
+python3 ../../scripts/evaluate.py -validation ../../2_cmaes_validation/2-human_activity_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-eval ../../scripts/evaluation.R -model-reps 1000 -eval-reps 100 -metrics-engine $METRICS_ENGINE -jobs $JOBS ${SEED:+-seed $SEED}
 cd ..
 
 ################################################
@@ -39,7 +50,7 @@ mkdir 3-road_network
 cp -r ../resources/input_files 3-road_network/input
 echo "> Evaluate the best road network model"
 cd 3-road_network
-python ../../scripts/evaluate.py -validation ../../2_cmaes_validation/3-road_network_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-eval ../../scripts/evaluation.R -model-reps 1000 -eval-reps 100
+python3 ../../scripts/evaluate.py -validation ../../2_cmaes_validation/3-road_network_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-eval ../../scripts/evaluation.R -model-reps 1000 -eval-reps 100 -metrics-engine $METRICS_ENGINE -jobs $JOBS ${SEED:+-seed $SEED}
 cd ..
 
 ################################################
@@ -52,7 +63,7 @@ mkdir 4-combined
 cp -r ../resources/input_files 4-combined/input
 echo "> Evaluate the best combined model"
 cd 4-combined
-python ../../scripts/evaluate.py -validation ../../2_cmaes_validation/4-combined_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-eval ../../scripts/evaluation.R -model-reps 1000 -eval-reps 100
+python3 ../../scripts/evaluate.py -validation ../../2_cmaes_validation/4-combined_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-eval ../../scripts/evaluation.R -model-reps 1000 -eval-reps 100 -metrics-engine $METRICS_ENGINE -jobs $JOBS ${SEED:+-seed $SEED}
 cd ..
 
 ################################################
@@ -3,6 +3,14 @@
 
 cd 5_models_complete_evaluation
 
+# Number of repetitions run in parallel by complete_evaluation.py
+JOBS=1
+
+# Seed drawing the simulation seeds (empty for random seeds). With a seed, the
+# simulations saved in the result cache (cache folder) are not run again.
+# Without a seed, the result cache is not used
+SEED=
+
 ################################################
 
 #-------------------------------------------#
@@ -13,7 +21,7 @@ mkdir 1-isotropic
 cp -r ../resources/input_files 1-isotropic/input
 echo "> Evaluate the best isotropic model"
 cd 1-isotropic
-python ../../scripts/complete_evaluation.py -validation ../../2_cmaes_validation/1-isotropic_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-score ../../scripts/complete_evaluation.R -model-reps 1000 -score-reps 10 -nb-params 5
+python3 ../../scripts/complete_evaluation.py -validation ../../2_cmaes_validation/1-isotropic_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-score ../../scripts/complete_evaluation.R -model-reps 1000 -score-reps 10 -nb-params 5 -jobs $JOBS ${SEED:+-seed $SEED}
 cd ..
 
 ################################################
@@ -26,7 +34,7 @@ mkdir 2-human_activity
 cp -r ../resources/input_files 2-human_activity/input
 echo "> Evaluate the best human activity model"
 cd 2-human_activity
-python ../../scripts/complete_evaluation.py -validation ../../2_cmaes_validation/2-human_activity_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-score ../../scripts/complete_evaluation.R -model-reps 1000 -score-reps 10 -nb-params 5
+python3 ../../scripts/complete_evaluation.py -validation ../../2_cmaes_validation/2-human_activity_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-score ../../scripts/complete_evaluation.R -model-reps 1000 -score-reps 10 -nb-params 5 -jobs $JOBS ${SEED:+-seed $SEED}
 cd ..
 
 ################################################
@@ -39,7 +47,7 @@ mkdir 3-road_network
 cp -r ../resources/input_files 3-road_network/input
 echo "> Evaluate the best road network model"
 cd 3-road_network
-python ../../scripts/complete_evaluation.py -validation ../../2_cmaes_validation/3-road_network_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-score ../../scripts/complete_evaluation.R -model-reps 1000 -score-reps 10 -nb-params 9
+python3 ../../scripts/complete_evaluation.py -validation ../../2_cmaes_validation/3-road_network_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-score ../../scripts/complete_evaluation.R -model-reps 1000 -score-reps 10 -nb-params 9 -jobs $JOBS ${SEED:+-seed $SEED}
 cd ..
 
 ################################################
@@ -52,7 +60,7 @@ mkdir 4-combined
 cp -r ../resources/input_files 4-combined/input
 echo "> Evaluate the best combined model"
 cd 4-combined
-python ../../scripts/complete_evaluation.py -validation ../../2_cmaes_validation/4-combined_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-score ../../scripts/complete_evaluation.R -model-reps 1000 -score-reps 10 -nb-params 9
+python3 ../../scripts/complete_evaluation.py -validation ../../2_cmaes_validation/4-combined_replayed.txt -input input -model-run ../../build/bin/HMD_model_run -model-score ../../scripts/complete_evaluation.R -model-reps 1000 -score-reps 10 -nb-params 9 -jobs $JOBS ${SEED:+-seed $SEED}
 cd ..
 
 ################################################
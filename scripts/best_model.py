@@ -1,16 +1,20 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 # coding: utf-8
 
 import os
 import sys
+import shutil
 import subprocess
 import numpy as np
+import merge_shards
+import result_cache
+import results_db
 
 ### Best model class ###
 class Best_Model:
 
   ### Contructor ###
-  def __init__( self, parameters_file, input_folder, model_run, model_reps ):
+  def __init__( self, parameters_file, input_folder, model_run, model_reps, model_shards, cache ):
     #~~~~~~~~~~~~~~~~~~~~~~~~#
     # 1) Main parameters     #
     #~~~~~~~~~~~~~~~~~~~~~~~~#
@@ -18,6 +22,8 @@ class Best_Model:
     self.__input_folder    = input_folder
     self.__model_run       = model_run
     self.__model_reps      = model_reps
+    self.__model_shards    = model_shards
+    self.__cache           = cache
     #~~~~~~~~~~~~~~~~~~~~~~~~#
     # 2) Internal parameters #
     #~~~~~~~~~~~~~~~~~~~~~~~~#
@@ -27,27 +33,15 @@ class Best_Model:
 
   ### Load the best model ###
   def load_best_model( self ):
-    f                = open(self.__parameters_file, "r")
-    variables        = f.readline().strip("\n").split(" ")
-    l                = f.readline()
-    best_replay_mean = 1e+10
-    while l:
-      l     = l.strip("\n").split(" ")
-      model = {}
-      for i in range(len(variables)):
-        model[variables[i]] = l[i]
-      if best_replay_mean > float(model["replay_mean"]):
-        best_replay_mean  = float(model["replay_mean"])
-        self.__best_model = model.copy()
-      l = f.readline()
-    f.close()
+    self.__best_model = results_db.load_best_model(self.__parameters_file)
 
   ### Build model run command line from a parameters set ###
   def __build_command_line( self ):
-    self.__command_line  = self.__model_run
-    self.__command_line += " -map "+self.__input_folder+"/map.txt"
-    self.__command_line += " -network "+self.__input_folder+"/network.txt"
-    self.__command_line += " -sample "+self.__input_folder+"/sample.txt"
+    self.__command_line  = os.path.abspath(self.__model_run)
+    self.__command_line += " -map "+os.path.abspath(self.__input_folder)+"/map.txt"
+    self.__command_line += " -network "+os.path.abspath(self.__input_folder)+"/network.txt"
+    self.__command_line += " -sample "+os.path.abspath(self.__input_folder)+"/sample.txt"
+    self.__command_line += " -landscape "+os.path.abspath(self.__input_folder)+"/landscape.bin"
     self.__command_line += " -typeofdata "+self.__best_model["typeofdata"]
     self.__command_line += " -seed "+str(np.random.randint(1,100000000))
     self.__command_line += " -reps "+str(self.__model_reps)
@@ -92,55 +86,117 @@ class Best_Model:
     self.__results["empty_score"]      = empty_score
     self.__results["score"]            = score
 
+  ### Run the shards of the model in parallel and merge their outputs ###
+  ### (same outputs as a run with one thread by shard)                 ###
+  def __run_shards( self ):
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Run every shard in its own folder, with    #
+    #    the same seed                              #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    processes = []
+    folders   = []
+    for shard in range(self.__model_shards):
+      folder = "shard_"+str(shard)
+      if os.path.isdir(folder):
+        shutil.rmtree(folder)
+      os.mkdir(folder)
+      command = self.__command_line.strip("\n")+" -shard "+str(shard)+"/"+str(self.__model_shards)
+      processes.append(subprocess.Popen([command], shell=True, cwd=folder))
+      folders.append(folder)
+    for process in processes:
+      assert process.wait() == 0, "A shard of the model failed"
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 2) Merge the shards in the output folder      #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    merge = merge_shards.Merge_Shards([folder+"/output" for folder in folders], "output")
+    merge.load_parameters()
+    output = merge.merge()
+    for folder in folders:
+      shutil.rmtree(folder)
+    return output
+
   ### Run one model session ###
+  ### (a simulation found in the result cache is copied in the output folder instead) ###
   def run_model( self ):
     self.__build_command_line()
-    model_stdout = subprocess.Popen([self.__command_line], stdout=subprocess.PIPE, shell=True)
-    output       = model_stdout.stdout.read()
+    output = None
+    if self.__cache is not None:
+      key    = self.__cache.build_command_key(self.__command_line, ["shards="+str(self.__model_shards)])
+      output = self.__cache.load(key, "output")
+    if output is None:
+      if self.__model_shards > 1:
+        output = self.__run_shards()
+      else:
+        model_stdout = subprocess.Popen([self.__command_line], stdout=subprocess.PIPE, shell=True)
+        output       = model_stdout.stdout.read().decode("utf8")
+        model_stdout.wait()
+      if self.__cache is not None:
+        self.__cache.store(key, output, "output")
     self.__read_output(output)
 
 ### Print help ###
 def printHelp():
-  print ""
-  print "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
-  print "                              * Best Model *                               "
-  print "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
-  print "Usage: python best_model.py -h or --help";
-  print "   or: python best_model.py [list of mandatory arguments]";
-  print "Options are:"
-  print "  -h, --help"
-  print "        print this help, then exit"
-  print "  -validation, --validation <validated_parameters_filename> (mandatory)"
-  print "        Specify the emplacement of the file containing the validated parameters"
-  print "  -input, --input <input files> (mandatory)"
-  print "        Specify the emplacement of the input files"
-  print "        (map.txt, network.txt, sample.txt)"
-  print "  -model-run, --model-run <Model run executable> (mandatory)"
-  print "        Specify the emplacement of model_run executable"
-  print "  -model-reps, --model-reps <model_run reps> (mandatory)"
-  print "        Specify the number of repetitions of each model simulation"
-  print ""
+  print("")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("                              * Best Model *                               ")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("Usage: python best_model.py -h or --help")
+  print("   or: python best_model.py [list of mandatory arguments]")
+  print("Options are:")
+  print("  -h, --help")
+  print("        print this help, then exit")
+  print("  -validation, --validation <validated_parameters_filename> (mandatory)")
+  print("        Specify the emplacement of the file containing the validated parameters")
+  print("  -input, --input <input files> (mandatory)")
+  print("        Specify the emplacement of the input files")
+  print("        (map.txt, network.txt, sample.txt)")
+  print("  -model-run, --model-run <Model run executable> (mandatory)")
+  print("        Specify the emplacement of model_run executable")
+  print("  -model-reps, --model-reps <model_run reps> (mandatory)")
+  print("        Specify the number of repetitions of each model simulation")
+  print("  -model-shards, --model-shards <number of shards>")
+  print("        Split the repetitions in shards run in parallel by model_run -shard,")
+  print("        and merge them with merge_shards.py (default: 1, no sharding)")
+  print("  -seed, --seed <seed>")
+  print("        Seed the draw of the simulation seed (default: random). With a seed, the")
+  print("        same simulation is run again, and found in the result cache")
+  print("  -cache, --cache <folder>")
+  print("        Specify the result cache folder (default: cache at the root of the")
+  print("        repository). Simulations are identified by the hashes of the binary and")
+  print("        of the input files, the parameter values, reps, iters and seed")
+  print("        (only used with -seed: random seeds never find a simulation again)")
+  print("  -cache-size, --cache-size <size in MB>")
+  print("        Maximal size of the result cache; the least recently used simulations")
+  print("        are removed first (default "+str(result_cache.DEFAULT_SIZE)+")")
+  print("  -no-cache, --no-cache")
+  print("        Do not use the result cache")
+  print("")
 
 ### Print header ###
 def printHeader():
-  print ""
-  print "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
-  print "                              * Best Model *                               "
-  print "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
-  print ""
+  print("")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("                              * Best Model *                               ")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("")
 
 ### Read command line arguments ###
 def readArgs( argv ):
-  arguments               = {}
-  arguments["validation"] = ""
-  arguments["input"]      = ""
-  arguments["model-run"]  = ""
-  arguments["model-reps"] = 0
-  provided                = {}
-  provided["validation"]  = False
-  provided["input"]       = False
-  provided["model-run"]   = False
-  provided["model-reps"]  = False
+  arguments                 = {}
+  arguments["validation"]   = ""
+  arguments["input"]        = ""
+  arguments["model-run"]    = ""
+  arguments["model-reps"]   = 0
+  arguments["model-shards"] = 1
+  arguments["seed"]         = 0
+  arguments["cache"]        = result_cache.DEFAULT_FOLDER
+  arguments["cache-size"]   = result_cache.DEFAULT_SIZE
+  arguments["no-cache"]     = False
+  provided                  = {}
+  provided["validation"]    = False
+  provided["input"]         = False
+  provided["model-run"]     = False
+  provided["model-reps"]    = False
   for i in range(len(argv)):
     if argv[i] == "-h" or argv[i] == "--help":
       printHelp()
@@ -157,9 +213,19 @@ def readArgs( argv ):
     if argv[i] == "-model-reps" or argv[i] == "--model-reps":
       arguments["model-reps"] = int(argv[i+1])
       provided["model-reps"]  = True
+    if argv[i] == "-model-shards" or argv[i] == "--model-shards":
+      arguments["model-shards"] = int(argv[i+1])
+    if argv[i] == "-seed" or argv[i] == "--seed":
+      arguments["seed"] = int(argv[i+1])
+    if argv[i] == "-cache" or argv[i] == "--cache":
+      arguments["cache"] = argv[i+1]
+    if argv[i] == "-cache-size" or argv[i] == "--cache-size":
+      arguments["cache-size"] = int(argv[i+1])
+    if argv[i] == "-no-cache" or argv[i] == "--no-cache":
+      arguments["no-cache"] = True
   for item in provided.items():
     if not item[1]:
-      print "You must provide a value for argument -"+item[0]
+      print("You must provide a value for argument -"+item[0])
       sys.exit()
   return arguments
 
@@ -171,6 +237,10 @@ def assertArgs( arguments ):
   assert os.path.isfile(arguments["input"]+"/sample.txt"), "The file "+arguments["input"]+"/sample.txt does not exist"
   assert os.path.isfile(arguments["model-run"]), "The file "+arguments["model-run"]+" does not exist"
   assert arguments["model-reps"] > 0, "The number of model run repetitions must be positive"
+  assert arguments["model-shards"] > 0, "The number of model run shards must be positive"
+  assert arguments["model-shards"] <= arguments["model-reps"], "The number of model run shards must not exceed the number of repetitions"
+  assert arguments["seed"] >= 0, "The seed must not be negative"
+  assert arguments["cache-size"] > 0, "The size of the result cache must be positive"
 
 
 ######################
@@ -189,7 +259,12 @@ if __name__ == '__main__':
   #~~~~~~~~~~~~~~~~~~~#
   # 2) Run the model  #
   #~~~~~~~~~~~~~~~~~~~#
-  best_model = Best_Model(arguments["validation"], arguments["input"], arguments["model-run"], arguments["model-reps"])
+  if arguments["seed"] > 0:
+    np.random.seed(arguments["seed"])
+  cache = None
+  if arguments["seed"] > 0 and not arguments["no-cache"]:
+    cache = result_cache.Result_Cache(arguments["cache"], arguments["cache-size"])
+  best_model = Best_Model(arguments["validation"], arguments["input"], arguments["model-run"], arguments["model-reps"], arguments["model-shards"], cache)
   best_model.load_best_model()
   best_model.run_model()
 
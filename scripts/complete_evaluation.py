@@ -1,121 +1,213 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 # coding: utf-8
 
 import os
 import sys
-import time
+import shutil
+import tempfile
 import subprocess
 import numpy as np
+from multiprocessing.pool import ThreadPool
+import result_cache
+import results_db
 
 ### Evaluate2 class ###
 class Evaluate2:
 
   ### Contructor ###
-  def __init__( self, parameters_file, input_folder, model_run, model_score, model_reps, nb_params ):
+  def __init__( self, parameters_file, input_folder, model_run, model_score, model_reps, nb_params, score_reps, jobs, scratch, cache ):
     #~~~~~~~~~~~~~~~~~~~~~~~~#
     # 1) Main parameters     #
     #~~~~~~~~~~~~~~~~~~~~~~~~#
     self.__parameters_file = parameters_file
-    self.__input_folder    = input_folder
-    self.__model_run       = model_run
-    self.__model_score     = model_score
+    self.__input_folder    = os.path.abspath(input_folder)
+    self.__model_run       = os.path.abspath(model_run)
+    self.__model_score     = os.path.abspath(model_score)
     self.__model_reps      = model_reps
     self.__nb_params       = nb_params
+    self.__score_reps      = score_reps
+    self.__jobs            = jobs
+    self.__scratch         = scratch
+    self.__cache           = cache
 
     #~~~~~~~~~~~~~~~~~~~~~~~~#
     # 2) Internal parameters #
     #~~~~~~~~~~~~~~~~~~~~~~~~#
-    self.__best_model   = {}
-    self.__command_line = ""
+    self.__best_model = {}
 
   ### Load the best model ###
   def load_best_model( self ):
-    f                = open(self.__parameters_file, "r")
-    variables        = f.readline().strip("\n").split(" ")
-    l                = f.readline()
-    best_replay_mean = 1e+10
-    while l:
-      l     = l.strip("\n").split(" ")
-      model = {}
-      for i in range(len(variables)):
-        model[variables[i]] = l[i]
-      if best_replay_mean > float(model["replay_mean"]):
-        best_replay_mean  = float(model["replay_mean"])
-        self.__best_model = model.copy()
-      l = f.readline()
-    f.close()
+    self.__best_model = results_db.load_best_model(self.__parameters_file)
 
   ### Build model_run command line from a parameters set ###
-  def __build_command_line( self ):
-    self.__command_line  = self.__model_run
-    self.__command_line += " -map "+self.__input_folder+"/map.txt"
-    self.__command_line += " -network "+self.__input_folder+"/network.txt"
-    self.__command_line += " -sample "+self.__input_folder+"/sample.txt"
-    self.__command_line += " -typeofdata "+self.__best_model["typeofdata"]
-    self.__command_line += " -seed "+str(np.random.randint(1,100000000))
-    self.__command_line += " -reps "+str(self.__model_reps)
-    self.__command_line += " -iters "+self.__best_model["iters"]
-    self.__command_line += " -law "+self.__best_model["law"]
-    self.__command_line += " -optimfunc "+self.__best_model["optimfunc"]
-    self.__command_line += " -humanactivity "+self.__best_model["humanactivity"]
-    self.__command_line += " -xintro "+self.__best_model["xintro"]
-    self.__command_line += " -yintro "+self.__best_model["yintro"]
-    self.__command_line += " -pintro "+self.__best_model["pintro"]
-    self.__command_line += " -lambda "+self.__best_model["lambda"]
-    self.__command_line += " -mu "+self.__best_model["mu"]
-    self.__command_line += " -sigma "+self.__best_model["sigma"]
-    self.__command_line += " -gamma "+self.__best_model["gamma"]
-    self.__command_line += " -w1 "+self.__best_model["w1"]
-    self.__command_line += " -w2 "+self.__best_model["w2"]
-    self.__command_line += " -w3 "+self.__best_model["w3"]
-    self.__command_line += " -w4 "+self.__best_model["w4"]
-    self.__command_line += " -w5 "+self.__best_model["w5"]
-    self.__command_line += " -w6 "+self.__best_model["w6"]
-    self.__command_line += " -wmin "+self.__best_model["wmin"]
-    self.__command_line += " -save-outputs -save-all-states\n"
-
-  ### Run one complete evaluation ###
-  def complete_evaluation( self ):
-    self.__build_command_line()
-    model_stdout = subprocess.Popen([self.__command_line], stdout=subprocess.PIPE, shell=True)
-    command_line = "Rscript "+self.__model_score+" "+os.getcwd()+" "+str(self.__best_model["iters"])+" "+str(self.__nb_params)+"\n"
-    os.system(command_line)
+  def __build_command_line( self, seed ):
+    command_line  = self.__model_run
+    command_line += " -map "+self.__input_folder+"/map.txt"
+    command_line += " -network "+self.__input_folder+"/network.txt"
+    command_line += " -sample "+self.__input_folder+"/sample.txt"
+    command_line += " -landscape "+self.__input_folder+"/landscape.bin"
+    command_line += " -typeofdata "+self.__best_model["typeofdata"]
+    command_line += " -seed "+str(seed)
+    command_line += " -reps "+str(self.__model_reps)
+    command_line += " -iters "+self.__best_model["iters"]
+    command_line += " -law "+self.__best_model["law"]
+    command_line += " -optimfunc "+self.__best_model["optimfunc"]
+    command_line += " -humanactivity "+self.__best_model["humanactivity"]
+    command_line += " -xintro "+self.__best_model["xintro"]
+    command_line += " -yintro "+self.__best_model["yintro"]
+    command_line += " -pintro "+self.__best_model["pintro"]
+    command_line += " -lambda "+self.__best_model["lambda"]
+    command_line += " -mu "+self.__best_model["mu"]
+    command_line += " -sigma "+self.__best_model["sigma"]
+    command_line += " -gamma "+self.__best_model["gamma"]
+    command_line += " -w1 "+self.__best_model["w1"]
+    command_line += " -w2 "+self.__best_model["w2"]
+    command_line += " -w3 "+self.__best_model["w3"]
+    command_line += " -w4 "+self.__best_model["w4"]
+    command_line += " -w5 "+self.__best_model["w5"]
+    command_line += " -w6 "+self.__best_model["w6"]
+    command_line += " -wmin "+self.__best_model["wmin"]
+    command_line += " -save-outputs -save-all-states"
+    return command_line
+
+  ### Run one complete evaluation in its own scratch folder ###
+  def __complete_evaluation( self, rep_seed ):
+    rep, seed = rep_seed
+    workdir   = tempfile.mkdtemp(prefix="complete_evaluation_"+str(rep)+"_", dir=self.__scratch)
+    devnull   = open(os.devnull, "w")
+    try:
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      # 1) Run the simulation and wait for    #
+      #    its outputs (or copy them from the #
+      #    result cache)                      #
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      command_line = self.__build_command_line(seed)
+      output       = None
+      if self.__cache is not None:
+        key    = self.__cache.build_command_key(command_line)
+        output = self.__cache.load(key, os.path.join(workdir, "output"))
+      if output is None:
+        status = subprocess.call(command_line, shell=True, cwd=workdir, stdout=devnull)
+        assert status == 0, "The simulation of repetition "+str(rep)+" failed"
+        if self.__cache is not None:
+          self.__cache.store(key, "", os.path.join(workdir, "output"))
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      # 2) Score every time step              #
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      command_line = "Rscript "+self.__model_score+" "+workdir+" "+str(self.__best_model["iters"])+" "+str(self.__nb_params)
+      status       = subprocess.call(command_line, shell=True, stdout=devnull)
+      assert status == 0, "The scoring of repetition "+str(rep)+" failed"
+      g     = open(os.path.join(workdir, "complete_evaluation.txt"), "r")
+      lines = g.readlines()
+      g.close()
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      # 3) Keep the outputs of the last       #
+      #    repetition in the output folder    #
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      if rep == self.__score_reps:
+        shutil.rmtree("output", ignore_errors=True)
+        shutil.move(os.path.join(workdir, "output"), "output")
+    finally:
+      devnull.close()
+      shutil.rmtree(workdir, ignore_errors=True)
+    return rep, lines
+
+  ### Run the complete evaluations and gather them in complete_evaluation_all.txt ###
+  def run_complete_evaluations( self ):
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Draw the seeds in repetition order #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    reps = [(i+1, np.random.randint(1,100000000)) for i in range(self.__score_reps)]
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 2) Run the repetitions and write them #
+    #    in order                           #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    pool = None
+    if self.__jobs > 1:
+      pool    = ThreadPool(self.__jobs)
+      results = pool.imap(self.__complete_evaluation, reps)
+    else:
+      results = (self.__complete_evaluation(rep_seed) for rep_seed in reps)
+    f = open("complete_evaluation_all.txt", "w")
+    try:
+      for rep, lines in results:
+        print("> Repetition "+str(rep)+"/"+str(self.__score_reps))
+        if rep == 1:
+          f.write("rep "+lines[0])
+        for l in lines[1:]:
+          f.write(str(rep)+" "+l)
+        f.flush()
+    finally:
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      # A failing repetition drops the ones   #
+      # not started, and waits for the        #
+      # running ones (they remove their       #
+      # scratch folders)                      #
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      f.close()
+      if pool is not None:
+        pool.terminate()
+        pool.join()
 
 ### Print help ###
 def printHelp():
-  print ""
-  print "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
-  print "                          * Complete Evaluation *                          "
-  print "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
-  print "Usage: python complete_evaluation.py -h or --help";
-  print "   or: python complete_evaluation.py [list of mandatory arguments]";
-  print "Options are:"
-  print "  -h, --help"
-  print "        print this help, then exit"
-  print "  -validation, --validation <validated_parameters_filename> (mandatory)"
-  print "        Specify the emplacement of the file containing the validated parameters"
-  print "  -input, --input <input files> (mandatory)"
-  print "        Specify the emplacement of the input files"
-  print "        (map.txt, network.txt, sample.txt)"
-  print "  -model-run, --model-run <model_run executable> (mandatory)"
-  print "        Specify the emplacement of model_run executable"
-  print "  -model-score, --model-score <model score> (mandatory)"
-  print "        Specify the emplacement of complete_evaluation.R script"
-  print "  -model-reps, --model-reps <model_run reps> (mandatory)"
-  print "        Specify the number of repetitions of each model simulation"
-  print "  -score-reps, --score-reps <SCORE reps> (mandatory)"
-  print "        Specify the number of repetitions to compute score distributions"
-  print "  -nb-params, --nb-params <Nb parameters> (mandatory)"
-  print "        Specify the number of optimized parameters"
-  print ""
+  print("")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("                          * Complete Evaluation *                          ")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("Usage: python complete_evaluation.py -h or --help")
+  print("   or: python complete_evaluation.py [list of mandatory arguments]")
+  print("Options are:")
+  print("  -h, --help")
+  print("        print this help, then exit")
+  print("  -validation, --validation <validated_parameters_filename> (mandatory)")
+  print("        Specify the emplacement of the file containing the validated parameters")
+  print("  -input, --input <input files> (mandatory)")
+  print("        Specify the emplacement of the input files")
+  print("        (map.txt, network.txt, sample.txt)")
+  print("  -model-run, --model-run <model_run executable> (mandatory)")
+  print("        Specify the emplacement of model_run executable")
+  print("  -model-score, --model-score <model score> (mandatory)")
+  print("        Specify the emplacement of complete_evaluation.R script")
+  print("  -model-reps, --model-reps <model_run reps> (mandatory)")
+  print("        Specify the number of repetitions of each model simulation")
+  print("  -score-reps, --score-reps <SCORE reps> (mandatory)")
+  print("        Specify the number of repetitions to compute score distributions")
+  print("  -nb-params, --nb-params <Nb parameters> (mandatory)")
+  print("        Specify the number of optimized parameters")
+  print("  -jobs, --jobs <number of jobs>")
+  print("        Number of repetitions run at the same time (default 1)")
+  print("  -scratch, --scratch <folder>")
+  print("        Folder of the scratch folders of the repetitions (default /dev/shm")
+  print("        when available, else the current folder)")
+  print("  -seed, --seed <seed>")
+  print("        Seed the draw of the simulation seeds (default: random). With a seed, the")
+  print("        same simulations are run again, and found in the result cache")
+  print("  -cache, --cache <folder>")
+  print("        Specify the result cache folder (default: cache at the root of the")
+  print("        repository). Simulations are identified by the hashes of the binary and")
+  print("        of the input files, the parameter values, reps, iters and seed")
+  print("        (only used with -seed: random seeds never find a simulation again)")
+  print("  -cache-size, --cache-size <size in MB>")
+  print("        Maximal size of the result cache; the least recently used simulations")
+  print("        are removed first (default "+str(result_cache.DEFAULT_SIZE)+")")
+  print("  -no-cache, --no-cache")
+  print("        Do not use the result cache")
+  print("")
 
 ### Print header ###
 def printHeader():
-  print ""
-  print "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
-  print "                          * Complete Evaluation *                          "
-  print "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
-  print ""
+  print("")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("                          * Complete Evaluation *                          ")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("")
+
+### Scratch folder of the repetitions (tmpfs when available) ###
+def default_scratch():
+  if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+    return "/dev/shm"
+  return os.getcwd()
 
 ### Read command line arguments ###
 def readArgs( argv ):
@@ -127,6 +219,12 @@ def readArgs( argv ):
   arguments["model-reps"]  = 0
   arguments["score-reps"]  = 0
   arguments["nb-params"]   = 0
+  arguments["jobs"]        = 1
+  arguments["scratch"]     = default_scratch()
+  arguments["seed"]        = 0
+  arguments["cache"]       = result_cache.DEFAULT_FOLDER
+  arguments["cache-size"]  = result_cache.DEFAULT_SIZE
+  arguments["no-cache"]    = False
   provided                 = {}
   provided["validation"]   = False
   provided["input"]        = False
@@ -160,9 +258,21 @@ def readArgs( argv ):
     if argv[i] == "-nb-params" or argv[i] == "--nb-params":
       arguments["nb-params"] = int(argv[i+1])
       provided["nb-params"]  = True
+    if argv[i] == "-jobs" or argv[i] == "--jobs":
+      arguments["jobs"] = int(argv[i+1])
+    if argv[i] == "-scratch" or argv[i] == "--scratch":
+      arguments["scratch"] = argv[i+1]
+    if argv[i] == "-seed" or argv[i] == "--seed":
+      arguments["seed"] = int(argv[i+1])
+    if argv[i] == "-cache" or argv[i] == "--cache":
+      arguments["cache"] = argv[i+1]
+    if argv[i] == "-cache-size" or argv[i] == "--cache-size":
+      arguments["cache-size"] = int(argv[i+1])
+    if argv[i] == "-no-cache" or argv[i] == "--no-cache":
+      arguments["no-cache"] = True
   for item in provided.items():
     if not item[1]:
-      print "You must provide a value for argument -"+item[0]
+      print("You must provide a value for argument -"+item[0])
       sys.exit()
   return arguments
 
@@ -177,6 +287,10 @@ def assertArgs( arguments ):
   assert arguments["model-reps"] > 0, "The number of model_run repetitions must be positive"
   assert arguments["score-reps"] > 0, "The number of score repetitions must be positive"
   assert arguments["nb-params"] > 0, "The number of optimized parameters must be positive"
+  assert arguments["jobs"] > 0, "The number of jobs must be positive"
+  assert os.path.isdir(arguments["scratch"]), "The folder "+arguments["scratch"]+" does not exist"
+  assert arguments["seed"] >= 0, "The seed must not be negative"
+  assert arguments["cache-size"] > 0, "The size of the result cache must be positive"
 
 
 ######################
@@ -195,22 +309,11 @@ if __name__ == '__main__':
   #~~~~~~~~~~~~~~~~~~~#
   # 2) Run the model  #
   #~~~~~~~~~~~~~~~~~~~#
-  f = open("complete_evaluation_all.txt", "w")
-  for i in range(arguments["score-reps"]):
-    print("> Repetition "+str(i+1)+"/"+str(arguments["score-reps"]))
-    sim = Evaluate2(arguments["validation"], arguments["input"], arguments["model-run"], arguments["model-score"], arguments["model-reps"], arguments["nb-params"])
-    sim.load_best_model()
-    results = sim.complete_evaluation()
-    g       = open("complete_evaluation.txt", "r")
-    l       = g.readline()
-    if i == 0:
-      f.write("rep "+l)
-    l = g.readline()
-    while l:
-      f.write(str(i+1)+" "+l)
-      l = g.readline()
-    g.close()
-    f.flush()
-    time.sleep(1)
-  f.close()
-
+  if arguments["seed"] > 0:
+    np.random.seed(arguments["seed"])
+  cache = None
+  if arguments["seed"] > 0 and not arguments["no-cache"]:
+    cache = result_cache.Result_Cache(arguments["cache"], arguments["cache-size"])
+  sim = Evaluate2(arguments["validation"], arguments["input"], arguments["model-run"], arguments["model-score"], arguments["model-reps"], arguments["nb-params"], arguments["score-reps"], arguments["jobs"], arguments["scratch"], cache)
+  sim.load_best_model()
+  sim.run_complete_evaluations()
@@ -3,86 +3,106 @@
 
 import os
 import sys
-import subprocess
+import shutil
+import asyncio
+import tempfile
 import numpy as np
+import evaluation
+import result_cache
+import results_db
 
 ### Evaluate class ###
 class Evaluate:
 
   ### Contructor ###
-  def __init__( self, parameters_file, input_folder, model_run, model_evaluation, model_reps ):
+  def __init__( self, parameters_file, input_folder, model_run, model_evaluation, model_reps, metrics_engine, eval_reps, jobs, cache, database, scenario ):
     #~~~~~~~~~~~~~~~~~~~~~~~~#
     # 1) Main parameters     #
     #~~~~~~~~~~~~~~~~~~~~~~~~#
     self.__parameters_file = parameters_file
-    self.__input_folder    = input_folder
-    self.__model_run       = model_run
+    self.__input_folder    = os.path.abspath(input_folder)
+    self.__model_run       = os.path.abspath(model_run)
     self.__model_eval      = model_evaluation
     self.__model_reps      = model_reps
+    self.__metrics_engine  = metrics_engine
+    self.__eval_reps       = eval_reps
+    self.__jobs            = jobs
+    self.__cache           = cache
+    self.__database        = database
+    self.__scenario        = scenario
     #~~~~~~~~~~~~~~~~~~~~~~~~#
     # 2) Internal parameters #
     #~~~~~~~~~~~~~~~~~~~~~~~~#
-    self.__best_model   = {}
-    self.__command_line = ""
-    self.__results      = {}
+    self.__best_model = {}
+    self.__rows       = {}
+    self.__next_rep   = 1
+    self.__table      = None
 
   ### Load the best model ###
   def load_best_model( self ):
-    f                = open(self.__parameters_file, "r")
-    variables        = f.readline().strip("\n").split(" ")
-    l                = f.readline()
-    best_replay_mean = 1e+10
-    while l:
-      l     = l.strip("\n").split(" ")
-      model = {}
-      for i in range(len(variables)):
-        model[variables[i]] = l[i]
-      if best_replay_mean > float(model["replay_mean"]):
-        best_replay_mean  = float(model["replay_mean"])
-        self.__best_model = model.copy()
-      l = f.readline()
-    f.close()
+    self.__best_model = results_db.load_best_model(self.__parameters_file)
 
   ### Build model_run command line from a parameters set ###
-  def __build_command_line( self ):
-    self.__command_line  = self.__model_run
-    self.__command_line += " -map "+self.__input_folder+"/map.txt"
-    self.__command_line += " -network "+self.__input_folder+"/network.txt"
-    self.__command_line += " -sample "+self.__input_folder+"/sample.txt"
-    self.__command_line += " -typeofdata "+self.__best_model["typeofdata"]
-    self.__command_line += " -seed "+str(np.random.randint(1,100000000))
-    self.__command_line += " -reps "+str(self.__model_reps)
-    self.__command_line += " -iters "+self.__best_model["iters"]
-    self.__command_line += " -law "+self.__best_model["law"]
-    self.__command_line += " -optimfunc "+self.__best_model["optimfunc"]
-    self.__command_line += " -humanactivity "+self.__best_model["humanactivity"]
-    self.__command_line += " -xintro "+self.__best_model["xintro"]
-    self.__command_line += " -yintro "+self.__best_model["yintro"]
-    self.__command_line += " -pintro "+self.__best_model["pintro"]
-    self.__command_line += " -lambda "+self.__best_model["lambda"]
-    self.__command_line += " -mu "+self.__best_model["mu"]
-    self.__command_line += " -sigma "+self.__best_model["sigma"]
-    self.__command_line += " -gamma "+self.__best_model["gamma"]
-    self.__command_line += " -w1 "+self.__best_model["w1"]
-    self.__command_line += " -w2 "+self.__best_model["w2"]
-    self.__command_line += " -w3 "+self.__best_model["w3"]
-    self.__command_line += " -w4 "+self.__best_model["w4"]
-    self.__command_line += " -w5 "+self.__best_model["w5"]
-    self.__command_line += " -w6 "+self.__best_model["w6"]
-    self.__command_line += " -wmin "+self.__best_model["wmin"]
-    self.__command_line += " -save-outputs\n"
+  def __build_command_line( self, seed ):
+    command_line  = self.__model_run
+    command_line += " -map "+self.__input_folder+"/map.txt"
+    command_line += " -network "+self.__input_folder+"/network.txt"
+    command_line += " -sample "+self.__input_folder+"/sample.txt"
+    command_line += " -landscape "+self.__input_folder+"/landscape.bin"
+    command_line += " -typeofdata "+self.__best_model["typeofdata"]
+    command_line += " -seed "+str(seed)
+    command_line += " -reps "+str(self.__model_reps)
+    command_line += " -iters "+self.__best_model["iters"]
+    command_line += " -law "+self.__best_model["law"]
+    command_line += " -optimfunc "+self.__best_model["optimfunc"]
+    command_line += " -humanactivity "+self.__best_model["humanactivity"]
+    command_line += " -xintro "+self.__best_model["xintro"]
+    command_line += " -yintro "+self.__best_model["yintro"]
+    command_line += " -pintro "+self.__best_model["pintro"]
+    command_line += " -lambda "+self.__best_model["lambda"]
+    command_line += " -mu "+self.__best_model["mu"]
+    command_line += " -sigma "+self.__best_model["sigma"]
+    command_line += " -gamma "+self.__best_model["gamma"]
+    command_line += " -w1 "+self.__best_model["w1"]
+    command_line += " -w2 "+self.__best_model["w2"]
+    command_line += " -w3 "+self.__best_model["w3"]
+    command_line += " -w4 "+self.__best_model["w4"]
+    command_line += " -w5 "+self.__best_model["w5"]
+    command_line += " -w6 "+self.__best_model["w6"]
+    command_line += " -wmin "+self.__best_model["wmin"]
+    command_line += " -save-outputs"
+    return command_line
+
+  ### Run a command line and return its standard output ###
+  ### (the process is killed if the task is cancelled)  ###
+  async def __run_process( self, command_line, message, cwd=None ):
+    process = await asyncio.create_subprocess_shell(command_line, stdout=asyncio.subprocess.PIPE, cwd=cwd)
+    try:
+      stdout = (await process.communicate())[0].decode("utf8")
+    except asyncio.CancelledError:
+      try:
+        process.kill()
+      except ProcessLookupError:
+        pass
+      await process.wait()
+      raise
+    assert process.returncode == 0, message
+    return stdout
 
-  ### Evaluate the model ###
-  def __evaluate_model( self ):
+  ### Evaluate the model saved in a working folder ###
+  async def __evaluate_model( self, workdir ):
+    if self.__metrics_engine == "python":
+      loop = asyncio.get_running_loop()
+      return await loop.run_in_executor(None, evaluation.evaluate_final_state, os.path.join(workdir, "output", "final_state.txt"))
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~#
-    # 1) Run the python script  #
+    # 1) Run the R script       #
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~#
-    command_line = "Rscript "+self.__model_eval+" "+os.getcwd()+"\n"
-    score_stdout = subprocess.Popen([command_line], stdout=subprocess.PIPE, shell=True, encoding='utf8')
+    command_line = "Rscript "+self.__model_eval+" "+workdir
+    score_stdout = await self.__run_process(command_line, "The evaluation of "+workdir+" failed")
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~#
     # 2) Extract the AUROC data #
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~#
-    output = score_stdout.stdout.read().strip("\n").split("\n")
+    output = score_stdout.strip("\n").split("\n")
     N      = len(output)
     result = {}
     for i in range(1, N):
@@ -92,7 +112,7 @@ class Evaluate:
     return result
 
   ### Read the standard output from model_run ###
-  def __read_output( self, output ):
+  def __read_output( self, output, result ):
     #~~~~~~~~~~~~~~~~~~~~~~#
     # 1) Read model ouput  #
     #~~~~~~~~~~~~~~~~~~~~~~#
@@ -102,39 +122,156 @@ class Evaluate:
     max_likelihood   = float(output[2])
     empty_score      = float(output[3])
     score            = float(output[4])
-    result           = self.__evaluate_model()
     #~~~~~~~~~~~~~~~~~~~~~~#
     # 2) Build the results #
     #~~~~~~~~~~~~~~~~~~~~~~#
-    self.__results                     = {}
-    self.__results["likelihood"]       = likelihood
-    self.__results["empty_likelihood"] = empty_likelihood
-    self.__results["max_likelihood"]   = max_likelihood
-    self.__results["empty_score"]      = empty_score
-    self.__results["score"]            = score
-    self.__results["AUC"]              = result["AUC"]
-    self.__results["d_th"]             = result["d_th"]
-    self.__results["d"]                = result["d"]
-    self.__results["TPR"]              = result["TPR"]
-    self.__results["FPR"]              = result["FPR"]
-    self.__results["ACC_th"]           = result["ACC_th"]
-    self.__results["ACC"]              = result["ACC"]
-    self.__results["F1_th"]            = result["F1_th"]
-    self.__results["F1"]               = result["F1"]
-    self.__results["KAPPA_th"]         = result["KAPPA_th"]
-    self.__results["KAPPA"]            = result["KAPPA"]
-    self.__results["QDIS"]             = result["QDIS"]
-    self.__results["ADIS"]             = result["ADIS"]
-    self.__results["TSS_th"]           = result["TSS_th"]
-    self.__results["TSS"]              = result["TSS"]
+    results                     = {}
+    results["likelihood"]       = likelihood
+    results["empty_likelihood"] = empty_likelihood
+    results["max_likelihood"]   = max_likelihood
+    results["empty_score"]      = empty_score
+    results["score"]            = score
+    results["AUC"]              = result["AUC"]
+    results["d_th"]             = result["d_th"]
+    results["d"]                = result["d"]
+    results["TPR"]              = result["TPR"]
+    results["FPR"]              = result["FPR"]
+    results["ACC_th"]           = result["ACC_th"]
+    results["ACC"]              = result["ACC"]
+    results["F1_th"]            = result["F1_th"]
+    results["F1"]               = result["F1"]
+    results["KAPPA_th"]         = result["KAPPA_th"]
+    results["KAPPA"]            = result["KAPPA"]
+    results["QDIS"]             = result["QDIS"]
+    results["ADIS"]             = result["ADIS"]
+    results["TSS_th"]           = result["TSS_th"]
+    results["TSS"]              = result["TSS"]
+    return results
+
+  ### Build a line of score_distribution.txt ###
+  def __build_line( self, rep, results ):
+    line  = str(rep)
+    line += " "+str(results["likelihood"])
+    line += " "+str(results["empty_likelihood"])
+    line += " "+str(results["max_likelihood"])
+    line += " "+str(results["empty_score"])
+    line += " "+str(results["score"])
+    line += " "+str(results["AUC"])
+    line += " "+str(results["d_th"])
+    line += " "+str(results["d"])
+    line += " "+str(results["TPR"])
+    line += " "+str(results["FPR"])
+    line += " "+str(results["ACC_th"])
+    line += " "+str(results["ACC"])
+    line += " "+str(results["F1_th"])
+    line += " "+str(results["F1"])
+    line += " "+str(results["KAPPA_th"])
+    line += " "+str(results["KAPPA"])
+    line += " "+str(results["QDIS"])
+    line += " "+str(results["ADIS"])
+    line += " "+str(results["TSS_th"])
+    line += " "+str(results["TSS"])
+    return line+"\n"
+
+  ### Simulate the next repetitions in their own working folder (producer) ###
+  ### (simulations found in the result cache are copied instead)          ###
+  async def __simulate( self, reps, queue ):
+    for rep, seed in reps:
+      workdir = tempfile.mkdtemp(prefix="rep_"+str(rep)+"_", dir=os.getcwd())
+      try:
+        command_line = self.__build_command_line(seed)
+        output       = None
+        loop         = asyncio.get_running_loop()
+        if self.__cache is not None:
+          key    = self.__cache.build_command_key(command_line)
+          output = await loop.run_in_executor(None, self.__cache.load, key, os.path.join(workdir, "output"))
+        if output is None:
+          output = await self.__run_process(command_line, "The simulation of repetition "+str(rep)+" failed", workdir)
+          if self.__cache is not None:
+            await loop.run_in_executor(None, self.__cache.store, key, output, os.path.join(workdir, "output"))
+        await queue.put((rep, workdir, output))
+      except BaseException:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
 
-  ### Run one model session ###
-  def run_model( self ):
-    self.__build_command_line()
-    model_stdout = subprocess.Popen([self.__command_line], stdout=subprocess.PIPE, shell=True, encoding='utf8')
-    output       = model_stdout.stdout.read()
-    self.__read_output(output)
-    return self.__results
+  ### Score the simulated repetitions and write them by REP order (consumer) ###
+  async def __score( self, queue, f ):
+    while True:
+      item = await queue.get()
+      if item is None:
+        return
+      rep, workdir, output = item
+      try:
+        result           = await self.__evaluate_model(workdir)
+        self.__rows[rep] = self.__build_line(rep, self.__read_output(output, result))
+        #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+        # 1) Keep the outputs of the last       #
+        #    repetition in the output folder    #
+        #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+        if rep == self.__eval_reps:
+          shutil.rmtree("output", ignore_errors=True)
+          os.replace(os.path.join(workdir, "output"), "output")
+      finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      # 2) Write the lines that are ready     #
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      while self.__next_rep in self.__rows:
+        print("> Repetition "+str(self.__next_rep)+"/"+str(self.__eval_reps))
+        line = self.__rows.pop(self.__next_rep)
+        f.write(line)
+        f.flush()
+        if self.__table is not None:
+          self.__table.write(line)
+        self.__next_rep += 1
+
+  ### Wait for the producers, then stop the consumers ###
+  async def __produce( self, queue, producers ):
+    await asyncio.gather(*producers)
+    for i in range(self.__jobs):
+      await queue.put(None)
+
+  ### Run the simulations and the scoring concurrently ###
+  ### (the first failure cancels the other tasks)       ###
+  async def __run_pipeline( self, f, seeds ):
+    queue     = asyncio.Queue(maxsize=self.__jobs)
+    reps      = iter([(i+1, seeds[i]) for i in range(self.__eval_reps)])
+    producers = [asyncio.ensure_future(self.__simulate(reps, queue)) for i in range(self.__jobs)]
+    consumers = [asyncio.ensure_future(self.__score(queue, f)) for i in range(self.__jobs)]
+    tasks     = producers+consumers+[asyncio.ensure_future(self.__produce(queue, producers))]
+    try:
+      await asyncio.gather(*tasks)
+    finally:
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      # Cancel the remaining tasks and remove #
+      # the folders left in the queue         #
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      for task in tasks:
+        task.cancel()
+      await asyncio.gather(*tasks, return_exceptions=True)
+      while not queue.empty():
+        item = queue.get_nowait()
+        if item is not None:
+          shutil.rmtree(item[1], ignore_errors=True)
+
+  ### Run the evaluation repetitions ###
+  def run_evaluation( self ):
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Draw the seeds in REP order        #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    seeds = [np.random.randint(1,100000000) for i in range(self.__eval_reps)]
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 2) Simulate and score the repetitions #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    header = "REP likelihood empty_likelihood max_likelihood empty_score score AUC d_th d TPR FPR ACC_th ACC F1_th F1 KAPPA_th KAPPA QDIS ADIS TSS_th TSS\n"
+    f      = open("score_distribution.txt", "w")
+    f.write(header)
+    if self.__database != "":
+      self.__table = results_db.Table_Writer(self.__database, "evaluations", self.__scenario, header)
+    asyncio.run(self.__run_pipeline(f, seeds))
+    f.close()
+    if self.__table is not None:
+      self.__table.close()
 
 ### Print help ###
 def printHelp():
@@ -154,12 +291,37 @@ def printHelp():
   print("        (map.txt, network.txt, sample.txt)")
   print("  -model-run, --model-run <model-run executable> (mandatory)")
   print("        Specify the emplacement of model_run executable")
-  print("  -model-eval, --model-eval <model evaluation script> (mandatory)")
+  print("  -model-eval, --model-eval <model evaluation script> (mandatory with R)")
   print("        Specify the emplacement of evaluation.R script")
+  print("  -metrics-engine, --metrics-engine <R|python>")
+  print("        Compute the evaluation metrics with evaluation.R (R, default)")
+  print("        or in-process with evaluation.py (python)")
+  print("  -jobs, --jobs <number of jobs>")
+  print("        Number of simulations run at the same time (default 1). Each repetition")
+  print("        runs in its own working folder and is scored while the next ones are")
+  print("        simulated; lines stay ordered by REP")
   print("  -model-reps, --model-reps <model_run reps> (mandatory)")
   print("        Specify the number of repetitions of each model simulation")
   print("  -eval-reps, --eval-reps <evaluation reps> (mandatory)")
   print("        Specify the number of evaluation repetitions")
+  print("  -seed, --seed <seed>")
+  print("        Seed the draw of the simulation seeds (default: random). With a seed, the")
+  print("        same simulations are run again, and found in the result cache")
+  print("  -cache, --cache <folder>")
+  print("        Specify the result cache folder (default: cache at the root of the")
+  print("        repository). Simulations are identified by the hashes of the binary and")
+  print("        of the input files, the parameter values, reps, iters and seed")
+  print("        (only used with -seed: random seeds never find a simulation again)")
+  print("  -cache-size, --cache-size <size in MB>")
+  print("        Maximal size of the result cache; the least recently used simulations")
+  print("        are removed first (default "+str(result_cache.DEFAULT_SIZE)+")")
+  print("  -no-cache, --no-cache")
+  print("        Do not use the result cache")
+  print("  -db, --db <database>")
+  print("        Also append the scores to this SQLite results database (see")
+  print("        results_db.py), one transaction by repetition")
+  print("  -scenario, --scenario <name>")
+  print("        Name of the scenario in the results database (e.g. 1-isotropic)")
   print("")
 
 ### Print header ###
@@ -172,20 +334,28 @@ def printHeader():
 
 ### Read command line arguments ###
 def readArgs( argv ):
-  arguments               = {}
-  arguments["validation"] = ""
-  arguments["input"]      = ""
-  arguments["model-run"]  = ""
-  arguments["model-eval"] = ""
-  arguments["model-reps"] = 0
-  arguments["eval-reps"]  = 0
-  provided                = {}
-  provided["validation"]  = False
-  provided["input"]       = False
-  provided["model-run"]   = False
-  provided["model-eval"]  = False
-  provided["model-reps"]  = False
-  provided["eval-reps"]   = False
+  arguments                   = {}
+  arguments["validation"]     = ""
+  arguments["input"]          = ""
+  arguments["model-run"]      = ""
+  arguments["model-eval"]     = ""
+  arguments["model-reps"]     = 0
+  arguments["eval-reps"]      = 0
+  arguments["metrics-engine"] = "R"
+  arguments["jobs"]           = 1
+  arguments["seed"]           = 0
+  arguments["cache"]          = result_cache.DEFAULT_FOLDER
+  arguments["cache-size"]     = result_cache.DEFAULT_SIZE
+  arguments["no-cache"]       = False
+  arguments["db"]             = ""
+  arguments["scenario"]       = ""
+  provided                    = {}
+  provided["validation"]      = False
+  provided["input"]           = False
+  provided["model-run"]       = False
+  provided["model-eval"]      = False
+  provided["model-reps"]      = False
+  provided["eval-reps"]       = False
   for i in range(len(argv)):
     if argv[i] == "-h" or argv[i] == "--help":
       printHelp()
@@ -208,6 +378,24 @@ def readArgs( argv ):
     if argv[i] == "-eval-reps" or argv[i] == "--eval-reps":
       arguments["eval-reps"] = int(argv[i+1])
       provided["eval-reps"]  = True
+    if argv[i] == "-metrics-engine" or argv[i] == "--metrics-engine":
+      arguments["metrics-engine"] = argv[i+1]
+    if argv[i] == "-jobs" or argv[i] == "--jobs":
+      arguments["jobs"] = int(argv[i+1])
+    if argv[i] == "-seed" or argv[i] == "--seed":
+      arguments["seed"] = int(argv[i+1])
+    if argv[i] == "-cache" or argv[i] == "--cache":
+      arguments["cache"] = argv[i+1]
+    if argv[i] == "-cache-size" or argv[i] == "--cache-size":
+      arguments["cache-size"] = int(argv[i+1])
+    if argv[i] == "-no-cache" or argv[i] == "--no-cache":
+      arguments["no-cache"] = True
+    if argv[i] == "-db" or argv[i] == "--db":
+      arguments["db"] = argv[i+1]
+    if argv[i] == "-scenario" or argv[i] == "--scenario":
+      arguments["scenario"] = argv[i+1]
+  if arguments["metrics-engine"] == "python":
+    provided["model-eval"] = True
   for item in provided.items():
     if not item[1]:
       print("You must provide a value for argument -"+item[0])
@@ -221,9 +409,14 @@ def assertArgs( arguments ):
   assert os.path.isfile(arguments["input"]+"/network.txt"), "The file "+arguments["input"]+"/network.txt does not exist"
   assert os.path.isfile(arguments["input"]+"/sample.txt"), "The file "+arguments["input"]+"/sample.txt does not exist"
   assert os.path.isfile(arguments["model-run"]), "The file "+arguments["model-run"]+" does not exist"
-  assert os.path.isfile(arguments["model-eval"]), "The file "+arguments["model-eval"]+" does not exist"
+  assert arguments["metrics-engine"] in ["R", "python"], "The metrics engine must be R or python"
+  assert arguments["metrics-engine"] == "python" or os.path.isfile(arguments["model-eval"]), "The file "+arguments["model-eval"]+" does not exist"
   assert arguments["model-reps"] > 0, "The number of model_run repetitions must be positive"
   assert arguments["eval-reps"] > 0, "The number of evaluation repetitions must be positive"
+  assert arguments["jobs"] > 0, "The number of jobs must be positive"
+  assert arguments["seed"] >= 0, "The seed must not be negative"
+  assert arguments["cache-size"] > 0, "The size of the result cache must be positive"
+  assert arguments["db"] == "" or arguments["scenario"] != "", "The results database needs a scenario name (-scenario)"
 
 
 ######################
@@ -242,35 +435,12 @@ if __name__ == '__main__':
   #~~~~~~~~~~~~~~~~~~~#
   # 2) Run the model  #
   #~~~~~~~~~~~~~~~~~~~#
-  f = open("score_distribution.txt", "w")
-  f.write("REP likelihood empty_likelihood max_likelihood empty_score score AUC d_th d TPR FPR ACC_th ACC F1_th F1 KAPPA_th KAPPA QDIS ADIS TSS_th TSS\n")
-  for i in range(arguments["eval-reps"]):
-    print("> Repetition "+str(i+1)+"/"+str(arguments["eval-reps"]))
-    sim = Evaluate(arguments["validation"], arguments["input"], arguments["model-run"], arguments["model-eval"], arguments["model-reps"])
-    sim.load_best_model()
-    results  = sim.run_model()
-    line     = str(i+1)
-    line    += " "+str(results["likelihood"])
-    line    += " "+str(results["empty_likelihood"])
-    line    += " "+str(results["max_likelihood"])
-    line    += " "+str(results["empty_score"])
-    line    += " "+str(results["score"])
-    line    += " "+str(results["AUC"])
-    line    += " "+str(results["d_th"])
-    line    += " "+str(results["d"])
-    line    += " "+str(results["TPR"])
-    line    += " "+str(results["FPR"])
-    line    += " "+str(results["ACC_th"])
-    line    += " "+str(results["ACC"])
-    line    += " "+str(results["F1_th"])
-    line    += " "+str(results["F1"])
-    line    += " "+str(results["KAPPA_th"])
-    line    += " "+str(results["KAPPA"])
-    line    += " "+str(results["QDIS"])
-    line    += " "+str(results["ADIS"])
-    line    += " "+str(results["TSS_th"])
-    line    += " "+str(results["TSS"])
-    f.write(line+"\n")
-    f.flush()
-  f.close()
+  if arguments["seed"] > 0:
+    np.random.seed(arguments["seed"])
+  cache = None
+  if arguments["seed"] > 0 and not arguments["no-cache"]:
+    cache = result_cache.Result_Cache(arguments["cache"], arguments["cache-size"])
+  sim = Evaluate(arguments["validation"], arguments["input"], arguments["model-run"], arguments["model-eval"], arguments["model-reps"], arguments["metrics-engine"], arguments["eval-reps"], arguments["jobs"], cache, arguments["db"], arguments["scenario"])
+  sim.load_best_model()
+  sim.run_evaluation()
 
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import os
+import sys
+import numpy as np
+
+### Load the observed and simulated presences of final_state.txt ###
+def load_final_state( filename ):
+  f       = open(filename, "r")
+  columns = f.readline().strip("\n").split(" ")
+  f.close()
+  data    = np.loadtxt(filename, skiprows=1, usecols=(columns.index("p_obs"), columns.index("n_obs"), columns.index("p_sim")), ndmin=2)
+  return data[:,0], data[:,1], data[:,2]
+
+### Compute evaluation metrics ###
+### (one value per threshold TH, as in evaluation.R) ###
+def compute_evaluation_metrics( p_obs, n_obs, p_sim, resolution = 0.001 ):
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  # 1) Count positives and negatives for  #
+  #    every threshold at once            #
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  TH         = np.arange(int(round(1.0/resolution))+1)*resolution
+  presences  = np.sort(p_sim[(p_obs > 0) & (n_obs > 0)])
+  absences   = np.sort(p_sim[(p_obs == 0) & (n_obs > 0)])
+  fn         = np.searchsorted(presences, TH, side="left").astype(float)
+  tn         = np.searchsorted(absences, TH, side="left").astype(float)
+  tp         = float(len(presences))-fn
+  fp         = float(len(absences))-tn
+  N          = tp+fp+tn+fn
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  # 2) Compute various metrics            #
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  with np.errstate(divide="ignore", invalid="ignore"):
+    metrics          = {}
+    metrics["TH"]    = TH
+    metrics["TP"]    = tp
+    metrics["FP"]    = fp
+    metrics["TN"]    = tn
+    metrics["FN"]    = fn
+    metrics["TPR"]   = tp/(tp+fn)
+    metrics["FPR"]   = 1.0-tn/(fp+tn)
+    metrics["PREC"]  = tp/(tp+fp)
+    metrics["TSS"]   = (tp*tn-fp*fn)/((tp+fn)*(fp+tn))
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 3) Compute Kappa metrics              #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    N1  = tp+fp
+    N2  = fn+tn
+    p11 = tp/(tp+fp)*N1/N
+    p10 = fp/(tp+fp)*N1/N
+    p01 = fn/(fn+tn)*N2/N
+    p00 = tn/(fn+tn)*N2/N
+    s1j = p11+p10 # First line
+    s0j = p01+p00 # Second line
+    sj1 = p11+p01 # First column
+    sj0 = p10+p00 # Second column
+    # -> quantity disagreement
+    q1  = np.abs(sj1-s1j)
+    q0  = np.abs(sj0-s0j)
+    # -> allocation disagreement
+    a1  = 2.0*np.minimum(sj1-p11, s1j-p11)
+    a0  = 2.0*np.minimum(sj0-p00, s0j-p00)
+    # -> standard Kappa
+    C   = p11+p00
+    E   = sj1*s1j+sj0*s0j
+    metrics["QDIS"]  = (q1+q0)/2.0
+    metrics["ADIS"]  = (a1+a0)/2.0
+    metrics["KAPPA"] = (C-E)/(1.0-E)
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 4) Compute the other indices          #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    metrics["d"]   = np.sqrt(metrics["TPR"]**2+(1.0-metrics["FPR"])**2)
+    metrics["CSI"] = tp/(tp+fn+fp)
+    metrics["ACC"] = (tp+tn)/(tp+tn+fn+fp)
+    metrics["F1"]  = 2.0*tp/(2.0*tp+fn+fp)
+    metrics["MCC"] = (tp*tn-fp*fn)/np.sqrt((tp+fp)*(tp+fn)*(tn+fp)*(tn+fn))
+  return metrics
+
+### Compute the area under the ROC curve ###
+def compute_AUC( metrics ):
+  order = np.argsort(metrics["FPR"], kind="stable")
+  FPR   = metrics["FPR"][order]
+  TPR   = metrics["TPR"][order]
+  return np.sum((FPR[1:]-FPR[:-1])*(TPR[:-1]+TPR[1:])/2.0)
+
+### Get maximum index value with associated threshold value ###
+### (first threshold in case of ties, NaN values ignored;   ###
+### first threshold if all values are NaN, as order in R)   ###
+def get_maximum( metrics, index_name, index_list ):
+  best = 0
+  if not np.all(np.isnan(metrics[index_name])):
+    best = np.nanargmax(metrics[index_name])
+  return [metrics[index][best] for index in index_list]
+
+### Extract the best metrics ###
+def build_best_metrics( metrics ):
+  values  = [compute_AUC(metrics)]
+  values += get_maximum(metrics, "d", ["TH", "d", "TPR", "FPR"])
+  values += get_maximum(metrics, "ACC", ["TH", "ACC"])
+  values += get_maximum(metrics, "F1", ["TH", "F1"])
+  values += get_maximum(metrics, "KAPPA", ["TH", "KAPPA", "QDIS", "ADIS"])
+  values += get_maximum(metrics, "TSS", ["TH", "TSS"])
+  names   = ["AUC", "d_th", "d", "TPR", "FPR", "ACC_th", "ACC", "F1_th", "F1", "KAPPA_th", "KAPPA", "QDIS", "ADIS", "TSS_th", "TSS"]
+  result  = {}
+  for i in range(len(names)):
+    result[names[i]] = float(values[i])
+  return result
+
+### Evaluate the final state of a simulation ###
+def evaluate_final_state( filename ):
+  p_obs, n_obs, p_sim = load_final_state(filename)
+  metrics             = compute_evaluation_metrics(p_obs, n_obs, p_sim)
+  return build_best_metrics(metrics)
+
+
+######################
+#        MAIN        #
+######################
+
+if __name__ == '__main__':
+  WORKDIR = sys.argv[1]
+  result  = evaluate_final_state(os.path.join(WORKDIR, "output", "final_state.txt"))
+  for name in result.keys():
+    print(name+" "+str(result[name]))
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import os
+import sys
+import numpy as np
+
+### Binary landscape file written by HMD_model_run -landscape (see Landscape::write_cache) ###
+CACHE_VERSION = 2
+HEADER        = np.dtype([("magic", "S8"), ("version", np.int32), ("road_categories", np.int32),
+                          ("nb_cells", np.int32), ("nb_edges", np.int32), ("nb_slots", np.int32), ("nb_samples", np.int32),
+                          ("map_hash", np.uint64), ("network_hash", np.uint64), ("sample_hash", np.uint64),
+                          ("mean_population_density", np.float64), ("max_population_density", np.float64)])
+ARRAYS        = [("identifier", np.int32, "nb_cells"), ("x", np.float64, "nb_cells"), ("y", np.float64, "nb_cells"),
+                 ("node_area", np.float64, "nb_cells"), ("suitable_area", np.float64, "nb_cells"),
+                 ("population", np.float64, "nb_cells"), ("population_density", np.float64, "nb_cells"),
+                 ("road_density", np.float64, "nb_cells"), ("human_activity", np.float64, "nb_cells"),
+                 ("edge_identifier1", np.int32, "nb_edges"), ("edge_identifier2", np.int32, "nb_edges"),
+                 ("edge_roads", np.float64, "nb_roads"), ("offsets", np.int32, "nb_offsets"),
+                 ("neighbors", np.int32, "nb_slots"), ("slot_edges", np.int32, "nb_slots"),
+                 ("sample_identifier", np.int32, "nb_samples"), ("sample_y", np.float64, "nb_samples"),
+                 ("sample_n", np.float64, "nb_samples"), ("kdtree", np.int32, "nb_cells")]
+
+### Compute the 64 bits FNV-1a hash of a file (as Landscape::compute_file_hash) ###
+def compute_file_hash( filename ):
+  f    = open(filename, "rb")
+  data = f.read()
+  f.close()
+  hash = 14695981039346656037
+  for byte in data:
+    hash = ((hash^byte)*1099511628211)&0xFFFFFFFFFFFFFFFF
+  return hash
+
+### Load a binary landscape file ###
+### (the arrays are read-only views of the memory-mapped file) ###
+def load_landscape( filename ):
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  # 1) Map the file and check the header  #
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  data   = np.memmap(filename, dtype=np.uint8, mode="r")
+  header = data[0:HEADER.itemsize].view(HEADER)[0]
+  assert header["magic"] == b"HMDLAND", "The file "+filename+" is not a binary landscape file"
+  assert header["version"] == CACHE_VERSION, "The binary landscape file "+filename+" has another format version"
+  landscape = {}
+  for name in HEADER.names[1:]:
+    landscape[name] = header[name].item()
+  sizes               = dict(landscape)
+  sizes["nb_roads"]   = landscape["nb_edges"]*landscape["road_categories"]
+  sizes["nb_offsets"] = landscape["nb_cells"]+1
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  # 2) Build the array views              #
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  offset = HEADER.itemsize
+  for name, dtype, size in ARRAYS:
+    length          = sizes[size]*np.dtype(dtype).itemsize
+    landscape[name] = data[offset:offset+length].view(dtype)
+    offset         += length+(8-length%8)%8
+  assert offset == len(data), "The binary landscape file "+filename+" is truncated or corrupted"
+  landscape["edge_roads"] = landscape["edge_roads"].reshape(landscape["nb_edges"], landscape["road_categories"])
+  return landscape
+
+### Check that a binary landscape file was compiled from the given input files ###
+def is_up_to_date( landscape, map_filename, network_filename, sample_filename ):
+  return (landscape["map_hash"] == compute_file_hash(map_filename) and
+          landscape["network_hash"] == compute_file_hash(network_filename) and
+          landscape["sample_hash"] == compute_file_hash(sample_filename))
+
+### Update the best cells of the points with a list of (point, cell) candidates ###
+### (smallest distance, then smallest cell)                                   ###
+def update_best_cells( landscape, x, y, point, cell, best_cell, best_dist ):
+  dx   = x[point]-landscape["x"][cell]
+  dy   = y[point]-landscape["y"][cell]
+  dist = np.sqrt(dx*dx+dy*dy)
+  min_dist = best_dist.copy()
+  np.minimum.at(min_dist, point, dist)
+  min_cell = np.where(min_dist == best_dist, best_cell, np.iinfo(np.int64).max)
+  tie      = (dist == min_dist[point])
+  np.minimum.at(min_cell, point[tie], cell[tie])
+  best_dist[:] = min_dist
+  best_cell[:] = min_cell
+  return dx, dy
+
+### Get the identifiers of the cells closest to a list of points ###
+### (search of the KD-tree of the file, same cells as HMD_model_run: ###
+### smallest distance, first cell of the map in case of ties)        ###
+def get_cells_from_coordinates( landscape, x, y ):
+  x         = np.atleast_1d(np.asarray(x, dtype=np.float64))
+  y         = np.atleast_1d(np.asarray(y, dtype=np.float64))
+  kdtree    = np.asarray(landscape["kdtree"], dtype=np.int64)
+  best_cell = np.full(len(x), np.iinfo(np.int32).max, dtype=np.int64)
+  best_dist = np.full(len(x), np.inf)
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  # 1) Descend to the leaf of each point  #
+  #    to get a first best cell           #
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  point = np.arange(len(x))
+  first = np.zeros(len(x), dtype=np.int64)
+  last  = np.full(len(x), landscape["nb_cells"], dtype=np.int64)
+  depth = 0
+  while len(point) > 0:
+    middle = first+(last-first)//2
+    dx, dy = update_best_cells(landscape, x, y, point, kdtree[middle], best_cell, best_dist)
+    left   = ((dx if depth%2 == 0 else dy) < 0.0)
+    first  = np.where(left, first, middle+1)
+    last   = np.where(left, middle, last)
+    keep   = (first < last)
+    point, first, last = point[keep], first[keep], last[keep]
+    depth += 1
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  # 2) Search the tree level by level for #
+  #    all the points at once, skipping   #
+  #    the ranges farther than the best   #
+  #    cell (ties are kept)               #
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  point = np.arange(len(x))
+  first = np.zeros(len(x), dtype=np.int64)
+  last  = np.full(len(x), landscape["nb_cells"], dtype=np.int64)
+  bound = np.zeros(len(x))
+  depth = 0
+  while len(point) > 0:
+    keep   = (first < last)&(bound <= best_dist[point])
+    point, first, last = point[keep], first[keep], last[keep]
+    middle = first+(last-first)//2
+    dx, dy = update_best_cells(landscape, x, y, point, kdtree[middle], best_cell, best_dist)
+    delta  = (dx if depth%2 == 0 else dy)
+    far    = np.sqrt(delta*delta)
+    point  = np.concatenate((point, point))
+    bound  = np.concatenate((np.where(delta < 0.0, 0.0, far), np.where(delta < 0.0, far, 0.0)))
+    first, last = np.concatenate((first, middle+1)), np.concatenate((middle, last))
+    depth += 1
+  return landscape["identifier"][best_cell]
+
+### Get the identifier of the cell closest to a point ###
+### (first cell of the map in case of ties, as in HMD_model_run) ###
+def get_cell_from_coordinates( landscape, x, y ):
+  return int(get_cells_from_coordinates(landscape, [x], [y])[0])
+
+### Load the introduction coordinates of a parameters file (e.g. 1_simulation_results/*_best.txt) ###
+def load_introduction_coordinates( filename ):
+  f      = open(filename, "r")
+  header = f.readline().strip("\n").split(" ")
+  x      = []
+  y      = []
+  l      = f.readline()
+  while l:
+    l = l.strip("\n").split(" ")
+    x.append(float(l[header.index("xintro")]))
+    y.append(float(l[header.index("yintro")]))
+    l = f.readline()
+  f.close()
+  return np.array(x), np.array(y)
+
+######################
+#        MAIN        #
+######################
+
+if __name__ == '__main__':
+  INPUT     = sys.argv[1]
+  landscape = load_landscape(os.path.join(INPUT, "landscape.bin"))
+  print("cells "+str(landscape["nb_cells"]))
+  print("edges "+str(landscape["nb_edges"]))
+  print("samples "+str(landscape["nb_samples"]))
+  print("up_to_date "+str(is_up_to_date(landscape, os.path.join(INPUT, "map.txt"), os.path.join(INPUT, "network.txt"), os.path.join(INPUT, "sample.txt"))))
+  if len(sys.argv) > 2:
+    x, y  = load_introduction_coordinates(sys.argv[2])
+    cells = get_cells_from_coordinates(landscape, x, y)
+    print("xintro yintro cell_id")
+    for i in range(len(cells)):
+      print(str(x[i])+" "+str(y[i])+" "+str(cells[i]))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import os
+import sys
+import itertools
+import numpy as np
+
+### Binary lineage tree file written by HMD_model_run -lineage BINARY (see Simulation::write_lineage) ###
+LINEAGE_VERSION = 1
+HEADER          = np.dtype([("magic", "S8"), ("version", np.int32), ("record_size", np.int32)])
+RECORD          = np.dtype([("repetition", np.int32), ("start_node", np.int32), ("end_node", np.int32), ("iteration", np.int32),
+                            ("geodesic_dist", np.float64), ("euclidean_dist", np.float64)])
+TEXT_COLUMNS    = ["repetition", "start_node", "end_node", "geodesic_dist", "euclidean_dist", "iteration"]
+
+### Read a lineage tree chunk by chunk (binary lineage_tree.bin or text lineage_tree.txt) ###
+### (yields arrays of at most chunk_size records, with the RECORD layout)              ###
+def read_lineage( filename, chunk_size=1000000 ):
+  f = open(filename, "rb")
+  if f.read(8) == b"HMDLINEA":
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Binary records                     #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    f.seek(0)
+    header = np.frombuffer(f.read(HEADER.itemsize), dtype=HEADER)[0]
+    assert header["version"] == LINEAGE_VERSION, "The binary lineage tree "+filename+" has another format version"
+    assert header["record_size"] == RECORD.itemsize, "The binary lineage tree "+filename+" has another record layout"
+    while True:
+      records = np.fromfile(f, dtype=RECORD, count=chunk_size)
+      if len(records) == 0:
+        break
+      yield records
+  else:
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 2) Text lines                         #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    f.seek(0)
+    f.readline()
+    while True:
+      lines = list(itertools.islice(f, chunk_size))
+      if len(lines) == 0:
+        break
+      data    = np.loadtxt(lines, ndmin=2)
+      records = np.zeros(len(data), dtype=RECORD)
+      for i, name in enumerate(TEXT_COLUMNS):
+        records[name] = data[:,i]
+      yield records
+  f.close()
+
+### Add counts to a growing histogram ###
+def add_counts( histogram, bins ):
+  counts = np.bincount(bins)
+  if len(counts) > len(histogram):
+    histogram = np.concatenate((histogram, np.zeros(len(counts)-len(histogram), dtype=np.int64)))
+  histogram[0:len(counts)] += counts
+  return histogram
+
+### Compute the dispersal kernels and the number of jumps of a lineage tree ###
+### (the tree is streamed: memory does not depend on the number of jumps)  ###
+def compute_histograms( filename, bin_width=1000.0, chunk_size=1000000 ):
+  geodesic  = np.zeros(0, dtype=np.int64)
+  euclidean = np.zeros(0, dtype=np.int64)
+  events    = np.zeros((0, 0), dtype=np.int64)
+  for records in read_lineage(filename, chunk_size):
+    geodesic  = add_counts(geodesic, np.floor(records["geodesic_dist"]/bin_width).astype(np.int64))
+    euclidean = add_counts(euclidean, np.floor(records["euclidean_dist"]/bin_width).astype(np.int64))
+    shape     = (max(events.shape[0], records["iteration"].max()+1), max(events.shape[1], records["repetition"].max()))
+    if shape != events.shape:
+      grown = np.zeros(shape, dtype=np.int64)
+      grown[0:events.shape[0],0:events.shape[1]] = events
+      events = grown
+    np.add.at(events, (records["iteration"], records["repetition"]-1), 1)
+  size      = max(len(geodesic), len(euclidean))
+  geodesic  = np.concatenate((geodesic, np.zeros(size-len(geodesic), dtype=np.int64)))
+  euclidean = np.concatenate((euclidean, np.zeros(size-len(euclidean), dtype=np.int64)))
+  return {"distance": np.arange(size)*bin_width, "geodesic_count": geodesic, "euclidean_count": euclidean, "events": events}
+
+### Write the histograms as HMD_model_run -lineage SUMMARY ###
+### (events of repetitions 1 to repetitions, iterations 0 to iterations-1) ###
+def write_histograms( histograms, kernel_filename, events_filename, repetitions, iterations ):
+  f = open(kernel_filename, "w")
+  f.write("distance geodesic_count euclidean_count\n")
+  for i in range(len(histograms["distance"])):
+    f.write("%g %d %d\n" % (histograms["distance"][i], histograms["geodesic_count"][i], histograms["euclidean_count"][i]))
+  f.close()
+  events = np.zeros((iterations, repetitions), dtype=np.int64)
+  shape  = (min(iterations, histograms["events"].shape[0]), min(repetitions, histograms["events"].shape[1]))
+  events[0:shape[0],0:shape[1]] = histograms["events"][0:shape[0],0:shape[1]]
+  f = open(events_filename, "w")
+  f.write("repetition iteration nb_events\n")
+  for iteration in range(iterations):
+    for rep in range(repetitions):
+      f.write(str(rep+1)+" "+str(iteration)+" "+str(events[iteration][rep])+"\n")
+  f.close()
+
+
+######################
+#        MAIN        #
+######################
+
+if __name__ == '__main__':
+  FILENAME   = sys.argv[1]
+  FOLDER     = os.path.dirname(os.path.abspath(FILENAME))
+  BIN_WIDTH  = (float(sys.argv[2]) if len(sys.argv) > 2 else 1000.0)
+  histograms = compute_histograms(FILENAME, BIN_WIDTH)
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  # Recorded repetitions and iterations   #
+  # from the parameters of the run        #
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  repetitions = histograms["events"].shape[1]
+  iterations  = histograms["events"].shape[0]
+  if os.path.isfile(os.path.join(FOLDER, "parameters.txt")):
+    f          = open(os.path.join(FOLDER, "parameters.txt"), "r")
+    parameters = dict(zip(f.readline().strip("\n").split(" "), f.readline().strip("\n").split(" ")))
+    f.close()
+    repetitions = int(parameters["reps"])
+    iterations  = int(parameters["iters"])
+    if int(parameters.get("lineage-reps", "0")) > 0:
+      repetitions = min(repetitions, int(parameters["lineage-reps"]))
+  write_histograms(histograms, os.path.join(FOLDER, "dispersal_kernel.txt"), os.path.join(FOLDER, "dispersal_events.txt"), repetitions, iterations)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+import math
+import struct
+
+### Merge_Shards class ###
+class Merge_Shards:
+
+  ### Contructor ###
+  def __init__( self, shard_folders, output_folder ):
+    #~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Main parameters     #
+    #~~~~~~~~~~~~~~~~~~~~~~~~#
+    self.__shard_folders = shard_folders
+    self.__output_folder = output_folder
+    #~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 2) Internal parameters #
+    #~~~~~~~~~~~~~~~~~~~~~~~~#
+    self.__header       = []
+    self.__parameters   = {}
+    self.__lnfact_table = [math.log(math.factorial(n)) for n in range(171)]
+
+  ### Load the parameters of the shards (all the shards must come from the same run) ###
+  def load_parameters( self ):
+    for folder in self.__shard_folders:
+      f          = open(os.path.join(folder, "parameters.txt"), "r")
+      header     = f.readline().strip("\n").split(" ")
+      values     = f.readline().strip("\n").split(" ")
+      f.close()
+      parameters = dict(zip(header, values))
+      if len(self.__parameters) == 0:
+        self.__header     = header
+        self.__parameters = parameters
+      for key in ["seed", "typeofdata", "reps", "iters", "optimfunc", "save-all-states"]:
+        assert parameters[key] == self.__parameters[key], "The shards were not run with the same "+key
+      for key in ["lineage", "lineage-reps", "lineage-bin", "invasion-dist-bin"]:
+        assert parameters.get(key) == self.__parameters.get(key), "The shards were not run with the same "+key
+
+  ### Log of n! (as gsl_sf_lnfact) ###
+  def __lnfact( self, n ):
+    if n <= 170:
+      return self.__lnfact_table[n]
+    return math.lgamma(n+1.0)
+
+  ### Log of the binomial coefficient (as gsl_sf_lnchoose) ###
+  def __lnchoose( self, n, m ):
+    if m == n or m == 0:
+      return 0.0
+    if m*2 > n:
+      m = n-m
+    return self.__lnfact(n)-self.__lnfact(m)-self.__lnfact(n-m)
+
+  ### Hypergeometric probability (as gsl_ran_hypergeometric_pdf) ###
+  def __hypergeometric_pdf( self, k, n1, n2, t ):
+    if k > n1 or k > t:
+      return 0.0
+    if t > n2 and k+n2 < t:
+      return 0.0
+    return math.exp(self.__lnchoose(n1, k)+self.__lnchoose(n2, t-k)-self.__lnchoose(n1+n2, t))
+
+  ### Minus log (infinite for a null probability) ###
+  def __minus_log( self, p ):
+    if p == 0.0:
+      return float("inf")
+    return -math.log(p)
+
+  ### Add up the statistics of the shards ###
+  def __merge_statistics( self, filename ):
+    nodes  = []
+    n_reps = 0
+    for folder in self.__shard_folders:
+      f       = open(os.path.join(folder, filename), "r")
+      columns = f.readline().strip("\n").split(" ")
+      i       = 0
+      for l in f:
+        row = dict(zip(columns, l.strip("\n").split(" ")))
+        if len(nodes) <= i:
+          nodes.append(row)
+          for key in columns[6:17]:
+            nodes[i][key] = float(row[key])
+        else:
+          assert nodes[i]["id"] == row["id"], "The shards do not have the same nodes"
+          for key in columns[6:17]:
+            nodes[i][key] += float(row[key])
+        i += 1
+      f.close()
+    for node in nodes:
+      n_reps = node["n_sim"]
+    assert n_reps == float(self.__parameters["reps"]), "The shards do not cover all the repetitions"
+    return nodes
+
+  ### Compute the state of a node from its statistics (as Node::update_state) ###
+  def __compute_node_state( self, node ):
+    node["mean_nb_intros"]      = node["sum_nb_intros"]/node["n_sim"]
+    node["var_nb_intros"]       = node["sum2_nb_intros"]/node["n_sim"]
+    node["var_nb_intros"]      -= node["mean_nb_intros"]*node["mean_nb_intros"]
+    node["p_sim"]               = node["y_sim"]/node["n_sim"]
+    node["mean_first_invasion"] = 0.0
+    node["var_first_invasion"]  = 0.0
+    node["mean_last_invasion"]  = 0.0
+    node["var_last_invasion"]   = 0.0
+    if node["nb_first_invasions"] > 0.0:
+      node["mean_first_invasion"]  = node["sum_first_invasion"]/node["nb_first_invasions"]
+      node["var_first_invasion"]   = node["sum2_first_invasion"]/node["nb_first_invasions"]
+      node["var_first_invasion"]  -= node["mean_first_invasion"]*node["mean_first_invasion"]
+    if node["nb_last_invasions"] > 0.0:
+      node["mean_last_invasion"]  = node["sum_last_invasion"]/node["nb_last_invasions"]
+      node["var_last_invasion"]   = node["sum2_last_invasion"]/node["nb_last_invasions"]
+      node["var_last_invasion"]  -= node["mean_last_invasion"]*node["mean_last_invasion"]
+
+  ### Compute the final score (as Graph::compute_score) ###
+  def __compute_score( self, nodes ):
+    L     = 0.0
+    max_L = 0.0
+    score = 0.0
+    if self.__parameters["typeofdata"] == "PRESENCE_ONLY":
+      for node in nodes:
+        y_obs = float(node["y_obs"])
+        if y_obs > 0.0:
+          score += (y_obs-node["mean_nb_intros"])*(y_obs-node["mean_nb_intros"])
+    elif self.__parameters["typeofdata"] == "PRESENCE_ABSENCE":
+      for node in nodes:
+        n_obs = float(node["n_obs"])
+        y_obs = float(node["y_obs"])
+        if n_obs > 0.0:
+          a      = int(node["y_sim"])
+          b      = int(y_obs)
+          c      = int(node["n_sim"]-node["y_sim"])
+          d      = int(n_obs-y_obs)
+          MFS    = self.__hypergeometric_pdf(b, b+b, d+d, b+d)
+          FS     = self.__hypergeometric_pdf(a, a+b, c+d, a+c)
+          L     += self.__minus_log(FS)
+          max_L += self.__minus_log(MFS)
+          if self.__parameters["optimfunc"] == "LSS":
+            score += (node["p_sim"]-float(node["p_obs"]))*(node["p_sim"]-float(node["p_obs"]))
+          elif self.__parameters["optimfunc"] == "LOG_LIKELIHOOD":
+            score += self.__minus_log(FS)
+          elif self.__parameters["optimfunc"] == "LIKELIHOOD_LSS":
+            score += (1.0-FS/MFS)*(1.0-FS/MFS)
+    return L, max_L, score
+
+  ### Write a state file (as Graph::write_state) ###
+  def __write_state( self, filename, nodes ):
+    f = open(filename, "w")
+    f.write("id x y y_obs n_obs p_obs total_nb_intros mean_nb_intros var_nb_intros y_sim n_sim p_sim mean_first_invasion var_first_invasion mean_last_invasion var_last_invasion L empty_L max_L empty_score score\n")
+    for node in nodes:
+      line = node["id"]
+      for key in ["x", "y", "y_obs", "n_obs", "p_obs"]:
+        line += " %g" % float(node[key])
+      for key in ["total_nb_intros", "mean_nb_intros", "var_nb_intros", "y_sim", "n_sim", "p_sim", "mean_first_invasion", "var_first_invasion", "mean_last_invasion", "var_last_invasion"]:
+        line += " %g" % node[key]
+      for key in ["L", "empty_L", "max_L", "empty_score", "score"]:
+        line += " %g" % float(node[key])
+      f.write(line+"\n")
+    f.close()
+
+  ### Merge the lineage trees, iteration by iteration and in shard order ###
+  def __merge_lineage_trees( self ):
+    inputs = []
+    for folder in self.__shard_folders:
+      g = open(os.path.join(folder, "lineage_tree.txt"), "r")
+      g.readline()
+      inputs.append([g, g.readline()])
+    f = open(os.path.join(self.__output_folder, "lineage_tree.txt"), "w")
+    f.write("repetition start_node end_node geodesic_dist euclidean_dist iteration\n")
+    while True:
+      iterations = [int(l.strip("\n").split(" ")[-1]) for g, l in inputs if l]
+      if len(iterations) == 0:
+        break
+      iteration = min(iterations)
+      for item in inputs:
+        while item[1] and int(item[1].strip("\n").split(" ")[-1]) == iteration:
+          f.write(item[1])
+          item[1] = item[0].readline()
+    f.close()
+    for g, l in inputs:
+      g.close()
+
+  ### Merge the binary lineage trees, iteration by iteration and in shard order ###
+  def __merge_binary_lineage_trees( self ):
+    inputs = []
+    for folder in self.__shard_folders:
+      g           = open(os.path.join(folder, "lineage_tree.bin"), "rb")
+      header      = g.read(16)
+      record_size = struct.unpack("i", header[12:16])[0]
+      inputs.append([g, g.read(record_size)])
+    f = open(os.path.join(self.__output_folder, "lineage_tree.bin"), "wb")
+    f.write(header)
+    while True:
+      iterations = [struct.unpack("i", r[12:16])[0] for g, r in inputs if len(r) == record_size]
+      if len(iterations) == 0:
+        break
+      iteration = min(iterations)
+      for item in inputs:
+        while len(item[1]) == record_size and struct.unpack("i", item[1][12:16])[0] == iteration:
+          f.write(item[1])
+          item[1] = item[0].read(record_size)
+    f.close()
+    for g, r in inputs:
+      g.close()
+
+  ### Merge the dispersal kernels and the numbers of jumps (sums of the kernels, events in shard order) ###
+  def __merge_lineage_summaries( self ):
+    kernel = []
+    events = {}
+    for folder in self.__shard_folders:
+      g = open(os.path.join(folder, "dispersal_kernel.txt"), "r")
+      g.readline()
+      for i, line in enumerate(g):
+        l = line.strip("\n").split(" ")
+        if i == len(kernel):
+          kernel.append([l[0], 0, 0])
+        kernel[i][1] += int(l[1])
+        kernel[i][2] += int(l[2])
+      g.close()
+      g = open(os.path.join(folder, "dispersal_events.txt"), "r")
+      g.readline()
+      for line in g:
+        iteration = int(line.strip("\n").split(" ")[1])
+        if iteration not in events:
+          events[iteration] = []
+        events[iteration].append(line)
+      g.close()
+    f = open(os.path.join(self.__output_folder, "dispersal_kernel.txt"), "w")
+    f.write("distance geodesic_count euclidean_count\n")
+    for distance, geodesic_count, euclidean_count in kernel:
+      f.write(distance+" "+str(geodesic_count)+" "+str(euclidean_count)+"\n")
+    f.close()
+    f = open(os.path.join(self.__output_folder, "dispersal_events.txt"), "w")
+    f.write("repetition iteration nb_events\n")
+    for iteration in sorted(events.keys()):
+      for line in events[iteration]:
+        f.write(line)
+    f.close()
+
+  ### Merge the invasion distance histograms (the simulated counts are summed, the observed ones are the same in every shard) ###
+  def __merge_invasion_distances( self ):
+    g        = open(os.path.join(self.__shard_folders[0], "observed_euclidean_distribution.txt"), "r")
+    observed = g.read()
+    g.close()
+    f = open(os.path.join(self.__output_folder, "observed_euclidean_distribution.txt"), "w")
+    f.write(observed)
+    f.close()
+    simulated = []
+    for folder in self.__shard_folders:
+      g = open(os.path.join(folder, "simulated_euclidean_distribution.txt"), "r")
+      g.readline()
+      for i, line in enumerate(g):
+        l = line.strip("\n").split(" ")
+        if i == len(simulated):
+          simulated.append([l[0], 0])
+        simulated[i][1] += int(l[1])
+      g.close()
+    f = open(os.path.join(self.__output_folder, "simulated_euclidean_distribution.txt"), "w")
+    f.write("distance count\n")
+    for distance, count in simulated:
+      f.write(distance+" "+str(count)+"\n")
+    f.close()
+
+  ### Merge the shards in the output folder and return the score line ###
+  def merge( self ):
+    if not os.path.isdir(self.__output_folder):
+      os.mkdir(self.__output_folder)
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Write the parameters of the run    #
+    #    with one thread by shard           #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    values = [self.__parameters[key] for key in self.__header]
+    if "threads" in self.__header:
+      values[self.__header.index("threads")] = str(len(self.__shard_folders))
+    f = open(os.path.join(self.__output_folder, "parameters.txt"), "w")
+    f.write(" ".join(self.__header)+"\n"+" ".join(values)+"\n")
+    f.close()
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 2) Merge the intermediate states      #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    if self.__parameters["save-all-states"] == "1":
+      for iteration in range(int(self.__parameters["iters"])):
+        nodes = self.__merge_statistics("statistics_"+str(iteration)+".txt")
+        for node in nodes:
+          self.__compute_node_state(node)
+        self.__write_state(os.path.join(self.__output_folder, "state_"+str(iteration)+".txt"), nodes)
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 3) Merge the final state and compute  #
+    #    the final score                    #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    nodes = self.__merge_statistics("final_statistics.txt")
+    for node in nodes:
+      self.__compute_node_state(node)
+    L, max_L, score = self.__compute_score(nodes)
+    for node in nodes:
+      node["L"]     = L
+      node["max_L"] = max_L
+      node["score"] = score
+    self.__write_state(os.path.join(self.__output_folder, "final_state.txt"), nodes)
+    lineage = self.__parameters.get("lineage", "TEXT")
+    if lineage == "TEXT":
+      self.__merge_lineage_trees()
+    elif lineage == "BINARY":
+      self.__merge_binary_lineage_trees()
+    elif lineage == "SUMMARY":
+      self.__merge_lineage_summaries()
+    if float(self.__parameters.get("invasion-dist-bin", "0")) > 0.0:
+      self.__merge_invasion_distances()
+    return "%g %g %g %g %g" % (L, float(nodes[0]["empty_L"]), max_L, float(nodes[0]["empty_score"]), score)
+
+### Print help ###
+def printHelp():
+  print("")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("                             * Merge shards *                              ")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("Usage: python merge_shards.py -h or --help")
+  print("   or: python merge_shards.py [list of mandatory arguments]")
+  print("Merges the output folders of model_run -shard 0/K, ..., K-1/K into the")
+  print("outputs of the same run with -threads K, and prints its score.")
+  print("Options are:")
+  print("  -h, --help")
+  print("        print this help, then exit")
+  print("  -shards, --shards <folder,folder,...> (mandatory)")
+  print("        Specify the output folders of the shards, in shard order")
+  print("  -output, --output <folder> (mandatory)")
+  print("        Specify the output folder of the merged run")
+  print("")
+
+### Read command line arguments ###
+def readArgs( argv ):
+  arguments           = {}
+  arguments["shards"] = []
+  arguments["output"] = ""
+  provided            = {}
+  provided["shards"]  = False
+  provided["output"]  = False
+  for i in range(len(argv)):
+    if argv[i] == "-h" or argv[i] == "--help":
+      printHelp()
+      sys.exit()
+    if argv[i] == "-shards" or argv[i] == "--shards":
+      arguments["shards"] = argv[i+1].split(",")
+      provided["shards"]  = True
+    if argv[i] == "-output" or argv[i] == "--output":
+      arguments["output"] = argv[i+1]
+      provided["output"]  = True
+  for item in provided.items():
+    if not item[1]:
+      print("You must provide a value for argument -"+item[0])
+      sys.exit()
+  return arguments
+
+### Assert command line arguments ###
+def assertArgs( arguments ):
+  for folder in arguments["shards"]:
+    assert os.path.isfile(folder+"/parameters.txt"), "The file "+folder+"/parameters.txt does not exist"
+    assert os.path.isfile(folder+"/final_statistics.txt"), "The file "+folder+"/final_statistics.txt does not exist"
+
+
+######################
+#        MAIN        #
+######################
+
+if __name__ == '__main__':
+  arguments = readArgs(sys.argv)
+  assertArgs(arguments)
+  merge = Merge_Shards(arguments["shards"], arguments["output"])
+  merge.load_parameters()
+  print(merge.merge())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+import shutil
+import hashlib
+import tempfile
+import threading
+
+### Default cache folder (at the root of the repository) and size (in MB) ###
+DEFAULT_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
+DEFAULT_SIZE   = 2048
+
+### Options of model_run whose files are hashed by content (landscape.bin is compiled from them) ###
+INPUT_OPTIONS   = ["-map", "-network", "-sample"]
+IGNORED_OPTIONS = ["-landscape"]
+
+### Result_Cache class ###
+class Result_Cache:
+
+  ### Constructor ###
+  def __init__( self, folder, max_size ):
+    #~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Main parameters     #
+    #~~~~~~~~~~~~~~~~~~~~~~~~#
+    self.__folder   = folder
+    self.__max_size = max_size*1024*1024
+    #~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 2) Internal parameters #
+    #~~~~~~~~~~~~~~~~~~~~~~~~#
+    self.__hashes = {}
+    self.__size   = None
+    self.__lock   = threading.Lock()
+
+  ### Hash a file by content (the hash is kept while the file is unchanged) ###
+  def __hash_file( self, filename ):
+    stat = os.stat(filename)
+    item = (os.path.abspath(filename), stat.st_size, stat.st_mtime)
+    if item not in self.__hashes:
+      h = hashlib.sha1()
+      f = open(filename, "rb")
+      block = f.read(1048576)
+      while block:
+        h.update(block)
+        block = f.read(1048576)
+      f.close()
+      self.__hashes[item] = h.hexdigest()
+    return self.__hashes[item]
+
+  ### Build the key of a simulation from the binary, the input files and the parameter values ###
+  def build_key( self, binary, input_files, values ):
+    h = hashlib.sha1()
+    for item in [self.__hash_file(binary)]+[self.__hash_file(filename) for filename in input_files]+[str(value) for value in values]:
+      h.update((item+"\n").encode("utf8"))
+    return h.hexdigest()
+
+  ### Build the key of a model_run command line (extra values for what the driver does with the run) ###
+  def build_command_key( self, command_line, extra_values=[] ):
+    arguments   = command_line.split()
+    input_files = []
+    values      = []
+    i           = 1
+    while i < len(arguments):
+      option = "-"+arguments[i].lstrip("-")
+      if option in INPUT_OPTIONS:
+        input_files.append(arguments[i+1])
+        values.append(option)
+        i += 2
+      elif option in IGNORED_OPTIONS:
+        i += 2
+      else:
+        values.append(arguments[i])
+        i += 1
+    return self.build_key(arguments[0], input_files, values+extra_values)
+
+  ### Folder of a cache entry ###
+  def __entry( self, key ):
+    return os.path.join(self.__folder, key[0:2], key)
+
+  ### Size of a folder (in bytes) ###
+  def __folder_size( self, folder ):
+    size = 0
+    for root, dirs, files in os.walk(folder):
+      for filename in files:
+        size += os.path.getsize(os.path.join(root, filename))
+    return size
+
+  ### List the cache entries (last use, size, folder) ###
+  def __list_entries( self ):
+    entries = []
+    if not os.path.isdir(self.__folder):
+      return entries
+    for prefix in os.listdir(self.__folder):
+      if len(prefix) != 2 or not os.path.isdir(os.path.join(self.__folder, prefix)):
+        continue
+      for key in os.listdir(os.path.join(self.__folder, prefix)):
+        entry = os.path.join(self.__folder, prefix, key)
+        try:
+          entries.append((os.path.getmtime(os.path.join(entry, "stdout.txt")), self.__folder_size(entry), entry))
+        except OSError:
+          continue
+    return entries
+
+  ### Remove the least recently used entries until the cache is back to 90% of its size ###
+  def __evict( self ):
+    entries     = sorted(self.__list_entries())
+    self.__size = sum([item[1] for item in entries])
+    for last_use, size, entry in entries:
+      if self.__size <= 0.9*self.__max_size:
+        break
+      shutil.rmtree(entry, ignore_errors=True)
+      self.__size -= size
+
+  ### Load a simulation: return its standard output and copy its outputs in output_folder ###
+  ### (None when the simulation, or its outputs, are not in the cache)                   ###
+  def load( self, key, output_folder=None ):
+    entry = self.__entry(key)
+    try:
+      f      = open(os.path.join(entry, "stdout.txt"), "r")
+      stdout = f.read()
+      f.close()
+      if output_folder is not None:
+        if not os.path.isdir(os.path.join(entry, "output")):
+          return None
+        shutil.rmtree(output_folder, ignore_errors=True)
+        shutil.copytree(os.path.join(entry, "output"), output_folder)
+      os.utime(os.path.join(entry, "stdout.txt"), None)
+      return stdout
+    except (IOError, OSError):
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      # The entry was evicted while loading   #
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      if output_folder is not None:
+        shutil.rmtree(output_folder, ignore_errors=True)
+      return None
+
+  ### Store a simulation: its standard output and, if given, a copy of its output folder ###
+  def store( self, key, stdout, output_folder=None ):
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Write the entry in a temporary     #
+    #    folder                             #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    if not os.path.isdir(self.__folder):
+      try:
+        os.makedirs(self.__folder)
+      except OSError:
+        pass
+    tmp = tempfile.mkdtemp(prefix="tmp_", dir=self.__folder)
+    f   = open(os.path.join(tmp, "stdout.txt"), "w")
+    f.write(stdout)
+    f.close()
+    if output_folder is not None:
+      shutil.copytree(output_folder, os.path.join(tmp, "output"))
+    size = self.__folder_size(tmp)
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 2) Move it in place and evict the     #
+    #    least recently used entries        #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    self.__lock.acquire()
+    try:
+      entry = self.__entry(key)
+      if size > self.__max_size or os.path.isdir(entry):
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+      if not os.path.isdir(os.path.dirname(entry)):
+        try:
+          os.makedirs(os.path.dirname(entry))
+        except OSError:
+          pass
+      try:
+        os.rename(tmp, entry)
+      except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+      if self.__size is None:
+        self.__size = sum([item[1] for item in self.__list_entries()])
+      else:
+        self.__size += size
+      if self.__size > self.__max_size:
+        self.__evict()
+    finally:
+      self.__lock.release()
+
+  ### Remove all the entries ###
+  def clear( self ):
+    self.__lock.acquire()
+    try:
+      for last_use, size, entry in self.__list_entries():
+        shutil.rmtree(entry, ignore_errors=True)
+      self.__size = 0
+    finally:
+      self.__lock.release()
+
+  ### Print the number of entries and the size of the cache ###
+  def print_summary( self ):
+    entries = self.__list_entries()
+    print(self.__folder+": "+str(len(entries))+" simulation(s), "+str(round(sum([item[1] for item in entries])/1048576.0, 1))+" MB")
+
+
+######################
+#        MAIN        #
+######################
+
+if __name__ == '__main__':
+  ARGUMENTS = [argument for argument in sys.argv[1:] if argument != "-clear"]
+  FOLDER    = (ARGUMENTS[0] if len(ARGUMENTS) > 0 else DEFAULT_FOLDER)
+  cache     = Result_Cache(FOLDER, DEFAULT_SIZE)
+  if "-clear" in sys.argv[1:]:
+    cache.clear()
+  cache.print_summary()
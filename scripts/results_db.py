@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+import glob
+import sqlite3
+import numpy as np
+
+### Result files of the pipeline, by table (the scenario is the file or folder prefix, e.g. 1-isotropic) ###
+### models:           1_simulation_results/<scenario>_best.txt (CMA-ES best models)                      ###
+### replays:          2_cmaes_validation/<scenario>_all.txt (one row by replay)                          ###
+### validated_models: 2_cmaes_validation/<scenario>_replayed.txt (one row by replayed model)             ###
+### evaluations:      4_models_evaluation/<scenario>/score_distribution.txt (one row by evaluation rep)  ###
+FILES = [("models", "1_simulation_results", "*_best.txt"),
+         ("replays", "2_cmaes_validation", "*_all.txt"),
+         ("validated_models", "2_cmaes_validation", "*_replayed.txt"),
+         ("evaluations", "4_models_evaluation", "*/score_distribution.txt")]
+
+### Indexed columns of each table ###
+INDEXES = {"models":           [["scenario", "score"]],
+           "replays":          [["scenario", "cmaes"], ["scenario", "key", "rep"]],
+           "validated_models": [["scenario", "replay_mean"], ["scenario", "score"]],
+           "evaluations":      [["scenario", "REP"]]}
+
+### Column types (the other columns are REAL) ###
+TEXT_COLUMNS    = ["scenario", "typeofdata", "sample", "network", "map", "exec", "optimfunc", "law", "humanactivity", "key"]
+INTEGER_COLUMNS = ["line", "cell_id", "iters", "reps", "seed", "rep", "REP", "replays"]
+NUMPY_TYPES     = {"TEXT": "U", "INTEGER": np.int64, "REAL": np.float64}
+
+### Values given to NULL cells in NumPy arrays (e.g. replays of rows imported before a racing validation) ###
+NULL_VALUES = {"TEXT": "", "INTEGER": -1, "REAL": np.nan}
+
+### Get the SQL type of a column ###
+def get_column_type( column ):
+  if column in TEXT_COLUMNS:
+    return "TEXT"
+  if column in INTEGER_COLUMNS:
+    return "INTEGER"
+  return "REAL"
+
+### Convert a value read in a result file to the type of its column ###
+def convert_value( column, value ):
+  try:
+    if get_column_type(column) == "INTEGER":
+      return int(value)
+    if get_column_type(column) == "REAL":
+      return float(value)
+  except ValueError:
+    pass
+  return value
+
+### Read a space-separated result file (header, and the complete rows as lists of strings) ###
+### (a last line being written by a driver is skipped)                                     ###
+def read_table( filename ):
+  f      = open(filename, "r")
+  header = f.readline().strip("\n").split(" ")
+  rows   = []
+  for l in f:
+    row = l.strip("\n").split(" ")
+    if l.endswith("\n") and len(row) == len(header):
+      rows.append(row)
+  f.close()
+  return header, rows
+
+### Load the best model of a validated parameters file (*_replayed.txt) ###
+### (with a racing validation, only the models that were never dropped,  ###
+### with the most replays, are compared)                                 ###
+def load_best_model( filename ):
+  header, rows     = read_table(filename)
+  best_model       = {}
+  best_replay_mean = 1e+10
+  best_replays     = 0
+  for row in rows:
+    model   = dict(zip(header, row))
+    replays = 0
+    if "replays" in model:
+      replays = int(model["replays"])
+    if replays > best_replays or (replays == best_replays and best_replay_mean > float(model["replay_mean"])):
+      best_replay_mean = float(model["replay_mean"])
+      best_replays     = replays
+      best_model       = model
+  return best_model
+
+### Open a results database ###
+def connect( filename ):
+  return sqlite3.connect(filename)
+
+### Get the columns of a table (empty if the table does not exist) ###
+def get_columns( connection, table ):
+  return [row[1] for row in connection.execute("PRAGMA table_info(\""+table+"\")")]
+
+### Create a table, or add the missing columns, and its indexes ###
+def create_table( connection, table, columns ):
+  existing = get_columns(connection, table)
+  if len(existing) == 0:
+    connection.execute("CREATE TABLE \""+table+"\" (\"scenario\" TEXT, \"line\" INTEGER)")
+    existing = ["scenario", "line"]
+  for column in columns:
+    if column not in existing:
+      connection.execute("ALTER TABLE \""+table+"\" ADD COLUMN \""+column+"\" "+get_column_type(column))
+      existing.append(column)
+  for index in INDEXES.get(table, []):
+    if all([column in existing for column in index]):
+      connection.execute("CREATE INDEX IF NOT EXISTS \""+table+"_"+"_".join(index)+"\" ON \""+table+"\" ("+", ".join(["\""+column+"\"" for column in index])+")")
+
+### Insert rows of a scenario (rows are lists of strings, in the order of columns) ###
+def insert_rows( connection, table, scenario, columns, rows, first_line ):
+  query = "INSERT INTO \""+table+"\" (\"scenario\", \"line\", "+", ".join(["\""+column+"\"" for column in columns])+") VALUES ("+", ".join(["?"]*(len(columns)+2))+")"
+  connection.executemany(query, [[scenario, first_line+i]+[convert_value(columns[j], row[j]) for j in range(len(columns))] for i, row in enumerate(rows)])
+
+### Replace the rows of a scenario, in one transaction ###
+def replace_rows( connection, table, scenario, columns, rows ):
+  with connection:
+    create_table(connection, table, columns)
+    connection.execute("DELETE FROM \""+table+"\" WHERE \"scenario\" = ?", (scenario,))
+    insert_rows(connection, table, scenario, columns, rows, 1)
+
+### Import the result files found in the root folder of the pipeline ###
+### (rows of the imported scenarios are replaced)                    ###
+def import_results( connection, root ):
+  imported = []
+  for table, folder, pattern in FILES:
+    for filename in sorted(glob.glob(os.path.join(root, folder, pattern))):
+      if pattern.startswith("*/"):
+        scenario = os.path.basename(os.path.dirname(filename))
+      else:
+        scenario = os.path.basename(filename)[0:-len(pattern)+1]
+      header, rows = read_table(filename)
+      replace_rows(connection, table, scenario, header, rows)
+      imported.append((table, scenario, len(rows)))
+  return imported
+
+### Get the rows of a table as a NumPy structured array (typed columns) ###
+### (where is an SQL condition, with ? for the parameters; NULL cells   ###
+### get NULL_VALUES)                                                    ###
+def get_array( connection, table, columns=None, where="", parameters=() ):
+  types = dict([(row[1], row[2]) for row in connection.execute("PRAGMA table_info(\""+table+"\")")])
+  if columns is None:
+    columns = [column for column in get_columns(connection, table)]
+  query = "SELECT "+", ".join(["\""+column+"\"" for column in columns])+" FROM \""+table+"\""
+  if where != "":
+    query += " WHERE "+where
+  rows  = connection.execute(query+" ORDER BY \"scenario\", \"line\"", parameters).fetchall()
+  dtype = []
+  for i, column in enumerate(columns):
+    if types[column] == "TEXT":
+      dtype.append((str(column), "U"+str(max([1]+[len(row[i]) for row in rows if row[i] is not None]))))
+    else:
+      dtype.append((str(column), NUMPY_TYPES[types[column]]))
+  nulls = [NULL_VALUES[types[column]] for column in columns]
+  return np.array([tuple([(nulls[i] if value is None else value) for i, value in enumerate(row)]) for row in rows], dtype=dtype)
+
+### Get all the replays of a CMA-ES score ###
+def get_replays( connection, scenario, cmaes_score, columns=None ):
+  return get_array(connection, "replays", columns, "\"scenario\" = ? AND \"cmaes\" = ?", (scenario, float(cmaes_score)))
+
+### Get the best validated model of a scenario (as load_best_model, values as strings) ###
+def get_best_validated_model( connection, scenario ):
+  columns = get_columns(connection, "validated_models")
+  order   = ("\"replays\" DESC, " if "replays" in columns else "")+"\"replay_mean\" ASC, \"line\" ASC"
+  row     = connection.execute("SELECT * FROM \"validated_models\" WHERE \"scenario\" = ? ORDER BY "+order+" LIMIT 1", (scenario,)).fetchone()
+  if row is None:
+    return {}
+  return dict([(column, str(value)) for column, value in zip(columns, row) if column not in ["scenario", "line"] and value is not None])
+
+### Get the best validated model of every scenario ###
+def get_best_validated_models( connection ):
+  return dict([(row[0], get_best_validated_model(connection, row[0])) for row in connection.execute("SELECT DISTINCT \"scenario\" FROM \"validated_models\" ORDER BY \"scenario\"")])
+
+### Table_Writer class (rows appended by a driver, one transaction by row) ###
+class Table_Writer:
+
+  ### Constructor (the rows of the scenario are replaced by the given lines) ###
+  def __init__( self, filename, table, scenario, header, lines=[] ):
+    #~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Main parameters     #
+    #~~~~~~~~~~~~~~~~~~~~~~~~#
+    self.__table    = table
+    self.__scenario = scenario
+    self.__columns  = header.strip("\n").split(" ")
+    #~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 2) Internal parameters #
+    #~~~~~~~~~~~~~~~~~~~~~~~~#
+    self.__connection = connect(filename)
+    self.__line       = len(lines)
+    replace_rows(self.__connection, table, scenario, self.__columns, [l.strip("\n").split(" ") for l in lines])
+
+  ### Append a line of the result file ###
+  def write( self, line ):
+    self.__line += 1
+    with self.__connection:
+      insert_rows(self.__connection, self.__table, self.__scenario, self.__columns, [line.strip("\n").split(" ")], self.__line)
+
+  ### Close the database ###
+  def close( self ):
+    self.__connection.close()
+
+
+######################
+#        MAIN        #
+######################
+
+if __name__ == '__main__':
+  DATABASE   = sys.argv[1]
+  ROOT       = (sys.argv[2] if len(sys.argv) > 2 else os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+  connection = connect(DATABASE)
+  for table, scenario, nb_rows in import_results(connection, ROOT):
+    print(table+" "+scenario+" "+str(nb_rows))
+  for scenario, model in get_best_validated_models(connection).items():
+    print("best "+scenario+" score="+model["score"]+" replay_mean="+model["replay_mean"])
+  connection.close()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import sys
+import numpy as np
+
+### Binary state file written by HMD_model_run -binary-states (see Graph::write_binary_state) ###
+STATE_VERSION  = 1
+HEADER         = np.dtype([("magic", "S8"), ("version", np.int32), ("nb_nodes", np.int32)])
+CHUNK          = np.dtype([("iteration", np.int32), ("nb_changes", np.int32), ("scores", np.float64, 5)])
+STATIC_COLUMNS = [("id", np.int32), ("x", np.float32), ("y", np.float32), ("y_obs", np.float32), ("n_obs", np.float32), ("p_obs", np.float32)]
+COUNT_COLUMNS  = ["total_nb_intros", "y_sim", "n_sim"]
+VALUE_COLUMNS  = ["mean_nb_intros", "var_nb_intros", "p_sim", "mean_first_invasion", "var_first_invasion", "mean_last_invasion", "var_last_invasion"]
+SCORE_COLUMNS  = ["L", "empty_L", "max_L", "empty_score", "score"]
+TEXT_COLUMNS   = ["id", "x", "y", "y_obs", "n_obs", "p_obs", "total_nb_intros", "mean_nb_intros", "var_nb_intros",
+                  "y_sim", "n_sim", "p_sim", "mean_first_invasion", "var_first_invasion", "mean_last_invasion",
+                  "var_last_invasion", "L", "empty_L", "max_L", "empty_score", "score"]
+
+### Get a padded array view of the data (arrays are padded to 8 bytes) ###
+def view_array( data, offset, length, dtype ):
+  size = length*np.dtype(dtype).itemsize
+  return data[offset:offset+size].view(dtype), offset+size+(8-size%8)%8
+
+### Load a binary state file ###
+### (only the headers of the chunks are read, the columns are views of the memory-mapped file) ###
+def load_states( filename ):
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  # 1) Map the file and check the header  #
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  data   = np.memmap(filename, dtype=np.uint8, mode="r")
+  header = data[0:HEADER.itemsize].view(HEADER)[0]
+  assert header["magic"] == b"HMDSTATE", "The file "+filename+" is not a binary state file"
+  assert header["version"] == STATE_VERSION, "The binary state file "+filename+" has another format version"
+  states             = {}
+  states["nb_nodes"] = header["nb_nodes"].item()
+  offset             = HEADER.itemsize
+  for name, dtype in STATIC_COLUMNS:
+    states[name], offset = view_array(data, offset, states["nb_nodes"], dtype)
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  # 2) Index the chunks                   #
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  states["chunks"] = []
+  while offset < len(data):
+    assert offset+CHUNK.itemsize <= len(data), "The binary state file "+filename+" is truncated"
+    header  = data[offset:offset+CHUNK.itemsize].view(CHUNK)[0]
+    offset += CHUNK.itemsize
+    chunk   = {"iteration": header["iteration"].item(), "scores": np.array(header["scores"])}
+    chunk["changed"], offset = view_array(data, offset, header["nb_changes"].item(), np.int32)
+    for name in COUNT_COLUMNS:
+      chunk[name], offset = view_array(data, offset, header["nb_changes"].item(), np.int32)
+    for name in VALUE_COLUMNS:
+      chunk[name], offset = view_array(data, offset, header["nb_changes"].item(), np.float32)
+    assert offset <= len(data), "The binary state file "+filename+" is truncated"
+    states["chunks"].append(chunk)
+  states["iterations"] = np.array([chunk["iteration"] for chunk in states["chunks"]], dtype=np.int32)
+  return states
+
+### Get the series of a column (one row by saved state, one column by node) ###
+### (one value by saved state for the scores, one value by node for the static columns) ###
+def get_column( states, name ):
+  if name in dict(STATIC_COLUMNS):
+    return states[name]
+  if name in SCORE_COLUMNS:
+    return np.array([chunk["scores"][SCORE_COLUMNS.index(name)] for chunk in states["chunks"]])
+  assert name in COUNT_COLUMNS or name in VALUE_COLUMNS, "Unknown column "+name
+  series = np.zeros((len(states["chunks"]), states["nb_nodes"]), dtype=(np.int32 if name in COUNT_COLUMNS else np.float32))
+  values = series[0].copy()
+  for i, chunk in enumerate(states["chunks"]):
+    values[chunk["changed"]] = chunk[name]
+    series[i]                = values
+  return series
+
+### Get the state saved at an iteration (one array by column, one float by score) ###
+def get_state( states, iteration ):
+  assert iteration in states["iterations"], "No state saved at iteration "+str(iteration)
+  last  = int(np.argmax(states["iterations"] == iteration))
+  state = {}
+  for name, dtype in STATIC_COLUMNS:
+    state[name] = states[name]
+  for name in COUNT_COLUMNS+VALUE_COLUMNS:
+    state[name] = np.zeros(states["nb_nodes"], dtype=(np.int32 if name in COUNT_COLUMNS else np.float32))
+    for chunk in states["chunks"][0:last+1]:
+      state[name][chunk["changed"]] = chunk[name]
+  for i, name in enumerate(SCORE_COLUMNS):
+    state[name] = states["chunks"][last]["scores"][i].item()
+  return state
+
+### Write a state in the text format of HMD_model_run (state_<iteration>.txt) ###
+def write_state( state, f ):
+  f.write(" ".join(TEXT_COLUMNS)+"\n")
+  for index in range(len(state["id"])):
+    line = []
+    for name in TEXT_COLUMNS:
+      value = (state[name] if name in SCORE_COLUMNS else state[name][index])
+      line.append("%g" % value)
+    f.write(" ".join(line)+"\n")
+
+
+######################
+#        MAIN        #
+######################
+
+if __name__ == '__main__':
+  FILENAME = sys.argv[1]
+  states   = load_states(FILENAME)
+  if len(sys.argv) > 2:
+    write_state(get_state(states, int(sys.argv[2])), sys.stdout)
+  else:
+    print("nodes "+str(states["nb_nodes"]))
+    print("iteration changed_nodes score")
+    for chunk in states["chunks"]:
+      print(str(chunk["iteration"])+" "+str(len(chunk["changed"]))+" "+str(chunk["scores"][4]))
@@ -3,23 +3,36 @@
 
 import os
 import sys
+import hashlib
 import subprocess
 import numpy as np
+import result_cache
+import results_db
+from multiprocessing.pool import ThreadPool
 
 ### Validate class ###
 class Validate:
 
   ### Constructor ###
-  def __init__( self, model_file, input_folder, model_run, model_reps, validation_reps, validation_range ):
+  def __init__( self, model_file, input_folder, model_run, model_lib, model_reps, validation_reps, validation_range, score_at, jobs, racing_round, racing_z, resume, cache, database, scenario ):
     #~~~~~~~~~~~~~~~~~~~~~~~~#
     # 1) Main parameters     #
     #~~~~~~~~~~~~~~~~~~~~~~~~#
     self.__model_file       = model_file
     self.__input_folder     = input_folder
     self.__model_run        = model_run
+    self.__model_lib        = model_lib
     self.__model_reps       = model_reps
     self.__validation_reps  = validation_reps
     self.__validation_range = validation_range
+    self.__score_at         = score_at
+    self.__jobs             = jobs
+    self.__racing_round     = racing_round
+    self.__racing_z         = racing_z
+    self.__resume           = resume
+    self.__cache            = cache
+    self.__database         = database
+    self.__scenario         = scenario
     #~~~~~~~~~~~~~~~~~~~~~~~~#
     # 2) Internal parameters #
     #~~~~~~~~~~~~~~~~~~~~~~~~#
@@ -28,8 +41,10 @@ class Validate:
     self.__ordered_CMAES_scores = []
     self.__file_header          = ""
     self.__variables            = []
-    self.__command_line         = ""
-    self.__results              = {}
+    self.__landscape            = None
+    self.__module_file          = ""
+    self.__replays_table        = None
+    self.__models_table         = None
 
   ### Load the list of models ###
   def load_models( self ):
@@ -57,61 +72,133 @@ class Validate:
     f.close()
 
   ### Build the model command line from a parameters set ###
-  def __build_command_line( self, param_set ):
-    self.__command_line  = self.__model_run
-    self.__command_line += " -map "+self.__input_folder+"/map.txt"
-    self.__command_line += " -network "+self.__input_folder+"/network.txt"
-    self.__command_line += " -sample "+self.__input_folder+"/sample.txt"
-    self.__command_line += " -typeofdata "+param_set["typeofdata"]
-    self.__command_line += " -seed "+str(np.random.randint(1,100000000))
-    self.__command_line += " -reps "+str(self.__model_reps)
-    self.__command_line += " -iters "+param_set["iters"]
-    self.__command_line += " -law "+param_set["law"]
-    self.__command_line += " -optimfunc "+param_set["optimfunc"]
-    self.__command_line += " -humanactivity "+param_set["humanactivity"]
-    self.__command_line += " -xintro "+param_set["xintro"]
-    self.__command_line += " -yintro "+param_set["yintro"]
-    self.__command_line += " -pintro "+param_set["pintro"]
-    self.__command_line += " -lambda "+param_set["lambda"]
-    self.__command_line += " -mu "+param_set["mu"]
-    self.__command_line += " -sigma "+param_set["sigma"]
-    self.__command_line += " -gamma "+param_set["gamma"]
-    self.__command_line += " -w1 "+param_set["w1"]
-    self.__command_line += " -w2 "+param_set["w2"]
-    self.__command_line += " -w3 "+param_set["w3"]
-    self.__command_line += " -w4 "+param_set["w4"]
-    self.__command_line += " -w5 "+param_set["w5"]
-    self.__command_line += " -w6 "+param_set["w6"]
-    self.__command_line += " -wmin "+param_set["wmin"]
-    self.__command_line += "\n"
-
-  ### Read the standard output from the model ###
-  def __read_output( self, output ):
-    #~~~~~~~~~~~~~~~~~~~~~~~~~#
-    # 1) Read the model ouput #
-    #~~~~~~~~~~~~~~~~~~~~~~~~~#
-    output           = output.strip("\n").split(" ")
-    likelihood       = float(output[0])
-    empty_likelihood = float(output[1])
-    max_likelihood   = float(output[2])
-    empty_score      = float(output[3])
-    score            = float(output[4])
-    #~~~~~~~~~~~~~~~~~~~~~~~~~#
-    # 2) Build the results    #
-    #~~~~~~~~~~~~~~~~~~~~~~~~~#
-    self.__results                     = {}
-    self.__results["likelihood"]       = likelihood
-    self.__results["empty_likelihood"] = empty_likelihood
-    self.__results["max_likelihood"]   = max_likelihood
-    self.__results["empty_score"]      = empty_score
-    self.__results["score"]            = score
-
-  ### Run one model session ###
-  def run_model( self ):
-    assert self.__command_line != "", "You must build the command line."
-    model_stdout = subprocess.Popen([self.__command_line], stdout=subprocess.PIPE, shell=True)
+  def __build_command_line( self, param_set, score_iterations ):
+    command_line  = self.__model_run
+    command_line += " -map "+self.__input_folder+"/map.txt"
+    command_line += " -network "+self.__input_folder+"/network.txt"
+    command_line += " -sample "+self.__input_folder+"/sample.txt"
+    command_line += " -landscape "+self.__input_folder+"/landscape.bin"
+    command_line += " -typeofdata "+param_set["typeofdata"]
+    command_line += " -seed "+str(np.random.randint(1,100000000))
+    command_line += " -reps "+str(self.__model_reps)
+    command_line += " -iters "+param_set["iters"]
+    command_line += " -law "+param_set["law"]
+    command_line += " -optimfunc "+param_set["optimfunc"]
+    command_line += " -humanactivity "+param_set["humanactivity"]
+    command_line += " -xintro "+param_set["xintro"]
+    command_line += " -yintro "+param_set["yintro"]
+    command_line += " -pintro "+param_set["pintro"]
+    command_line += " -lambda "+param_set["lambda"]
+    command_line += " -mu "+param_set["mu"]
+    command_line += " -sigma "+param_set["sigma"]
+    command_line += " -gamma "+param_set["gamma"]
+    command_line += " -w1 "+param_set["w1"]
+    command_line += " -w2 "+param_set["w2"]
+    command_line += " -w3 "+param_set["w3"]
+    command_line += " -w4 "+param_set["w4"]
+    command_line += " -w5 "+param_set["w5"]
+    command_line += " -w6 "+param_set["w6"]
+    command_line += " -wmin "+param_set["wmin"]
+    if len(self.__score_at) > 0:
+      command_line += " -score-at "+",".join([str(iteration) for iteration in score_iterations])
+    command_line += "\n"
+    return command_line
+
+  ### Build the in-process run parameters from a parameters set ###
+  def __build_run_parameters( self, param_set ):
+    run_parameters                  = {}
+    run_parameters["typeofdata"]    = param_set["typeofdata"]
+    run_parameters["law"]           = param_set["law"]
+    run_parameters["optimfunc"]     = param_set["optimfunc"]
+    run_parameters["humanactivity"] = param_set["humanactivity"]
+    for param in ["xintro", "yintro", "pintro", "lambda", "mu", "sigma", "gamma", "w1", "w2", "w3", "w4", "w5", "w6", "wmin"]:
+      run_parameters[param] = float(param_set[param])
+    return run_parameters, np.random.randint(1,100000000)
+
+  ### Build a run (command line or in-process) from a parameters set ###
+  ### (the seed is drawn here, so runs must be built in replay order) ###
+  def __build_run( self, param_set ):
+    run                     = {}
+    run["score_iterations"] = sorted(set(self.__score_at+[int(param_set["iters"])]))
+    assert run["score_iterations"][-1] == int(param_set["iters"]), "Score iterations must not exceed the number of iterations."
+    if self.__landscape is None:
+      run["command_line"] = self.__build_command_line(param_set, run["score_iterations"])
+    else:
+      run["parameters"], run["seed"] = self.__build_run_parameters(param_set)
+      run["iterations"]              = int(param_set["iters"])
+    return run
+
+  ### Load the landscape in memory if the extension module is used ###
+  def load_landscape( self ):
+    if self.__model_lib == "":
+      return
+    sys.path.insert(0, self.__model_lib)
+    import HMD_model
+    self.__module_file = HMD_model.__file__
+    self.__landscape   = HMD_model.Landscape(self.__input_folder+"/map.txt", self.__input_folder+"/network.txt", self.__input_folder+"/sample.txt", cache=self.__input_folder+"/landscape.bin")
+
+  ### Read the standard output from the model (one line of scores by iteration) ###
+  def __read_output( self, output, score_iterations ):
+    horizons = []
+    for line in output.strip("\n").split("\n"):
+      line = line.split(" ")
+      horizons.append([float(value) for value in line[0:5]])
+    return self.__read_horizons(horizons, score_iterations)
+
+  ### Build the results from the model scores of each iteration ###
+  def __read_horizons( self, horizons, score_iterations ):
+    results                   = self.__read_scores(horizons[-1])
+    results["horizon_scores"] = {}
+    for i in range(len(horizons)):
+      results["horizon_scores"][score_iterations[i]] = horizons[i][4]
+    return results
+
+  ### Build the results from the model scores ###
+  def __read_scores( self, scores ):
+    results                     = {}
+    results["likelihood"]       = scores[0]
+    results["empty_likelihood"] = scores[1]
+    results["max_likelihood"]   = scores[2]
+    results["empty_score"]      = scores[3]
+    results["score"]            = scores[4]
+    return results
+
+  ### Build the key of a run in the result cache ###
+  def __build_cache_key( self, run ):
+    if self.__landscape is None:
+      return self.__cache.build_command_key(run["command_line"])
+    input_files = [self.__input_folder+"/map.txt", self.__input_folder+"/network.txt", self.__input_folder+"/sample.txt"]
+    values      = [param+"="+repr(run["parameters"][param]) for param in sorted(run["parameters"].keys())]
+    values     += [self.__model_reps, run["iterations"], run["seed"], ",".join([str(iteration) for iteration in run["score_iterations"]])]
+    return self.__cache.build_key(self.__module_file, input_files, values)
+
+  ### Simulate one model session and return the standard output of the model ###
+  ### (the extension module scores are printed as HMD_model_run prints them)  ###
+  def __simulate( self, run ):
+    if self.__landscape is not None:
+      horizons = self.__landscape.run(run["parameters"], self.__model_reps, run["iterations"], run["seed"], score_at=run["score_iterations"])
+      return "".join([" ".join(["%g" % value for value in horizon])+"\n" for horizon in horizons])
+    model_stdout = subprocess.Popen([run["command_line"]], stdout=subprocess.PIPE, shell=True, encoding='utf8')
     output       = model_stdout.stdout.read()
-    self.__read_output(output)
+    model_stdout.wait()
+    return output
+
+  ### Run one model session and return the results ###
+  ### (simulations found in the result cache are not run again) ###
+  def run_model( self, run ):
+    if self.__cache is None:
+      return self.__read_output(self.__simulate(run), run["score_iterations"])
+    key    = self.__build_cache_key(run)
+    output = self.__cache.load(key)
+    if output is None:
+      output = self.__simulate(run)
+      self.__cache.store(key, output)
+    return self.__read_output(output, run["score_iterations"])
+
+  ### Replay one repetition of a candidate (called by the workers) ###
+  def __replay( self, replay ):
+    candidate, rep, run = replay
+    return candidate, rep, self.run_model(run)
 
   ### Order CMA-ES scores in a vector ###
   def __build_ordered_CMAES_scores( self ):
@@ -120,96 +207,366 @@ class Validate:
       self.__ordered_CMAES_scores.append(score)
     self.__ordered_CMAES_scores.sort()
 
+  ### Build the key of a parameters set from the hash of its values ###
+  ### (occurrence > 0 for identical sets listed several times)      ###
+  def __build_key( self, param_set, occurrence ):
+    values = [param_set[var] for var in self.__variables]
+    if occurrence > 0:
+      values.append(str(occurrence))
+    return hashlib.sha1(" ".join(values).encode("utf8")).hexdigest()[0:16]
+
+  ### Build the header of estimations_all.txt ###
+  def __build_replays_header( self ):
+    return "cmaes replay"+"".join([" replay_"+str(iteration) for iteration in self.__score_at])+" empty max key rep\n"
+
+  ### Load the replays of a previous validation and keep the ones of the current candidates ###
+  def __load_replays( self, candidates ):
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Read the previous replays          #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    replayed = [{} for candidate in candidates]
+    if not os.path.isfile("estimations_all.txt"):
+      return replayed, []
+    index = {}
+    for candidate in range(len(candidates)):
+      index[candidates[candidate][3]] = candidate
+    f      = open("estimations_all.txt", "r")
+    header = f.readline()
+    assert header == self.__build_replays_header(), "estimations_all.txt was built with other options and can not be resumed."
+    columns = header.strip("\n").split(" ")
+    lines   = []
+    for l in f.readlines():
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      # 2) Skip the line being written when   #
+      #    the validation was interrupted     #
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      if not l.endswith("\n") or len(l.split(" ")) != len(columns):
+        continue
+      row = dict(zip(columns, l.strip("\n").split(" ")))
+      rep = int(row["rep"])
+      if row["key"] not in index or rep >= self.__validation_reps or rep in replayed[index[row["key"]]]:
+        continue
+      result                     = {}
+      result["score"]            = float(row["replay"])
+      result["empty_likelihood"] = float(row["empty"])
+      result["max_likelihood"]   = float(row["max"])
+      result["horizon_scores"]   = {}
+      for iteration in self.__score_at:
+        result["horizon_scores"][iteration] = float(row["replay_"+str(iteration)])
+      replayed[index[row["key"]]][rep] = result
+      lines.append(l)
+    f.close()
+    return replayed, lines
+
+
+  ### Write the statistics of a replayed candidate ###
+  def __write_candidate( self, f2, f3, cmaes_score, param_set, results ):
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Sum the replays in rep order       #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    mean_score  = 0.0
+    var_score   = 0.0
+    mean_empty  = 0.0
+    mean_max    = 0.0
+    mean_scores = [0.0]*len(self.__score_at)
+    var_scores  = [0.0]*len(self.__score_at)
+    for result in results:
+      test_score  = result["score"]
+      test_empty  = result["empty_likelihood"]
+      test_max    = result["max_likelihood"]
+      mean_score += test_score
+      var_score  += test_score*test_score
+      mean_empty += test_empty
+      mean_max   += test_max
+      for k in range(len(self.__score_at)):
+        horizon_score   = result["horizon_scores"][self.__score_at[k]]
+        mean_scores[k] += horizon_score
+        var_scores[k]  += horizon_score*horizon_score
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 2) Compute means and variances        #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    mean_score /= float(len(results))
+    var_score  /= float(len(results))
+    var_score  -= mean_score*mean_score
+    mean_empty /= float(len(results))
+    mean_max   /= float(len(results))
+    line        = str(cmaes_score)+" "+str(mean_score)+" "+str(var_score)
+    for k in range(len(self.__score_at)):
+      mean_scores[k] /= float(len(results))
+      var_scores[k]  /= float(len(results))
+      var_scores[k]  -= mean_scores[k]*mean_scores[k]
+      line           += " "+str(mean_scores[k])+" "+str(var_scores[k])
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 3) Write the statistics               #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    f2.write(line+"\n")
+    f2.flush()
+    line = ""
+    for var in self.__variables:
+      line += str(param_set[var])+" "
+    line += str(mean_score)+" "+str(var_score)+" "+str(mean_empty)+" "+str(mean_max)
+    if self.__racing_round > 0:
+      line += " "+str(len(results))
+    f3.write(line+"\n")
+    f3.flush()
+    if self.__models_table is not None:
+      self.__models_table.write(line)
+
+  ### Run replays on the workers and stream them in estimations_all.txt as they finish ###
+  def __run_replays( self, pool, f1, candidates, replays ):
+    if pool is not None:
+      results = pool.imap_unordered(self.__replay, replays)
+    else:
+      results = map(self.__replay, replays)
+    for candidate, rep, result in results:
+      line = str(candidates[candidate][1])+" "+str(result["score"])
+      for iteration in self.__score_at:
+        line += " "+str(result["horizon_scores"][iteration])
+      line += " "+str(result["empty_likelihood"])+" "+str(result["max_likelihood"])
+      line += " "+candidates[candidate][3]+" "+str(rep)
+      f1.write(line+"\n")
+      f1.flush()
+      if self.__replays_table is not None:
+        self.__replays_table.write(line)
+      yield candidate, rep, result
+
+  ### Print the progress of the validation ###
+  def __print_candidate( self, candidate, replays ):
+    i, cmaes_score, param_set, key = candidate
+    print("> Score "+str(cmaes_score)+" ("+str(len(self.__models[cmaes_score]))+" model(s), "+str(round(float(i+1)/float(self.__validation_range)*100.0, 4))+"%, "+str(replays)+" replays) ...")
+
+  ### Write, in order, the candidates whose replays are all done ###
+  def __write_finished_candidates( self, f2, f3, candidates, candidate_results, remaining, next_candidate ):
+    while next_candidate < len(candidates) and remaining[next_candidate] == 0:
+      self.__print_candidate(candidates[next_candidate], self.__validation_reps)
+      self.__write_candidate(f2, f3, candidates[next_candidate][1], candidates[next_candidate][2], candidate_results[next_candidate])
+      candidate_results[next_candidate] = None
+      next_candidate                   += 1
+    return next_candidate
+
+  ### Replay every candidate validation_reps times ###
+  def __run_exhaustive( self, pool, f1, f2, f3, candidates, runs, replayed ):
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Queue the missing replays in       #
+    #    serial order                       #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    candidate_results = [[None]*self.__validation_reps for candidate in candidates]
+    remaining         = [self.__validation_reps]*len(candidates)
+    replays           = []
+    for candidate in range(len(candidates)):
+      for rep in range(self.__validation_reps):
+        if rep in replayed[candidate]:
+          candidate_results[candidate][rep]  = replayed[candidate][rep]
+          remaining[candidate]              -= 1
+        else:
+          replays.append((candidate, rep, runs[candidate][rep]))
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 2) Write the candidates in order once #
+    #    all their replays are done         #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    next_candidate = self.__write_finished_candidates(f2, f3, candidates, candidate_results, remaining, 0)
+    for candidate, rep, result in self.__run_replays(pool, f1, candidates, replays):
+      candidate_results[candidate][rep]  = result
+      remaining[candidate]              -= 1
+      next_candidate                     = self.__write_finished_candidates(f2, f3, candidates, candidate_results, remaining, next_candidate)
+
+  ### Replay the candidates by rounds, dropping the ones that are clearly worse than the best ###
+  def __run_racing( self, pool, f1, f2, f3, candidates, runs, replayed ):
+    candidate_results = [[None]*self.__validation_reps for candidate in candidates]
+    for candidate in range(len(candidates)):
+      for rep in replayed[candidate].keys():
+        candidate_results[candidate][rep] = replayed[candidate][rep]
+    active            = list(range(len(candidates)))
+    done              = 0
+    while done < self.__validation_reps:
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      # 1) Replay the next round of the       #
+      #    remaining candidates               #
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      last    = min(done+self.__racing_round, self.__validation_reps)
+      replays = []
+      for candidate in active:
+        for rep in range(done, last):
+          if candidate_results[candidate][rep] is None:
+            replays.append((candidate, rep, runs[candidate][rep]))
+      for candidate, rep, result in self.__run_replays(pool, f1, candidates, replays):
+        candidate_results[candidate][rep] = result
+      done = last
+      if done == self.__validation_reps:
+        break
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      # 2) Compute the confidence intervals   #
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      lower = {}
+      upper = {}
+      for candidate in active:
+        mean_score = 0.0
+        var_score  = 0.0
+        for result in candidate_results[candidate][0:done]:
+          mean_score += result["score"]
+          var_score  += result["score"]*result["score"]
+        mean_score        /= float(done)
+        var_score         /= float(done)
+        var_score         -= mean_score*mean_score
+        half_width         = self.__racing_z*np.sqrt(max(var_score, 0.0)/float(done-1))
+        lower[candidate]   = mean_score-half_width
+        upper[candidate]   = mean_score+half_width
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      # 3) Drop the candidates whose interval #
+      #    lies above the best one            #
+      #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+      best_upper = min([upper[candidate] for candidate in active])
+      remaining  = []
+      for candidate in active:
+        if lower[candidate] > best_upper:
+          self.__print_candidate(candidates[candidate], done)
+          self.__write_candidate(f2, f3, candidates[candidate][1], candidates[candidate][2], candidate_results[candidate][0:done])
+          candidate_results[candidate] = None
+        else:
+          remaining.append(candidate)
+      active = remaining
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 4) Write the remaining candidates     #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    for candidate in active:
+      self.__print_candidate(candidates[candidate], done)
+      self.__write_candidate(f2, f3, candidates[candidate][1], candidates[candidate][2], candidate_results[candidate])
+
   ### Run the validation of CMA-ES scores ###
   def run_validation( self ):
-    #~~~~~~~~~~~~~~~~~~~~~~~~~#
-    # 1) Order CMA-ES scores  #
-    #~~~~~~~~~~~~~~~~~~~~~~~~~#
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Order CMA-ES scores                #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
     self.__build_ordered_CMAES_scores()
-    #~~~~~~~~~~~~~~~~~~~~~~~~~#
-    # 2) Open output files    #
-    #~~~~~~~~~~~~~~~~~~~~~~~~~#
-    f1 = open("estimations_all.txt", "w")
-    f1.write("cmaes replay\n")
-    f2 = open("estimations_mean.txt", "w")
-    f2.write("cmaes replay_mean replay_var\n")
-    f3 = open("rebuilt_list_of_parameter_sets.txt", "w")
-    f3.write(self.__file_header.strip("\n")+" replay_mean replay_var empty max\n")
-    #~~~~~~~~~~~~~~~~~~~~~~~~~#
-    # 3) Start the validation #
-    #~~~~~~~~~~~~~~~~~~~~~~~~~#
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 2) Build the runs in serial order     #
+    #    (racing uses the same seeds)       #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
     assert self.__validation_range <= self.__N, "The validation range must be lower or equal to the total number of models."
+    candidates  = []
+    runs        = []
+    occurrences = {}
     for i in range(self.__validation_range):
       cmaes_score = self.__ordered_CMAES_scores[i]
       for param_set in self.__models[cmaes_score]:
-        mean_score  = 0.0
-        var_score   = 0.0
-        mean_empty  = 0.0
-        mean_max    = 0.0
-        print "> Score "+str(cmaes_score)+" ("+str(len(self.__models[cmaes_score]))+" model(s), "+str(round(float(i+1)/float(self.__validation_range)*100.0, 4))+"%) ..."
-        for j in range(self.__validation_reps):
-          #print "  - rep "+str(j+1)+" ..."
-          self.__build_command_line(param_set)
-          self.run_model()
-          test_score  = self.__results["score"]
-          test_empty  = self.__results["empty_likelihood"]
-          test_max    = self.__results["max_likelihood"]
-          mean_score += test_score
-          var_score  += test_score*test_score
-          mean_empty += test_empty
-          mean_max   += test_max
-          f1.write(str(cmaes_score)+" "+str(test_score)+"\n")
-          f1.flush()
-        mean_score /= float(self.__validation_reps)
-        var_score  /= float(self.__validation_reps)
-        var_score  -= mean_score*mean_score
-        mean_empty /= float(self.__validation_reps)
-        mean_max   /= float(self.__validation_reps)
-        f2.write(str(cmaes_score)+" "+str(mean_score)+" "+str(var_score)+"\n")
-        f2.flush()
-        line = ""
-        for var in self.__variables:
-          line += str(param_set[var])+" "
-        line += str(mean_score)+" "+str(var_score)+" "+str(mean_empty)+" "+str(mean_max)+"\n"
-        f3.write(line)
-        f3.flush()
+        key               = self.__build_key(param_set, 0)
+        occurrences[key]  = occurrences.get(key, -1)+1
+        runs.append([self.__build_run(param_set) for j in range(self.__validation_reps)])
+        candidates.append((i, cmaes_score, param_set, self.__build_key(param_set, occurrences[key])))
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 3) Open output files, keeping the     #
+    #    previous replays when resuming     #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    replayed = [{} for candidate in candidates]
+    lines    = []
+    if self.__resume:
+      replayed, lines = self.__load_replays(candidates)
+      print("> Resume the validation ("+str(len(lines))+" replays already done)")
+    f1 = open("estimations_all.txt.tmp", "w")
+    f1.write(self.__build_replays_header())
+    f1.writelines(lines)
+    f1.flush()
+    os.fsync(f1.fileno())
+    f1.close()
+    os.replace("estimations_all.txt.tmp", "estimations_all.txt")
+    f1 = open("estimations_all.txt", "a")
+    f2 = open("estimations_mean.txt", "w")
+    f2.write("cmaes replay_mean replay_var"+"".join([" replay_mean_"+str(iteration)+" replay_var_"+str(iteration) for iteration in self.__score_at])+"\n")
+    f3 = open("rebuilt_list_of_parameter_sets.txt", "w")
+    f3.write(self.__file_header.strip("\n")+" replay_mean replay_var empty max"+(" replays" if self.__racing_round > 0 else "")+"\n")
+    if self.__database != "":
+      self.__replays_table = results_db.Table_Writer(self.__database, "replays", self.__scenario, self.__build_replays_header(), lines)
+      self.__models_table  = results_db.Table_Writer(self.__database, "validated_models", self.__scenario, self.__file_header.strip("\n")+" replay_mean replay_var empty max"+(" replays" if self.__racing_round > 0 else ""))
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 4) Run the replays on the workers     #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    pool = None
+    if self.__jobs > 1:
+      pool = ThreadPool(self.__jobs)
+    if self.__racing_round > 0:
+      self.__run_racing(pool, f1, f2, f3, candidates, runs, replayed)
+    else:
+      self.__run_exhaustive(pool, f1, f2, f3, candidates, runs, replayed)
+    if pool is not None:
+      pool.close()
+      pool.join()
     f1.close()
     f2.close()
     f3.close()
+    if self.__database != "":
+      self.__replays_table.close()
+      self.__models_table.close()
 
 ### Print help ###
 def printHelp():
-  print ""
-  print "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
-  print "                               * Validate *                                "
-  print "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
-  print "Usage: python validate.py -h or --help";
-  print "   or: python validate.py [list of mandatory arguments]";
-  print "Options are:"
-  print "  -h, --help"
-  print "        print this help, then exit"
-  print "  -models, --models <list_of_models> (mandatory)"
-  print "        Specify the emplacement of the file containing the list of models"
-  print "  -input, --input <input files> (mandatory)"
-  print "        Specify the emplacement of the input files"
-  print "        (map.txt, network.txt, sample.txt)"
-  print "  -model-run, --model-run <Model run executable> (mandatory)"
-  print "        Specify the emplacement of model_run executable"
-  print "  -model-reps, --model-reps <model_run reps> (mandatory)"
-  print "        Specify the number of repetitions of each model simulation"
-  print "  -validation-reps, --validation-reps <validation reps> (mandatory)"
-  print "        Specify the number of repetitions for each CMA-ES validation"
-  print "  -validation-range, --validation-range <validation range> (mandatory)"
-  print "        Specify the validation range"
-  print ""
+  print("")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("                               * Validate *                                ")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("Usage: python validate.py -h or --help")
+  print("   or: python validate.py [list of mandatory arguments]")
+  print("Options are:")
+  print("  -h, --help")
+  print("        print this help, then exit")
+  print("  -models, --models <list_of_models> (mandatory)")
+  print("        Specify the emplacement of the file containing the list of models")
+  print("  -input, --input <input files> (mandatory)")
+  print("        Specify the emplacement of the input files")
+  print("        (map.txt, network.txt, sample.txt)")
+  print("  -model-run, --model-run <Model run executable> (mandatory)")
+  print("        Specify the emplacement of model_run executable")
+  print("  -model-lib, --model-lib <HMD_model extension folder>")
+  print("        Run the simulations in-process with the HMD_model extension module")
+  print("        found in this folder (e.g. build/lib) instead of model_run")
+  print("  -model-reps, --model-reps <model_run reps> (mandatory)")
+  print("        Specify the number of repetitions of each model simulation")
+  print("  -validation-reps, --validation-reps <validation reps> (mandatory)")
+  print("        Specify the number of repetitions for each CMA-ES validation")
+  print("  -validation-range, --validation-range <validation range> (mandatory)")
+  print("        Specify the validation range")
+  print("  -score-at, --score-at <iteration,iteration,...>")
+  print("        Also replay the scores at the listed iterations of each simulation")
+  print("        (replay_<iteration> columns)")
+  print("  -jobs, --jobs <number of jobs>")
+  print("        Run the replays on a pool of workers (default 1). Replays are written")
+  print("        in estimations_all.txt as they finish; means and variances are the")
+  print("        same as with one job")
+  print("  -racing, --racing <replays by round>")
+  print("        Replay the models by rounds and drop the ones whose confidence interval")
+  print("        lies above the interval of the best model. The remaining models get the")
+  print("        full validation reps, with the same seeds as without racing")
+  print("  -racing-z, --racing-z <z>")
+  print("        Half-width of the confidence intervals, in standard errors (default 3)")
+  print("  -resume, --resume")
+  print("        Keep the replays found in estimations_all.txt (identified by a hash of")
+  print("        the parameters set and the replay number) and only run the missing ones")
+  print("  -seed, --seed <seed>")
+  print("        Seed the draw of the simulation seeds (default: random). With a seed, the")
+  print("        same replays are run again, and found in the result cache")
+  print("  -cache, --cache <folder>")
+  print("        Specify the result cache folder (default: cache at the root of the")
+  print("        repository). Simulations are identified by the hashes of the binary and")
+  print("        of the input files, the parameter values, reps, iters and seed")
+  print("        (only used with -seed: random seeds never find a simulation again)")
+  print("  -cache-size, --cache-size <size in MB>")
+  print("        Maximal size of the result cache; the least recently used simulations")
+  print("        are removed first (default "+str(result_cache.DEFAULT_SIZE)+")")
+  print("  -no-cache, --no-cache")
+  print("        Do not use the result cache")
+  print("  -db, --db <database>")
+  print("        Also append the replays and the replayed models to this SQLite results")
+  print("        database (see results_db.py), one transaction by row")
+  print("  -scenario, --scenario <name>")
+  print("        Name of the scenario in the results database (e.g. 1-isotropic)")
+  print("")
 
 ### Print header ###
 def printHeader():
-  print ""
-  print "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
-  print "                               * Validate *                                "
-  print "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
-  print ""
+  print("")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("                               * Validate *                                ")
+  print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+  print("")
 
 ### Read command line arguments ###
 def readArgs( argv ):
@@ -217,9 +574,21 @@ def readArgs( argv ):
   arguments["models"]           = ""
   arguments["input"]            = ""
   arguments["model-run"]        = ""
+  arguments["model-lib"]        = ""
   arguments["model-reps"]       = 0
   arguments["validation-reps"]  = 0
   arguments["validation-range"] = 0
+  arguments["score-at"]         = []
+  arguments["jobs"]             = 1
+  arguments["racing"]           = 0
+  arguments["racing-z"]         = 3.0
+  arguments["resume"]           = False
+  arguments["seed"]             = 0
+  arguments["cache"]            = result_cache.DEFAULT_FOLDER
+  arguments["cache-size"]       = result_cache.DEFAULT_SIZE
+  arguments["no-cache"]         = False
+  arguments["db"]               = ""
+  arguments["scenario"]         = ""
   provided                      = {}
   provided["models"]            = False
   provided["input"]             = False
@@ -240,6 +609,8 @@ def readArgs( argv ):
     if argv[i] == "-model-run" or argv[i] == "--model-run":
       arguments["model-run"] = argv[i+1]
       provided["model-run"]  = True
+    if argv[i] == "-model-lib" or argv[i] == "--model-lib":
+      arguments["model-lib"] = argv[i+1]
     if argv[i] == "-model-reps" or argv[i] == "--model-reps":
       arguments["model-reps"] = int(argv[i+1])
       provided["model-reps"]  = True
@@ -249,9 +620,31 @@ def readArgs( argv ):
     if argv[i] == "-validation-range" or argv[i] == "--validation-range":
       arguments["validation-range"] = int(argv[i+1])
       provided["validation-range"]  = True
+    if argv[i] == "-score-at" or argv[i] == "--score-at":
+      arguments["score-at"] = sorted(set([int(iteration) for iteration in argv[i+1].split(",")]))
+    if argv[i] == "-jobs" or argv[i] == "--jobs":
+      arguments["jobs"] = int(argv[i+1])
+    if argv[i] == "-racing" or argv[i] == "--racing":
+      arguments["racing"] = int(argv[i+1])
+    if argv[i] == "-racing-z" or argv[i] == "--racing-z":
+      arguments["racing-z"] = float(argv[i+1])
+    if argv[i] == "-resume" or argv[i] == "--resume":
+      arguments["resume"] = True
+    if argv[i] == "-seed" or argv[i] == "--seed":
+      arguments["seed"] = int(argv[i+1])
+    if argv[i] == "-cache" or argv[i] == "--cache":
+      arguments["cache"] = argv[i+1]
+    if argv[i] == "-cache-size" or argv[i] == "--cache-size":
+      arguments["cache-size"] = int(argv[i+1])
+    if argv[i] == "-no-cache" or argv[i] == "--no-cache":
+      arguments["no-cache"] = True
+    if argv[i] == "-db" or argv[i] == "--db":
+      arguments["db"] = argv[i+1]
+    if argv[i] == "-scenario" or argv[i] == "--scenario":
+      arguments["scenario"] = argv[i+1]
   for item in provided.items():
     if not item[1]:
-      print "You must provide a value for argument -"+item[0]
+      print("You must provide a value for argument -"+item[0])
       sys.exit()
   return arguments
 
@@ -262,9 +655,17 @@ def assertArgs( arguments ):
   assert os.path.isfile(arguments["input"]+"/network.txt"), "The file "+arguments["input"]+"/network.txt does not exist"
   assert os.path.isfile(arguments["input"]+"/sample.txt"), "The file "+arguments["input"]+"/sample.txt does not exist"
   assert os.path.isfile(arguments["model-run"]), "The file "+arguments["model-run"]+" does not exist"
+  assert arguments["model-lib"] == "" or os.path.isdir(arguments["model-lib"]), "The folder "+arguments["model-lib"]+" does not exist"
   assert arguments["model-reps"] > 0, "The number of model run repetitions must be positive"
   assert arguments["validation-reps"] > 0, "The number of validation repetitions must be positive"
   assert arguments["validation-range"] > 0, "The validation range must be positive"
+  assert len(arguments["score-at"]) == 0 or arguments["score-at"][0] >= 0, "The score iterations must be positive"
+  assert arguments["jobs"] > 0, "The number of jobs must be positive"
+  assert arguments["racing"] == 0 or arguments["racing"] >= 2, "The number of replays by racing round must be at least 2"
+  assert arguments["racing-z"] > 0.0, "The racing z must be positive"
+  assert arguments["seed"] >= 0, "The seed must not be negative"
+  assert arguments["cache-size"] > 0, "The size of the result cache must be positive"
+  assert arguments["db"] == "" or arguments["scenario"] != "", "The results database needs a scenario name (-scenario)"
 
 
 ######################
@@ -283,9 +684,16 @@ if __name__ == '__main__':
   #~~~~~~~~~~~~~~~~~~~~~~~#
   # 2) Run the validation #
   #~~~~~~~~~~~~~~~~~~~~~~~#
+  if arguments["seed"] > 0:
+    np.random.seed(arguments["seed"])
+  cache = None
+  if arguments["seed"] > 0 and not arguments["no-cache"]:
+    cache = result_cache.Result_Cache(arguments["cache"], arguments["cache-size"])
   validation = Validate(arguments["models"], arguments["input"],
-                        arguments["model-run"], arguments["model-reps"],
-                        arguments["validation-reps"], arguments["validation-range"])
+                        arguments["model-run"], arguments["model-lib"], arguments["model-reps"],
+                        arguments["validation-reps"], arguments["validation-range"], arguments["score-at"], arguments["jobs"],
+                        arguments["racing"], arguments["racing-z"], arguments["resume"], cache, arguments["db"], arguments["scenario"])
   validation.load_models()
+  validation.load_landscape()
   validation.run_validation()
 
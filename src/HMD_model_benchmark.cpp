@@ -0,0 +1,250 @@
+#include "../cmake/Config.h"
+
+#include <iostream>
+#include <fstream>
+#include <sstream>
+#include <cstring>
+#include <cmath>
+#include <chrono>
+#include <unordered_map>
+#include <assert.h>
+
+#include "./lib/Parameters.h"
+#include "./lib/Landscape.h"
+#include "./lib/Graph.h"
+
+void printUsage( void );
+void readArgs( int argc, char const** argv, Parameters* parameters, int* walks, double* length );
+
+
+/**
+ * \brief    main function
+ * \details  Microbenchmark of the self-avoiding random walk: runs a number
+ *           of walks of fixed length from random nodes of the landscape and
+ *           prints the walk throughput
+ * \param    int argc
+ * \param    char const** argv
+ * \return   \e int
+ */
+int main(int argc, char const** argv)
+{
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 1) Read command line arguments and load parameters */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  Parameters* parameters = new Parameters();
+  int         walks      = 1000000;
+  double      length     = 30.0;
+  readArgs(argc, argv, parameters, &walks, &length);
+  parameters->set_w1(1.0);
+  parameters->set_w2(1.0);
+  parameters->set_w3(1.0);
+  parameters->set_w4(1.0);
+  parameters->set_w5(1.0);
+  parameters->set_w6(1.0);
+  parameters->set_wmin(0.001);
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 2) Load the landscape and create the graph         */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  Landscape* landscape = new Landscape(parameters->get_map_filename(), parameters->get_network_filename(), parameters->get_sample_filename());
+  Graph*     graph     = new Graph(parameters, landscape);
+  Prng*      prng      = parameters->get_prng();
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 3) Run the walks                                   */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  double steps = 0.0;
+  std::chrono::steady_clock::time_point start = std::chrono::steady_clock::now();
+  for (int walk = 0; walk < walks; walk++)
+  {
+    int    start_index       = prng->uniform(0, graph->get_number_of_nodes()-1);
+    double geodesic_distance = 0.0;
+    graph->walk(start_index, length, prng, 0, &geodesic_distance);
+    steps += geodesic_distance;
+  }
+  double seconds = std::chrono::duration<double>(std::chrono::steady_clock::now()-start).count();
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 4) Print the throughput, free the memory and exit  */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  delete graph;
+  graph = NULL;
+  delete landscape;
+  landscape = NULL;
+  delete parameters;
+  parameters = NULL;
+  std::cout << "walks steps seconds steps_per_second\n";
+  std::cout << walks << " " << steps << " " << seconds << " " << steps/seconds << "\n";
+  return EXIT_SUCCESS;
+}
+
+/**
+ * \brief    Read arguments
+ * \details  --
+ * \param    int argc
+ * \param    char const** argv
+ * \param    Parameters* parameters
+ * \param    int* walks
+ * \param    double* length
+ * \return   \e void
+ */
+void readArgs( int argc, char const** argv, Parameters* parameters, int* walks, double* length )
+{
+  std::unordered_map<std::string, bool> options;
+  options["map"]     = false;
+  options["network"] = false;
+  options["sample"]  = false;
+  for (int i = 0; i < argc; i++)
+  {
+    if (strcmp(argv[i], "-h") == 0 || strcmp(argv[i], "--help") == 0)
+    {
+      printUsage();
+      exit(EXIT_SUCCESS);
+    }
+    if (strcmp(argv[i], "-v") == 0 || strcmp(argv[i], "--version") == 0)
+    {
+      std::cout << PACKAGE << " (" << VERSION_MAJOR << "." << VERSION_MINOR << "." << VERSION_PATCH << ")\n";
+      exit(EXIT_SUCCESS);
+    }
+    if (strcmp(argv[i], "-seed") == 0 || strcmp(argv[i], "--seed") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: command seed value is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else
+      {
+        parameters->set_prng_seed((unsigned)atol(argv[i+1]));
+      }
+    }
+    if (strcmp(argv[i], "-map") == 0 || strcmp(argv[i], "--map") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: map filename is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else
+      {
+        parameters->set_map_filename(argv[i+1]);
+        options["map"] = true;
+      }
+    }
+    if (strcmp(argv[i], "-network") == 0 || strcmp(argv[i], "--network") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: network filename is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else
+      {
+        parameters->set_network_filename(argv[i+1]);
+        options["network"] = true;
+      }
+    }
+    if (strcmp(argv[i], "-sample") == 0 || strcmp(argv[i], "--sample") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: sample filename is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else
+      {
+        parameters->set_sample_filename(argv[i+1]);
+        options["sample"] = true;
+      }
+    }
+    if (strcmp(argv[i], "-walks") == 0 || strcmp(argv[i], "--walks") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: walks value is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else if (atoi(argv[i+1]) < 1)
+      {
+        std::cout << "Error: walks value must be positive.\n";
+        exit(EXIT_FAILURE);
+      }
+      else
+      {
+        *walks = atoi(argv[i+1]);
+      }
+    }
+    if (strcmp(argv[i], "-length") == 0 || strcmp(argv[i], "--length") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: length value is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else if (atof(argv[i+1]) < 1.0)
+      {
+        std::cout << "Error: length value must be at least 1.\n";
+        exit(EXIT_FAILURE);
+      }
+      else
+      {
+        *length = floor(atof(argv[i+1]));
+      }
+    }
+  }
+  bool parameter_lacking = false;
+  for (std::unordered_map<std::string, bool>::iterator it = options.begin(); it != options.end(); ++it)
+  {
+    if (!it->second)
+    {
+      std::cout << "-" << it->first << " option is mandatory.\n";
+      parameter_lacking = true;
+    }
+  }
+  if (parameter_lacking)
+  {
+    exit(EXIT_FAILURE);
+  }
+  options.clear();
+}
+
+/**
+ * \brief    Print usage
+ * \details  --
+ * \param    void
+ * \return   \e void
+ */
+void printUsage( void )
+{
+  std::cout << "\n";
+  std::cout << "***************************************************************************\n";
+#ifdef DEBUG
+  std::cout << " " << PACKAGE << " " << VERSION_MAJOR << "." << VERSION_MINOR << "." << VERSION_PATCH << " ( debug )\n";
+#endif
+#ifdef NDEBUG
+  std::cout << " " << PACKAGE << " " << VERSION_MAJOR << "." << VERSION_MINOR << "." << VERSION_PATCH << " ( release )\n";
+#endif
+  std::cout << "***************************************************************************\n";
+  std::cout << "Usage: HMD_model_benchmark -h or --help\n";
+  std::cout << "   or: HMD_model_benchmark -map <filename> -network <filename> -sample <filename> [options]\n";
+  std::cout << "Runs self-avoiding random walks of fixed length from random cells and\n";
+  std::cout << "prints the walk throughput. All road categories have weight 1 (wmin 0.001).\n";
+  std::cout << "Options are:\n";
+  std::cout << "  -h, --help\n";
+  std::cout << "        print this help, then exit\n";
+  std::cout << "  -v, --version\n";
+  std::cout << "        print the current version, then exit\n";
+  std::cout << "  -seed, --seed <seed>\n";
+  std::cout << "        Specify the prng seed\n";
+  std::cout << "  -network, --network <filename>\n";
+  std::cout << "        Specify the network file\n";
+  std::cout << "  -map, --map <filename>\n";
+  std::cout << "        Specify the map file\n";
+  std::cout << "  -sample, --sample <filename>\n";
+  std::cout << "        Specify the sample file\n";
+  std::cout << "  -walks, --walks <number of walks>\n";
+  std::cout << "        Specify the number of walks (default 1000000)\n";
+  std::cout << "  -length, --length <length>\n";
+  std::cout << "        Specify the length of the walks, in steps (default 30)\n";
+  std::cout << "\n";
+}
@@ -5,9 +5,10 @@ import os
 import sys
 import cma
 import time
-import math
+import pickle
 import subprocess
 import numpy as np
+from multiprocessing.pool import ThreadPool
 
 
 ### Optimizer class ###
@@ -18,14 +19,16 @@ class Optimizer:
 
     #------------------------- PATHS #
 
-    self.param_path = ""
-    self.exec_path  = ""
+    self.param_path     = ""
+    self.exec_path      = ""
+    self.extension_path = ""
 
     #------------------------- INPUTS #
 
-    self.map_filename     = ""
-    self.network_filename = ""
-    self.sample_filename  = ""
+    self.map_filename       = ""
+    self.network_filename   = ""
+    self.sample_filename    = ""
+    self.landscape_filename = ""
 
     #------------------------- PARAMETERS #
 
@@ -37,6 +40,12 @@ class Optimizer:
     self.optimization_function = ""
     self.human_activity_index  = ""
     self.wmin                  = 0.0
+    self.parallel_workers      = 1
+    self.checkpoint_interval   = 1
+    self.score_cutoff_margin   = None
+    self.score_iterations      = []
+    self.landscape             = None
+    self.map_cells             = None
 
     #------------------------- DEFAULT PARAMETERS #
 
@@ -116,7 +125,12 @@ class Optimizer:
     self.likelihood         = 0.0
     self.empty_score        = 0.0
     self.current_score      = 0.0
+    self.censored           = False
+    self.horizon_scores     = []
+    self.best_score         = None
+    self.score_cutoff       = None
     self.counter            = 0
+    self.pool               = None
 
   #### Parse a line and get the list of words ###
   def parse_line( self, line ):
@@ -146,6 +160,9 @@ class Optimizer:
         if l.startswith("EXEC_PATH"):
           data = self.parse_line(l)
           self.exec_path = data[1]
+        elif l.startswith("EXTENSION_PATH"):
+          data = self.parse_line(l)
+          self.extension_path = data[1]
 
         #------------------------- INPUTS #
 
@@ -158,6 +175,9 @@ class Optimizer:
         elif l.startswith("SAMPLE_FILE"):
           data = self.parse_line(l)
           self.sample_filename = data[1]
+        elif l.startswith("LANDSCAPE_FILE"):
+          data = self.parse_line(l)
+          self.landscape_filename = data[1]
 
         #------------------------- PARAMETERS #
 
@@ -189,6 +209,27 @@ class Optimizer:
         elif l.startswith("WMIN"):
           data = self.parse_line(l)
           self.wmin = float(data[1])
+        elif l.startswith("PARALLEL_WORKERS"):
+          data = self.parse_line(l)
+          self.parallel_workers = int(data[1])
+          if self.parallel_workers < 1:
+            print(data[0]+" must be a positive integer.")
+            sys.exit()
+        elif l.startswith("CHECKPOINT_INTERVAL"):
+          data = self.parse_line(l)
+          self.checkpoint_interval = int(data[1])
+          if self.checkpoint_interval < 1:
+            print(data[0]+" must be a positive integer.")
+            sys.exit()
+        elif l.startswith("SCORE_CUTOFF_MARGIN"):
+          data = self.parse_line(l)
+          self.score_cutoff_margin = float(data[1])
+          if self.score_cutoff_margin < 0.0:
+            print(data[0]+" must be a positive number.")
+            sys.exit()
+        elif l.startswith("SCORE_AT"):
+          data = self.parse_line(l)
+          self.score_iterations = [int(iteration) for iteration in data[1].split(",")]
 
         #------------------------- DEFAULT PARAMETERS #
 
@@ -527,6 +568,8 @@ class Optimizer:
     cmd_line += " -map "+self.map_filename
     cmd_line += " -network "+self.network_filename
     cmd_line += " -sample "+self.sample_filename
+    if self.landscape_filename != "":
+      cmd_line += " -landscape "+self.landscape_filename
     cmd_line += " -typeofdata "+self.type_of_data
     cmd_line += " -seed "+str(np.random.randint(1,100000000))
     cmd_line += " -reps "+str(self.repetitions)
@@ -548,8 +591,36 @@ class Optimizer:
     cmd_line += " -w5 "+str(command_line_params["w5"])
     cmd_line += " -w6 "+str(command_line_params["w6"])
     cmd_line += " -wmin "+str(self.wmin)
+    if self.score_cutoff is not None:
+      cmd_line += " -score-cutoff "+str(self.score_cutoff)
+    if len(self.score_iterations) > 0:
+      cmd_line += " -score-at "+",".join([str(iteration) for iteration in self.get_score_iterations()])
     return cmd_line
 
+  ### Get the iterations at which the score is computed (the last one is optimized) ###
+  def get_score_iterations( self ):
+    score_iterations = sorted(set(self.score_iterations+[self.iterations]))
+    if score_iterations[0] < 0 or score_iterations[-1] > self.iterations:
+      print("Error: SCORE_AT iterations must be between 0 and NUMBER_OF_ITERATIONS.")
+      sys.exit()
+    return score_iterations
+
+  ### Build the parameters of an in-process run (same seed draw as the command line) ###
+  def build_run_parameters( self ):
+    run_params                  = {}
+    run_params["typeofdata"]    = self.type_of_data
+    run_params["law"]           = self.jump_law
+    run_params["optimfunc"]     = self.optimization_function
+    run_params["humanactivity"] = self.human_activity_index
+    for param in self.to_optimize.keys():
+      if self.to_optimize[param]:
+        run_params[param] = self.current_parameters[param]
+      else:
+        run_params[param] = self.default_parameters[param]
+    run_params["wmin"] = self.wmin
+    seed               = np.random.randint(1,100000000)
+    return run_params, seed
+
   ### Build best and mean command lines ###
   def build_optimized_command_lines( self ):
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
@@ -616,40 +687,65 @@ class Optimizer:
     return best_cmd_line, mean_cmd_line
 
   ### Get cell id from coordinates ###
+  ### (closest cell of the map, as the introduction node of HMD_model_run) ###
   def get_cell_from_coordinates( self, cell_x, cell_y ):
-    best_dist = 1e+10
-    best_id   = -1
-    f = open(self.sample_filename, "r")
-    l = f.readline()
-    while l:
-      l = l.strip("\n").split(" ")
-      cell_id = int(l[0])
-      x       = float(l[1])
-      y       = float(l[2])
-      dist    = math.sqrt((x-cell_x)*(x-cell_x)+(y-cell_y)*(y-cell_y))
-      if best_dist > dist:
-        best_dist = dist
-        best_id   = cell_id
-      l = f.readline()
-    f.close()
-    if best_id == -1:
-      print("Error during cell id extraction from coordinates. Exit.")
-      sys.exit()
-    return best_id
+    if self.landscape is not None:
+      return self.landscape.get_cells([cell_x], [cell_y])[0]
+    if self.map_cells is None:
+      self.map_cells = np.loadtxt(self.map_filename, usecols=(0, 1, 2), ndmin=2)
+    dist = np.sqrt((cell_x-self.map_cells[:,1])*(cell_x-self.map_cells[:,1])+(cell_y-self.map_cells[:,2])*(cell_y-self.map_cells[:,2]))
+    return int(self.map_cells[np.argmin(dist),0])
 
-  ### Read the standard output from HMD_model_run ###
+  ### Read the standard output from HMD_model_run (one line of scores by iteration) ###
   def read_HMD_model_output( self, HMD_model_output ):
-    output                = HMD_model_output.strip("\n").split(" ")
-    self.likelihood       = float(output[0])
-    self.empty_likelihood = float(output[1])
-    self.max_likelihood   = float(output[2])
-    self.empty_score      = float(output[3])
-    self.current_score    = float(output[4])
+    horizons = []
+    for line in HMD_model_output.strip("\n").split("\n"):
+      output = line.split(" ")
+      horizons.append([float(value) for value in output[0:6]])
+    self.read_HMD_model_horizons(horizons)
+
+  ### Read the scores of each iteration, the last one being optimized     ###
+  ### (rounded to the 6 significant digits printed by HMD_model_run, so   ###
+  ### that the extension module gives the same scores and output file)   ###
+  def read_HMD_model_horizons( self, horizons ):
+    horizons            = [[float("%g" % value) for value in scores] for scores in horizons]
+    self.horizon_scores = [scores[4] for scores in horizons]
+    self.read_HMD_model_scores(horizons[-1])
+
+  ### Read the scores returned by HMD_model_run or the extension module ###
+  def read_HMD_model_scores( self, scores ):
+    self.likelihood       = scores[0]
+    self.empty_likelihood = scores[1]
+    self.max_likelihood   = scores[2]
+    self.empty_score      = scores[3]
+    self.current_score    = scores[4]
+    self.censored         = (len(scores) > 5 and bool(scores[5]))
+
+  ### Load the landscape in memory if the extension module is used ###
+  def load_landscape( self ):
+    if self.extension_path == "":
+      return
+    sys.path.insert(0, self.extension_path)
+    try:
+      import HMD_model
+    except ImportError:
+      print("Error: HMD_model extension module not found in "+self.extension_path+".")
+      sys.exit()
+    if self.landscape_filename != "":
+      self.landscape = HMD_model.Landscape(self.map_filename, self.network_filename, self.sample_filename, cache=self.landscape_filename)
+    else:
+      self.landscape = HMD_model.Landscape(self.map_filename, self.network_filename, self.sample_filename)
 
   ### Open output file ###
   def open_output_file( self ):
     self.output_file = open("optimization.txt", "w")
 
+  ### Reopen output file at a given offset ###
+  def reopen_output_file( self, offset ):
+    self.output_file = open("optimization.txt", "r+")
+    self.output_file.seek(offset)
+    self.output_file.truncate()
+
   ### Close output file ###
   def close_output_file( self ):
     self.output_file.close()
@@ -659,6 +755,11 @@ class Optimizer:
     line = "L empty_L max_L score empty_score"
     for param in self.default_parameters.keys():
       line += " "+param
+    if len(self.score_iterations) > 0:
+      for iteration in self.get_score_iterations()[:-1]:
+        line += " score_"+str(iteration)
+    if self.score_cutoff_margin is not None:
+      line += " censored"
     self.output_file.write(line+"\n")
     self.output_file.flush()
 
@@ -672,32 +773,127 @@ class Optimizer:
         line += " "+str(self.current_parameters[param])
       else:
         line += " "+str(self.default_parameters[param])
+    if len(self.score_iterations) > 0:
+      for score in self.horizon_scores[:-1]:
+        line += " "+str(score)
+    if self.score_cutoff_margin is not None:
+      line += " "+str(int(self.censored))
     self.output_file.write(line+"\n")
     self.output_file.flush()
 
-  ### Minimization method provided to CMA-ES ###
-  def minimization_function( self, params_vector ):
-    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
-    # 1) Get current parameter values        #
-    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
-    self.vector_to_current_parameters(params_vector)
-    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
-    # 2) Execute HMD_model                   #
-    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
-    HMD_model_cmd_line = self.build_command_line()
-    HMD_model_process  = subprocess.Popen([HMD_model_cmd_line], stdout=subprocess.PIPE, shell=True)
-    HMD_model_output   = HMD_model_process.stdout.read().decode('utf8')
-    self.read_HMD_model_output(HMD_model_output)
-    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
-    # 3) Save the data and return the score  #
-    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  ### Open the worker pool ###
+  def open_worker_pool( self ):
+    self.pool = ThreadPool(self.parallel_workers)
+
+  ### Close the worker pool ###
+  def close_worker_pool( self ):
+    self.pool.close()
+    self.pool.join()
+    self.pool = None
+
+  ### Save the current evaluation and return the score ###
+  def save_evaluation( self ):
     self.write_output_file_data()
+    if not self.censored and (self.best_score is None or self.current_score < self.best_score):
+      self.best_score = self.current_score
     if self.counter%10 == 0:
       os.system("Rscript ./rscripts/optimization.R > /dev/null &")
     self.counter += 1
     #return np.log10(self.current_score)
     return self.current_score
 
+  ### Evaluate a whole CMA-ES population on the worker pool ###
+  def evaluate_population( self, population ):
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 1) Build the runs in order             #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    self.score_cutoff = None
+    if self.score_cutoff_margin is not None and self.best_score is not None:
+      self.score_cutoff = self.best_score+self.score_cutoff_margin
+    runs = []
+    for params_vector in population:
+      self.vector_to_current_parameters(params_vector)
+      if self.landscape is None:
+        runs.append(self.build_command_line())
+      else:
+        runs.append(self.build_run_parameters())
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 2) Execute HMD_model concurrently      #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    if self.landscape is None:
+      HMD_model_outputs = self.pool.map(run_HMD_model, runs)
+    else:
+      score_iterations  = self.get_score_iterations()
+      HMD_model_outputs = self.pool.map(lambda run: self.landscape.run(run[0], self.repetitions, self.iterations, run[1], score_cutoff=self.score_cutoff, score_at=score_iterations), runs)
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 3) Save the data in population order   #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    scores   = []
+    censored = []
+    for i in range(len(population)):
+      self.vector_to_current_parameters(population[i])
+      if self.landscape is None:
+        self.read_HMD_model_output(HMD_model_outputs[i])
+      else:
+        self.read_HMD_model_horizons(HMD_model_outputs[i])
+      scores.append(self.save_evaluation())
+      censored.append(self.censored)
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # 4) Rank the censored candidates last   #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    return self.rank_censored_scores(scores, censored)
+
+  ### Shift the censored scores of a generation above its worst uncensored score ###
+  ### (censored scores are lower bounds; their order is kept)                    ###
+  def rank_censored_scores( self, scores, censored, gap = 1.0 ):
+    uncensored = [scores[i] for i in range(len(scores)) if not censored[i]]
+    bounds     = [scores[i] for i in range(len(scores)) if censored[i]]
+    if len(uncensored) == 0 or len(bounds) == 0:
+      return list(scores)
+    shift = max(0.0, max(uncensored)-min(bounds))+gap
+    return [(scores[i]+shift if censored[i] else scores[i]) for i in range(len(scores))]
+
+  ### Save the optimization state in a checkpoint file ###
+  def save_checkpoint( self, checkpoint_path, cmaes, elapsed ):
+    checkpoint                       = {}
+    checkpoint["cmaes"]              = cmaes
+    checkpoint["random_state"]       = np.random.get_state()
+    checkpoint["counter"]            = self.counter
+    checkpoint["best_score"]         = self.best_score
+    checkpoint["output_offset"]      = self.output_file.tell()
+    checkpoint["elapsed"]            = elapsed
+    checkpoint["vector_length"]      = self.vector_length
+    checkpoint["parameters_index"]   = self.parameters_index
+    checkpoint["current_parameters"] = self.current_parameters
+    f = open(checkpoint_path+".tmp", "wb")
+    pickle.dump(checkpoint, f)
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    os.replace(checkpoint_path+".tmp", checkpoint_path)
+
+  ### Load the optimization state from a checkpoint file ###
+  def load_checkpoint( self, checkpoint_path ):
+    f          = open(checkpoint_path, "rb")
+    checkpoint = pickle.load(f)
+    f.close()
+    self.counter            = checkpoint["counter"]
+    self.best_score         = checkpoint.get("best_score")
+    self.vector_length      = checkpoint["vector_length"]
+    self.parameters_index   = checkpoint["parameters_index"]
+    self.current_parameters = checkpoint["current_parameters"]
+    np.random.set_state(checkpoint["random_state"])
+    self.reopen_output_file(checkpoint["output_offset"])
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    # Pickling copies the numpy generator bound to CMA-ES, so   #
+    # it is plugged back on the global one to share its stream  #
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+    cmaes = checkpoint["cmaes"]
+    cmaes.opts["randn"] = np.random.randn
+    if hasattr(cmaes.sm, "randn"):
+      cmaes.sm.randn = np.random.randn
+    return cmaes, checkpoint["elapsed"]
+
   ### Save the results ###
   def save_results( self, xbest, xmean, score ):
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
@@ -805,6 +1001,13 @@ class Optimizer:
     os.system("cp -r output mean_output")
     os.system("rm -rf output")
 
+### Run HMD_model_run and return its standard output ###
+def run_HMD_model( HMD_model_cmd_line ):
+  HMD_model_process = subprocess.Popen([HMD_model_cmd_line], stdout=subprocess.PIPE, shell=True)
+  HMD_model_output  = HMD_model_process.stdout.read().decode('utf8')
+  HMD_model_process.wait()
+  return HMD_model_output
+
 ### Print help ###
 def printHelp():
   print("")
@@ -812,8 +1015,13 @@ def printHelp():
   print("                               * Optimize *                                ")
   print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
   print("Usage: python HMD_model_optimize.py -h or --help")
-  print("   or: python HMD_model_optimize.py [no arguments needed]")
+  print("   or: python HMD_model_optimize.py [--resume]")
   print("To run, HMD_model_optimize needs a parameters file and the input files.")
+  print("Options are:")
+  print("  -h, --help")
+  print("        print this help, then exit")
+  print("  -resume, --resume")
+  print("        resume the optimization from the last checkpoint")
   print("")
 
 ### Print header ###
@@ -826,10 +1034,14 @@ def printHeader():
 
 ### Read command line arguments ###
 def readArgs( argv ):
+  resume = False
   for i in range(len(argv)):
     if argv[i] == "-h" or argv[i] == "--help":
       printHelp()
       sys.exit()
+    if argv[i] == "-resume" or argv[i] == "--resume":
+      resume = True
+  return resume
 
 
 ######################
@@ -838,12 +1050,13 @@ def readArgs( argv ):
 
 TIME_THRESHOLD  = 180
 PARAMETERS_PATH = "parameters.txt"
+CHECKPOINT_PATH = "optimization_checkpoint.pkl"
 
 if __name__ == '__main__':
   #~~~~~~~~~~~~~~~~~~~~~~~~~~~#
   # 1) Print help if required #
   #~~~~~~~~~~~~~~~~~~~~~~~~~~~#
-  readArgs(sys.argv)
+  resume = readArgs(sys.argv)
   printHeader()
 
   #~~~~~~~~~~~~~~~~~~~~~~~~~~~#
@@ -856,21 +1069,44 @@ if __name__ == '__main__':
   #~~~~~~~~~~~~~~~~~~~~~~~~~~~#
   # 3) Run the optimizer      #
   #~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  optimizer.load_landscape()
+  optimizer.open_worker_pool()
+  if resume and not os.path.isfile(CHECKPOINT_PATH):
+    print(">> No checkpoint found, start a new optimization")
+    resume = False
   success = False
   while not success:
-    optimizer.open_output_file()
-    optimizer.write_output_file_header()
-    vector    = optimizer.build_vector_of_parameters()
-    start     = time.time()
-    cmaes_res = cma.fmin(optimizer.minimization_function, vector, 0.2)
-    end       = time.time()
+    if resume:
+      print(">> Resume the optimization from "+CHECKPOINT_PATH)
+      cmaes, elapsed = optimizer.load_checkpoint(CHECKPOINT_PATH)
+      resume         = False
+    else:
+      optimizer.open_output_file()
+      optimizer.write_output_file_header()
+      vector  = optimizer.build_vector_of_parameters()
+      cmaes   = cma.CMAEvolutionStrategy(vector, 0.2)
+      elapsed = 0.0
+    start      = time.time()-elapsed
+    generation = 0
+    while not cmaes.stop():
+      population = cmaes.ask()
+      cmaes.tell(population, optimizer.evaluate_population(population))
+      cmaes.logger.add()
+      cmaes.disp()
+      generation += 1
+      if generation%optimizer.checkpoint_interval == 0:
+        optimizer.save_checkpoint(CHECKPOINT_PATH, cmaes, time.time()-start)
+    end = time.time()
     optimizer.close_output_file()
     if end-start < TIME_THRESHOLD:
       print(">> Optimization failure, restart")
     else:
-      score   = cmaes_res[1]
-      xbest   = cmaes_res[0]
-      xmean   = cmaes_res[5]
+      score   = cmaes.result.fbest
+      xbest   = cmaes.result.xbest
+      xmean   = cmaes.result.xfavorite
       success = True
       optimizer.save_results(xbest, xmean, score)
+      if os.path.isfile(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+  optimizer.close_worker_pool()
 
@@ -0,0 +1,667 @@
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <iostream>
+#include <fstream>
+#include <string>
+#include <vector>
+#include <cstring>
+#include <assert.h>
+
+#include "./lib/Parameters.h"
+#include "./lib/Landscape.h"
+#include "./lib/Simulation.h"
+
+/**
+ * \brief   Python landscape object
+ * \details Holds a landscape loaded once from the input files, on which any
+ *          number of simulations can be run without re-reading the files
+ */
+typedef struct
+{
+  PyObject_HEAD
+  Landscape* landscape; /*!< Landscape data */
+} PyLandscape;
+
+bool read_double( PyObject* params, const char* key, double& value );
+bool read_choice( PyObject* params, const char* key, std::string& value );
+bool load_parameters( PyObject* params, Parameters* parameters );
+bool load_score_iterations( PyObject* score_at, Parameters* parameters );
+bool read_coordinates( PyObject* sequence, std::vector<double>& coordinates );
+
+
+/*----------------------------
+ * LANDSCAPE OBJECT
+ *----------------------------*/
+
+/**
+ * \brief    Landscape constructor
+ * \details  Landscape(map_filename, network_filename, sample_filename,
+ *           cache=None). With a cache filename, the landscape is loaded from
+ *           the binary landscape file, compiled first if needed
+ * \param    PyLandscape* self
+ * \param    PyObject* args
+ * \param    PyObject* kwds
+ * \return   \e int
+ */
+static int PyLandscape_init( PyLandscape* self, PyObject* args, PyObject* kwds )
+{
+  const char* map_filename     = NULL;
+  const char* network_filename = NULL;
+  const char* sample_filename  = NULL;
+  const char* cache_filename   = NULL;
+  static const char* kwlist[]  = {"map", "network", "sample", "cache", NULL};
+  if (!PyArg_ParseTupleAndKeywords(args, kwds, "sss|z", (char**)kwlist, &map_filename, &network_filename, &sample_filename, &cache_filename))
+  {
+    return -1;
+  }
+  const char* filenames[3] = {map_filename, network_filename, sample_filename};
+  for (int i = 0; i < 3; i++)
+  {
+    std::ifstream file(filenames[i], std::ios::in);
+    if (!file)
+    {
+      PyErr_Format(PyExc_FileNotFoundError, "file %s not found", filenames[i]);
+      return -1;
+    }
+    file.close();
+  }
+  delete self->landscape;
+  Py_BEGIN_ALLOW_THREADS
+  if (cache_filename != NULL)
+  {
+    self->landscape = new Landscape(map_filename, network_filename, sample_filename, cache_filename);
+  }
+  else
+  {
+    self->landscape = new Landscape(map_filename, network_filename, sample_filename);
+  }
+  Py_END_ALLOW_THREADS
+  return 0;
+}
+
+/**
+ * \brief    Landscape destructor
+ * \details  --
+ * \param    PyLandscape* self
+ * \return   \e void
+ */
+static void PyLandscape_dealloc( PyLandscape* self )
+{
+  PyTypeObject* type = Py_TYPE(self);
+  delete self->landscape;
+  self->landscape = NULL;
+  type->tp_free((PyObject*)self);
+  Py_DECREF(type);
+}
+
+/**
+ * \brief    Run a simulation on the landscape
+ * \details  run(params, reps, iters, seed, threads=1, score_cutoff=None,
+ *           score_at=None) returns the tuple (L, empty_L, max_L, empty_score,
+ *           score), as printed by HMD_model_run. params is a dictionary using
+ *           HMD_model_run option names (typeofdata, law, optimfunc,
+ *           humanactivity, xintro, ..., w6, wmin). With a score cutoff, the
+ *           censored flag is appended to the tuple. With a list of score
+ *           iterations, a list with one tuple per iteration is returned (iters
+ *           is appended to the list if it ends before). The GIL is released
+ *           during the simulation, so runs can be spread over threads.
+ * \param    PyLandscape* self
+ * \param    PyObject* args
+ * \param    PyObject* kwds
+ * \return   \e PyObject*
+ */
+static PyObject* PyLandscape_run( PyLandscape* self, PyObject* args, PyObject* kwds )
+{
+  PyObject*          params     = NULL;
+  int                reps       = 0;
+  int                iters      = 0;
+  unsigned long int  seed       = 0;
+  int                threads      = 1;
+  PyObject*          score_cutoff = Py_None;
+  PyObject*          score_at     = Py_None;
+  static const char* kwlist[]     = {"params", "reps", "iters", "seed", "threads", "score_cutoff", "score_at", NULL};
+  if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!iik|iOO", (char**)kwlist, &PyDict_Type, &params, &reps, &iters, &seed, &threads, &score_cutoff, &score_at))
+  {
+    return NULL;
+  }
+  if (self->landscape == NULL)
+  {
+    PyErr_SetString(PyExc_RuntimeError, "the landscape is not loaded");
+    return NULL;
+  }
+  if (reps <= 0 || iters < 0 || threads <= 0)
+  {
+    PyErr_SetString(PyExc_ValueError, "reps and threads must be positive and iters must not be negative");
+    return NULL;
+  }
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 1) Load parameters                                 */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  Parameters* parameters = new Parameters();
+  parameters->set_prng_seed(seed);
+  parameters->set_repetitions(reps);
+  parameters->set_iterations(iters);
+  parameters->set_threads(threads);
+  if (score_cutoff != Py_None)
+  {
+    double cutoff = PyFloat_AsDouble(score_cutoff);
+    if (PyErr_Occurred())
+    {
+      delete parameters;
+      parameters = NULL;
+      return NULL;
+    }
+    parameters->set_score_cutoff(cutoff);
+  }
+  if (!load_parameters(params, parameters) || (score_at != Py_None && !load_score_iterations(score_at, parameters)))
+  {
+    delete parameters;
+    parameters = NULL;
+    return NULL;
+  }
+  if (parameters->get_score_iterations()->empty() || parameters->get_score_iterations()->back() < iters)
+  {
+    parameters->add_score_iteration(iters);
+  }
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 2) Run the simulation and compute the scores       */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  std::vector<int>*   score_iterations = parameters->get_score_iterations();
+  std::vector<double> scores;
+  Py_BEGIN_ALLOW_THREADS
+  Simulation* simulation = new Simulation(parameters, self->landscape);
+  bool        censored   = false;
+  size_t      horizon    = 0;
+  while (true)
+  {
+    if (horizon < score_iterations->size() && simulation->get_iteration() == (*score_iterations)[horizon])
+    {
+      simulation->compute_score();
+      scores.push_back(simulation->get_total_log_likelihood());
+      scores.push_back(simulation->get_total_log_empty_likelihood());
+      scores.push_back(simulation->get_total_log_maximum_likelihood());
+      scores.push_back(simulation->get_empty_score());
+      scores.push_back(simulation->get_score());
+      scores.push_back(0.0);
+      horizon++;
+    }
+    if (censored || simulation->get_iteration() == parameters->get_iterations())
+    {
+      break;
+    }
+    simulation->compute_next_iteration();
+    if (parameters->useScoreCutoff())
+    {
+      simulation->compute_score_bound();
+      censored = (simulation->get_score_bound() > parameters->get_score_cutoff());
+    }
+  }
+  if (horizon < score_iterations->size())
+  {
+    simulation->compute_score();
+  }
+  for (; horizon < score_iterations->size(); horizon++)
+  {
+    scores.push_back(simulation->get_total_log_likelihood());
+    scores.push_back(simulation->get_total_log_empty_likelihood());
+    scores.push_back(simulation->get_total_log_maximum_likelihood());
+    scores.push_back(simulation->get_empty_score());
+    scores.push_back(simulation->get_score_bound());
+    scores.push_back(1.0);
+  }
+  delete simulation;
+  simulation = NULL;
+  Py_END_ALLOW_THREADS
+  delete parameters;
+  parameters = NULL;
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 3) Return the scores                               */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  PyObject* horizons = PyList_New(0);
+  if (horizons == NULL)
+  {
+    return NULL;
+  }
+  for (size_t i = 0; i < scores.size(); i += 6)
+  {
+    PyObject* tuple = NULL;
+    if (score_cutoff != Py_None)
+    {
+      tuple = Py_BuildValue("(dddddO)", scores[i], scores[i+1], scores[i+2], scores[i+3], scores[i+4], (scores[i+5] > 0.0 ? Py_True : Py_False));
+    }
+    else
+    {
+      tuple = Py_BuildValue("(ddddd)", scores[i], scores[i+1], scores[i+2], scores[i+3], scores[i+4]);
+    }
+    if (tuple == NULL || PyList_Append(horizons, tuple) < 0)
+    {
+      Py_XDECREF(tuple);
+      Py_DECREF(horizons);
+      return NULL;
+    }
+    Py_DECREF(tuple);
+  }
+  if (score_at == Py_None)
+  {
+    PyObject* tuple = PyList_GetItem(horizons, 0);
+    Py_INCREF(tuple);
+    Py_DECREF(horizons);
+    return tuple;
+  }
+  return horizons;
+}
+
+/**
+ * \brief    Get the cells closest to a list of points
+ * \details  get_cells(x, y) returns the list of the identifiers of the cells
+ *           closest to the points (x[i], y[i]), found in the KD-tree of the
+ *           landscape (the cell used as introduction node by HMD_model_run)
+ * \param    PyLandscape* self
+ * \param    PyObject* args
+ * \param    PyObject* kwds
+ * \return   \e PyObject*
+ */
+static PyObject* PyLandscape_get_cells( PyLandscape* self, PyObject* args, PyObject* kwds )
+{
+  PyObject*          x_list   = NULL;
+  PyObject*          y_list   = NULL;
+  static const char* kwlist[] = {"x", "y", NULL};
+  if (!PyArg_ParseTupleAndKeywords(args, kwds, "OO", (char**)kwlist, &x_list, &y_list))
+  {
+    return NULL;
+  }
+  if (self->landscape == NULL)
+  {
+    PyErr_SetString(PyExc_RuntimeError, "the landscape is not loaded");
+    return NULL;
+  }
+  std::vector<double> x;
+  std::vector<double> y;
+  if (!read_coordinates(x_list, x) || !read_coordinates(y_list, y))
+  {
+    return NULL;
+  }
+  if (x.size() != y.size())
+  {
+    PyErr_SetString(PyExc_ValueError, "x and y must have the same length");
+    return NULL;
+  }
+  std::vector<int> cells;
+  Py_BEGIN_ALLOW_THREADS
+  cells = self->landscape->get_closest_cells(x, y);
+  Py_END_ALLOW_THREADS
+  PyObject* identifiers = PyList_New((Py_ssize_t)cells.size());
+  if (identifiers == NULL)
+  {
+    return NULL;
+  }
+  for (size_t i = 0; i < cells.size(); i++)
+  {
+    PyList_SET_ITEM(identifiers, (Py_ssize_t)i, PyLong_FromLong(self->landscape->get_identifier(cells[i])));
+  }
+  return identifiers;
+}
+
+static PyMethodDef PyLandscape_methods[] =
+{
+  {"run", (PyCFunction)(void(*)(void))PyLandscape_run, METH_VARARGS | METH_KEYWORDS,
+   "run(params, reps, iters, seed, threads=1, score_cutoff=None, score_at=None) -> (L, empty_L, max_L, empty_score, score[, censored]), or a list of such tuples with score_at"},
+  {"get_cells", (PyCFunction)(void(*)(void))PyLandscape_get_cells, METH_VARARGS | METH_KEYWORDS,
+   "get_cells(x, y) -> list of the identifiers of the cells closest to the points (x[i], y[i])"},
+  {NULL, NULL, 0, NULL}
+};
+
+static PyType_Slot PyLandscape_slots[] =
+{
+  {Py_tp_doc, (void*)"Landscape(map, network, sample, cache=None) loaded once in memory"},
+  {Py_tp_new, (void*)PyType_GenericNew},
+  {Py_tp_init, (void*)PyLandscape_init},
+  {Py_tp_dealloc, (void*)PyLandscape_dealloc},
+  {Py_tp_methods, (void*)PyLandscape_methods},
+  {0, NULL}
+};
+
+static PyType_Spec PyLandscape_spec =
+{
+  "HMD_model.Landscape",
+  sizeof(PyLandscape),
+  0,
+  Py_TPFLAGS_DEFAULT,
+  PyLandscape_slots
+};
+
+/*----------------------------
+ * MODULE
+ *----------------------------*/
+
+static PyModuleDef HMD_model_module =
+{
+  PyModuleDef_HEAD_INIT,
+  "HMD_model",
+  "In-process HMD_model simulations on a landscape loaded once",
+  -1,
+  NULL, NULL, NULL, NULL, NULL
+};
+
+/**
+ * \brief    Module initialization
+ * \details  --
+ * \param    void
+ * \return   \e PyObject*
+ */
+PyMODINIT_FUNC PyInit_HMD_model( void )
+{
+  PyObject* module = PyModule_Create(&HMD_model_module);
+  if (module == NULL)
+  {
+    return NULL;
+  }
+  PyObject* type = PyType_FromSpec(&PyLandscape_spec);
+  if (type == NULL || PyModule_AddObject(module, "Landscape", type) < 0)
+  {
+    Py_XDECREF(type);
+    Py_DECREF(module);
+    return NULL;
+  }
+  return module;
+}
+
+/*----------------------------
+ * PARAMETERS
+ *----------------------------*/
+
+/**
+ * \brief    Read a numerical parameter from the dictionary
+ * \details  Sets a Python exception and returns false on failure
+ * \param    PyObject* params
+ * \param    const char* key
+ * \param    double& value
+ * \return   \e bool
+ */
+bool read_double( PyObject* params, const char* key, double& value )
+{
+  PyObject* item = PyDict_GetItemString(params, key);
+  if (item == NULL)
+  {
+    PyErr_Format(PyExc_KeyError, "parameter %s is missing", key);
+    return false;
+  }
+  value = PyFloat_AsDouble(item);
+  if (value == -1.0 && PyErr_Occurred())
+  {
+    return false;
+  }
+  return true;
+}
+
+/**
+ * \brief    Read a string parameter from the dictionary
+ * \details  Sets a Python exception and returns false on failure
+ * \param    PyObject* params
+ * \param    const char* key
+ * \param    std::string& value
+ * \return   \e bool
+ */
+bool read_choice( PyObject* params, const char* key, std::string& value )
+{
+  PyObject* item = PyDict_GetItemString(params, key);
+  if (item == NULL)
+  {
+    PyErr_Format(PyExc_KeyError, "parameter %s is missing", key);
+    return false;
+  }
+  const char* str = PyUnicode_AsUTF8(item);
+  if (str == NULL)
+  {
+    return false;
+  }
+  value = str;
+  return true;
+}
+
+/**
+ * \brief    Load the simulation parameters from the dictionary
+ * \details  Sets a Python exception and returns false on failure
+ * \param    PyObject* params
+ * \param    Parameters* parameters
+ * \return   \e bool
+ */
+bool load_parameters( PyObject* params, Parameters* parameters )
+{
+  std::string choice;
+
+  /*------------------------------------------------------------------ Main parameters */
+
+  if (!read_choice(params, "typeofdata", choice))
+  {
+    return false;
+  }
+  if (choice == "PRESENCE_ONLY")
+  {
+    parameters->set_typeofdata(PRESENCE_ONLY);
+  }
+  else if (choice == "PRESENCE_ABSENCE")
+  {
+    parameters->set_typeofdata(PRESENCE_ABSENCE);
+  }
+  else
+  {
+    PyErr_SetString(PyExc_ValueError, "wrong typeofdata value");
+    return false;
+  }
+  if (!read_choice(params, "law", choice))
+  {
+    return false;
+  }
+  if (choice == "DIRAC")
+  {
+    parameters->set_jump_law(DIRAC);
+  }
+  else if (choice == "NORMAL")
+  {
+    parameters->set_jump_law(NORMAL);
+  }
+  else if (choice == "LOG_NORMAL")
+  {
+    parameters->set_jump_law(LOG_NORMAL);
+  }
+  else if (choice == "CAUCHY")
+  {
+    parameters->set_jump_law(CAUCHY);
+  }
+  else
+  {
+    PyErr_SetString(PyExc_ValueError, "wrong law value");
+    return false;
+  }
+  if (!read_choice(params, "optimfunc", choice))
+  {
+    return false;
+  }
+  if (choice == "LSS")
+  {
+    parameters->set_optimization_function(LSS);
+  }
+  else if (choice == "LOG_LIKELIHOOD")
+  {
+    parameters->set_optimization_function(LOG_LIKELIHOOD);
+  }
+  else if (choice == "LIKELIHOOD_LSS")
+  {
+    parameters->set_optimization_function(LIKELIHOOD_LSS);
+  }
+  else
+  {
+    PyErr_SetString(PyExc_ValueError, "wrong optimfunc value");
+    return false;
+  }
+  if (!read_choice(params, "humanactivity", choice))
+  {
+    return false;
+  }
+  if (choice == "NO")
+  {
+    parameters->set_human_activity_index(false);
+  }
+  else if (choice == "YES")
+  {
+    parameters->set_human_activity_index(true);
+  }
+  else
+  {
+    PyErr_SetString(PyExc_ValueError, "wrong humanactivity value");
+    return false;
+  }
+
+  /*------------------------------------------------------------------ Simulation parameters */
+
+  double value = 0.0;
+  if (!read_double(params, "xintro", value))
+  {
+    return false;
+  }
+  parameters->set_x_introduction(value);
+  if (!read_double(params, "yintro", value))
+  {
+    return false;
+  }
+  parameters->set_y_introduction(value);
+  if (!read_double(params, "pintro", value))
+  {
+    return false;
+  }
+  parameters->set_p_introduction(value);
+  if (!read_double(params, "lambda", value))
+  {
+    return false;
+  }
+  parameters->set_lambda(value);
+  if (!read_double(params, "mu", value))
+  {
+    return false;
+  }
+  parameters->set_mu(value);
+  if (!read_double(params, "sigma", value))
+  {
+    return false;
+  }
+  parameters->set_sigma(value);
+  if (!read_double(params, "gamma", value))
+  {
+    return false;
+  }
+  parameters->set_gamma(value);
+
+  /*------------------------------------------------------------------ Linear combination of road categories */
+
+  if (!read_double(params, "w1", value))
+  {
+    return false;
+  }
+  parameters->set_w1(value);
+  if (!read_double(params, "w2", value))
+  {
+    return false;
+  }
+  parameters->set_w2(value);
+  if (!read_double(params, "w3", value))
+  {
+    return false;
+  }
+  parameters->set_w3(value);
+  if (!read_double(params, "w4", value))
+  {
+    return false;
+  }
+  parameters->set_w4(value);
+  if (!read_double(params, "w5", value))
+  {
+    return false;
+  }
+  parameters->set_w5(value);
+  if (!read_double(params, "w6", value))
+  {
+    return false;
+  }
+  parameters->set_w6(value);
+  if (!read_double(params, "wmin", value))
+  {
+    return false;
+  }
+  parameters->set_wmin(value);
+  return true;
+}
+
+/**
+ * \brief    Load the iterations at which the score is computed
+ * \details  Sets a Python exception and returns false on failure. The number
+ *           of iterations must be set
+ * \param    PyObject* score_at
+ * \param    Parameters* parameters
+ * \return   \e bool
+ */
+bool load_score_iterations( PyObject* score_at, Parameters* parameters )
+{
+  PyObject* iterations = PySequence_Fast(score_at, "score_at must be a sequence of iterations");
+  if (iterations == NULL)
+  {
+    return false;
+  }
+  std::vector<int>* score_iterations = parameters->get_score_iterations();
+  for (Py_ssize_t i = 0; i < PySequence_Fast_GET_SIZE(iterations); i++)
+  {
+    long iteration = PyLong_AsLong(PySequence_Fast_GET_ITEM(iterations, i));
+    if (iteration == -1 && PyErr_Occurred())
+    {
+      Py_DECREF(iterations);
+      return false;
+    }
+    if (iteration < 0 || iteration > parameters->get_iterations() || (!score_iterations->empty() && iteration <= score_iterations->back()))
+    {
+      PyErr_SetString(PyExc_ValueError, "score iterations must be increasing, between 0 and iters");
+      Py_DECREF(iterations);
+      return false;
+    }
+    parameters->add_score_iteration((int)iteration);
+  }
+  Py_DECREF(iterations);
+  if (score_iterations->empty())
+  {
+    PyErr_SetString(PyExc_ValueError, "score_at must not be empty");
+    return false;
+  }
+  return true;
+}
+
+/**
+ * \brief    Read a sequence of coordinates
+ * \details  --
+ * \param    PyObject* sequence
+ * \param    std::vector<double>& coordinates
+ * \return   \e bool
+ */
+bool read_coordinates( PyObject* sequence, std::vector<double>& coordinates )
+{
+  PyObject* values = PySequence_Fast(sequence, "coordinates must be a sequence of numbers");
+  if (values == NULL)
+  {
+    return false;
+  }
+  coordinates.reserve(PySequence_Fast_GET_SIZE(values));
+  for (Py_ssize_t i = 0; i < PySequence_Fast_GET_SIZE(values); i++)
+  {
+    double value = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(values, i));
+    if (value == -1.0 && PyErr_Occurred())
+    {
+      Py_DECREF(values);
+      return false;
+    }
+    coordinates.push_back(value);
+  }
+  Py_DECREF(values);
+  return true;
+}
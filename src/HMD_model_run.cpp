@@ -5,6 +5,9 @@
 #include <fstream>
 #include <sstream>
 #include <cstring>
+#include <cstdio>
+#include <cstdlib>
+#include <climits>
 #include <vector>
 #include <unordered_map>
 #include <sys/stat.h>
@@ -12,6 +15,7 @@
 #include <assert.h>
 
 #include "./lib/Parameters.h"
+#include "./lib/Landscape.h"
 #include "./lib/Simulation.h"
 
 void printUsage( void );
@@ -40,47 +44,119 @@ int main(int argc, char const** argv)
   }
 
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  /* 2) Create the simulation                           */
+  /* 2) Load the landscape and create the simulation    */
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  Simulation* simulation = new Simulation(parameters);
+  Landscape* landscape = NULL;
+  if (parameters->useLandscapeFile())
+  {
+    landscape = new Landscape(parameters->get_map_filename(), parameters->get_network_filename(), parameters->get_sample_filename(), parameters->get_landscape_filename());
+  }
+  else
+  {
+    landscape = new Landscape(parameters->get_map_filename(), parameters->get_network_filename(), parameters->get_sample_filename());
+  }
+  Simulation* simulation = new Simulation(parameters, landscape);
 
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  /* 3) Run the simulation                              */
+  /* 3) Run the simulation and compute the scores       */
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  while (simulation->get_iteration() < parameters->get_iterations())
+  std::vector<int>*   score_iterations = parameters->get_score_iterations();
+  std::vector<double> scores;
+  bool                censored         = false;
+  size_t              horizon          = 0;
+  while (true)
   {
-    if (parameters->saveAllStates())
+    if (horizon < score_iterations->size() && simulation->get_iteration() == (*score_iterations)[horizon])
+    {
+      simulation->compute_score();
+      scores.push_back(simulation->get_total_log_likelihood());
+      scores.push_back(simulation->get_total_log_empty_likelihood());
+      scores.push_back(simulation->get_total_log_maximum_likelihood());
+      scores.push_back(simulation->get_empty_score());
+      scores.push_back(simulation->get_score());
+      scores.push_back(0.0);
+      horizon++;
+    }
+    if (censored || simulation->get_iteration() == parameters->get_iterations())
+    {
+      break;
+    }
+    if (parameters->saveAllStates() && parameters->isSharded())
+    {
+      std::stringstream filename;
+      filename << "output/statistics_" << simulation->get_iteration() << ".txt";
+      simulation->write_statistics(filename.str());
+    }
+    else if (parameters->saveAllStates() && parameters->saveBinaryStates())
+    {
+      simulation->write_binary_state("output/states.bin");
+    }
+    else if (parameters->saveAllStates())
     {
       std::stringstream filename;
       filename << "output/state_" << simulation->get_iteration() << ".txt";
       simulation->write_state(filename.str());
     }
     simulation->compute_next_iteration();
+    if (parameters->useScoreCutoff())
+    {
+      simulation->compute_score_bound();
+      censored = (simulation->get_score_bound() > parameters->get_score_cutoff());
+    }
   }
 
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  /* 4) Compute the score and save the final state      */
+  /* 4) Censor the horizons that were not reached       */
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
   simulation->compute_score();
+  for (; horizon < score_iterations->size(); horizon++)
+  {
+    scores.push_back(simulation->get_total_log_likelihood());
+    scores.push_back(simulation->get_total_log_empty_likelihood());
+    scores.push_back(simulation->get_total_log_maximum_likelihood());
+    scores.push_back(simulation->get_empty_score());
+    scores.push_back(simulation->get_score_bound());
+    scores.push_back(1.0);
+  }
   if (parameters->saveOutputs())
+  {
+    simulation->write_lineage_summary("output/dispersal_kernel.txt", "output/dispersal_events.txt");
+  }
+  if (parameters->saveOutputs() && parameters->saveInvasionDistances())
+  {
+    simulation->write_invasion_euclidean_distributions("output/observed_euclidean_distribution.txt", "output/simulated_euclidean_distribution.txt");
+  }
+  if (parameters->saveOutputs() && parameters->isSharded())
+  {
+    simulation->write_statistics("output/final_statistics.txt");
+  }
+  else if (parameters->saveOutputs())
   {
     simulation->write_state("output/final_state.txt");
-    //simulation->write_invasion_euclidean_distributions("output/observed_euclidean_distribution.txt", "output/simulated_euclidean_distribution.txt");
+    if (parameters->saveBinaryStates())
+    {
+      simulation->write_binary_state("output/states.bin");
+    }
   }
 
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  /* 5) Return the score, free the memory and exit      */
+  /* 5) Return the scores, free the memory and exit     */
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  double likelihood       = simulation->get_total_log_likelihood();
-  double empty_likelihood = simulation->get_total_log_empty_likelihood();
-  double max_likelihood   = simulation->get_total_log_maximum_likelihood();
-  double empty_score      = simulation->get_empty_score();
-  double score            = simulation->get_score();
+  for (size_t i = 0; i < scores.size() && !parameters->isSharded(); i += 6)
+  {
+    std::cout << scores[i] << " " << scores[i+1] << " " << scores[i+2] << " " << scores[i+3] << " " << scores[i+4];
+    if (parameters->useScoreCutoff())
+    {
+      std::cout << " " << (int)scores[i+5];
+    }
+    std::cout << "\n";
+  }
   delete simulation;
   simulation = NULL;
+  delete landscape;
+  landscape = NULL;
   delete parameters;
   parameters = NULL;
-  std::cout << likelihood << " " << empty_likelihood << " " << max_likelihood << " " << empty_score << " " << score << "\n";
   return EXIT_SUCCESS;
 }
 
@@ -183,6 +259,18 @@ void readArgs( int argc, char const** argv, Parameters* parameters )
         options["sample"] = true;
       }
     }
+    if (strcmp(argv[i], "-landscape") == 0 || strcmp(argv[i], "--landscape") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: landscape filename is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else
+      {
+        parameters->set_landscape_filename(argv[i+1]);
+      }
+    }
     if (strcmp(argv[i], "-typeofdata") == 0 || strcmp(argv[i], "--type-of-data") == 0)
     {
       if (i+1 == argc)
@@ -511,6 +599,161 @@ void readArgs( int argc, char const** argv, Parameters* parameters )
     {
       parameters->set_save_all_states(true);
     }
+    if (strcmp(argv[i], "-binary-states") == 0 || strcmp(argv[i], "--binary-states") == 0)
+    {
+      parameters->set_binary_states(true);
+    }
+    if (strcmp(argv[i], "-invasion-distances") == 0 || strcmp(argv[i], "--invasion-distances") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: invasion distances bin width is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else if (atof(argv[i+1]) <= 0.0)
+      {
+        std::cout << "Error: invasion distances bin width must be positive.\n";
+        exit(EXIT_FAILURE);
+      }
+      else
+      {
+        parameters->set_invasion_distance_bin_width(atof(argv[i+1]));
+      }
+    }
+    if (strcmp(argv[i], "-lineage") == 0 || strcmp(argv[i], "--lineage") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: lineage output is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else if (strcmp(argv[i+1], "TEXT") == 0)
+      {
+        parameters->set_lineage_output(LINEAGE_TEXT);
+      }
+      else if (strcmp(argv[i+1], "BINARY") == 0)
+      {
+        parameters->set_lineage_output(LINEAGE_BINARY);
+      }
+      else if (strcmp(argv[i+1], "SUMMARY") == 0)
+      {
+        parameters->set_lineage_output(LINEAGE_SUMMARY);
+      }
+      else
+      {
+        std::cout << "Error: wrong lineage output value.\n";
+        exit(EXIT_FAILURE);
+      }
+    }
+    if (strcmp(argv[i], "-lineage-reps") == 0 || strcmp(argv[i], "--lineage-reps") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: lineage repetitions value is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else if (atoi(argv[i+1]) < 1)
+      {
+        std::cout << "Error: lineage repetitions value must be positive.\n";
+        exit(EXIT_FAILURE);
+      }
+      else
+      {
+        parameters->set_lineage_repetitions(atoi(argv[i+1]));
+      }
+    }
+    if (strcmp(argv[i], "-lineage-bin") == 0 || strcmp(argv[i], "--lineage-bin") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: lineage bin width is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else if (atof(argv[i+1]) <= 0.0)
+      {
+        std::cout << "Error: lineage bin width must be positive.\n";
+        exit(EXIT_FAILURE);
+      }
+      else
+      {
+        parameters->set_lineage_bin_width(atof(argv[i+1]));
+      }
+    }
+    if (strcmp(argv[i], "-threads") == 0 || strcmp(argv[i], "--threads") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: threads value is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else if (atoi(argv[i+1]) < 1)
+      {
+        std::cout << "Error: threads value must be positive.\n";
+        exit(EXIT_FAILURE);
+      }
+      else
+      {
+        parameters->set_threads(atoi(argv[i+1]));
+      }
+    }
+    if (strcmp(argv[i], "-score-cutoff") == 0 || strcmp(argv[i], "--score-cutoff") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: score cutoff value is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else
+      {
+        parameters->set_score_cutoff(atof(argv[i+1]));
+      }
+    }
+    if (strcmp(argv[i], "-score-at") == 0 || strcmp(argv[i], "--score-at") == 0)
+    {
+      if (i+1 == argc)
+      {
+        std::cout << "Error: score iterations are missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      std::stringstream iterations(argv[i+1]);
+      std::string       iteration;
+      while (std::getline(iterations, iteration, ','))
+      {
+        std::vector<int>* score_iterations = parameters->get_score_iterations();
+        char*             end              = NULL;
+        long              value            = strtol(iteration.c_str(), &end, 10);
+        if (iteration.empty() || *end != '\0' || value > INT_MAX)
+        {
+          std::cout << "Error: score iteration '" << iteration << "' is not an integer.\n";
+          exit(EXIT_FAILURE);
+        }
+        if (value < 0 || (!score_iterations->empty() && value <= score_iterations->back()))
+        {
+          std::cout << "Error: score iterations must be positive and increasing.\n";
+          exit(EXIT_FAILURE);
+        }
+        parameters->add_score_iteration((int)value);
+      }
+    }
+    if (strcmp(argv[i], "-shard") == 0 || strcmp(argv[i], "--shard") == 0)
+    {
+      int shard  = 0;
+      int shards = 0;
+      if (i+1 == argc)
+      {
+        std::cout << "Error: shard value is missing.\n";
+        exit(EXIT_FAILURE);
+      }
+      else if (sscanf(argv[i+1], "%d/%d", &shard, &shards) != 2 || shards < 1 || shard < 0 || shard >= shards)
+      {
+        std::cout << "Error: shard value must be <index>/<number of shards>, with 0 <= index < number of shards.\n";
+        exit(EXIT_FAILURE);
+      }
+      else
+      {
+        parameters->set_shard(shard, shards);
+      }
+    }
   }
   bool parameter_lacking = false;
   for (auto it = options.begin(); it != options.end(); ++it)
@@ -526,6 +769,33 @@ void readArgs( int argc, char const** argv, Parameters* parameters )
     exit(EXIT_FAILURE);
   }
   options.clear();
+  if (parameters->isSharded())
+  {
+    if (!parameters->saveOutputs())
+    {
+      std::cout << "Error: -shard needs -save-outputs.\n";
+      exit(EXIT_FAILURE);
+    }
+    if (parameters->useScoreCutoff() || !parameters->get_score_iterations()->empty())
+    {
+      std::cout << "Error: -shard can not be used with -score-cutoff or -score-at.\n";
+      exit(EXIT_FAILURE);
+    }
+    if (parameters->get_shards() > parameters->get_repetitions())
+    {
+      std::cout << "Error: the number of shards must not exceed the number of repetitions.\n";
+      exit(EXIT_FAILURE);
+    }
+  }
+  if (!parameters->get_score_iterations()->empty() && parameters->get_score_iterations()->back() > parameters->get_iterations())
+  {
+    std::cout << "Error: score iterations must not exceed the number of iterations.\n";
+    exit(EXIT_FAILURE);
+  }
+  else if (parameters->get_score_iterations()->empty() || parameters->get_score_iterations()->back() < parameters->get_iterations())
+  {
+    parameters->add_score_iteration(parameters->get_iterations());
+  }
 }
 
 /**
@@ -562,6 +832,10 @@ void printUsage( void )
   std::cout << "        Specify the map file (default: map.txt)\n";
   std::cout << "  -sample, --sample <filename>\n";
   std::cout << "        Specify the sample file (default: sample.txt)\n";
+  std::cout << "  -landscape, --landscape <filename>\n";
+  std::cout << "        Load the map, network and sample from a binary landscape file. The file\n";
+  std::cout << "        is (re)compiled from the input files when it is missing or when they\n";
+  std::cout << "        changed (it is keyed by their hashes)\n";
   std::cout << "  -reps, --reps <repetitions>\n";
   std::cout << "        Specify the number of repetitions by simulation\n";
   std::cout << "  -iters, --iters <iterations>\n";
@@ -604,6 +878,49 @@ void printUsage( void )
   std::cout << "        Save simulation outputs (final state, lineage tree, ...)\n";
   std::cout << "  -save-all-states, --save--all-states\n";
   std::cout << "        Save simulation state at any time\n";
+  std::cout << "  -binary-states, --binary-states\n";
+  std::cout << "        Save the simulation states in output/states.bin (typed columns, and\n";
+  std::cout << "        only the nodes that changed since the previous state) instead of\n";
+  std::cout << "        output/state_<iteration>.txt. The final state is also appended to\n";
+  std::cout << "        the file (output/final_state.txt is still written). See\n";
+  std::cout << "        scripts/states.py to read the file\n";
+  std::cout << "  -invasion-distances, --invasion-distances <distance>\n";
+  std::cout << "        Save the histograms of the euclidean distances between the observed\n";
+  std::cout << "        or simulated invaded nodes, by bins of the given width, in\n";
+  std::cout << "        output/observed_euclidean_distribution.txt and\n";
+  std::cout << "        output/simulated_euclidean_distribution.txt (default: not saved)\n";
+  std::cout << "  -lineage, --lineage <output>\n";
+  std::cout << "        Specify the lineage tree output with -save-outputs (TEXT, BINARY,\n";
+  std::cout << "        SUMMARY). TEXT writes output/lineage_tree.txt (default), BINARY writes\n";
+  std::cout << "        fixed-size records in output/lineage_tree.bin (see scripts/lineage.py),\n";
+  std::cout << "        SUMMARY only writes the dispersal kernels (output/dispersal_kernel.txt)\n";
+  std::cout << "        and the number of jumps by repetition and iteration\n";
+  std::cout << "        (output/dispersal_events.txt)\n";
+  std::cout << "  -lineage-reps, --lineage-reps <number of repetitions>\n";
+  std::cout << "        Only record the jumps of the first repetitions in the lineage tree\n";
+  std::cout << "        (default: all)\n";
+  std::cout << "  -lineage-bin, --lineage-bin <distance>\n";
+  std::cout << "        Bin width of the dispersal kernels of the SUMMARY output (default 1000)\n";
+  std::cout << "  -threads, --threads <number of threads>\n";
+  std::cout << "        Share the repetitions between threads (default 1). Each thread uses\n";
+  std::cout << "        its own prng stream: results are reproducible for a given seed and\n";
+  std::cout << "        number of threads\n";
+  std::cout << "  -score-cutoff, --score-cutoff <score>\n";
+  std::cout << "        Stop the simulation as soon as a lower bound of the final score exceeds\n";
+  std::cout << "        the cutoff. A sixth value is then printed after each score: 1 if the\n";
+  std::cout << "        simulation was stopped before the iteration (the score is the censored\n";
+  std::cout << "        lower bound), 0 otherwise\n";
+  std::cout << "  -score-at, --score-at <iteration,iteration,...>\n";
+  std::cout << "        Compute the score at each listed iteration (increasing, at most -iters)\n";
+  std::cout << "        and print one line of scores per iteration, in the same order. The\n";
+  std::cout << "        last iteration is always scored, on the last line (default: the last\n";
+  std::cout << "        iteration only)\n";
+  std::cout << "  -shard, --shard <index>/<number of shards>\n";
+  std::cout << "        Only simulate one block of the repetitions: the blocks and their prng\n";
+  std::cout << "        streams are those of a run with one thread by shard. Sufficient\n";
+  std::cout << "        statistics are saved instead of the states (statistics_<iteration>.txt,\n";
+  std::cout << "        final_statistics.txt) and no score is printed: scripts/merge_shards.py\n";
+  std::cout << "        merges the shards into the states and score of the complete run\n";
   std::cout << "\n";
 }
 
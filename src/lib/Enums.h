@@ -35,5 +35,16 @@ enum optimization_function
   LIKELIHOOD_LSS = 2  /*!< Likelihood least-square-sum score */
 };
 
+/**
+ * \brief   Lineage tree output
+ * \details --
+ */
+enum lineage_output
+{
+  LINEAGE_TEXT    = 0, /*!< One text line by jump                */
+  LINEAGE_BINARY  = 1, /*!< One binary record by jump            */
+  LINEAGE_SUMMARY = 2  /*!< Dispersal kernel and event histograms */
+};
+
 
 #endif /* defined(__HMD_model__Enums__) */
@@ -1,6 +1,26 @@
 #include "Graph.h"
 
 
+/**
+ * \brief    Write an array to a binary file
+ * \details  The array is padded with zeros to a multiple of 8 bytes
+ * \param    std::ofstream& file
+ * \param    const std::vector<T>& array
+ * \return   \e void
+ */
+template<typename T>
+static void write_array( std::ofstream& file, const std::vector<T>& array )
+{
+  size_t size       = array.size()*sizeof(T);
+  char   padding[8] = {0, 0, 0, 0, 0, 0, 0, 0};
+  if (size > 0)
+  {
+    file.write((const char*)array.data(), size);
+  }
+  file.write(padding, (8-size%8)%8);
+}
+
+
 /*----------------------------
  * CONSTRUCTORS
  *----------------------------*/
@@ -9,14 +29,17 @@
  * \brief    Constructor
  * \details  --
  * \param    Parameters* parameters
+ * \param    Landscape* landscape
  * \return   \e void
  */
-Graph::Graph( Parameters* parameters )
+Graph::Graph( Parameters* parameters, Landscape* landscape )
 {
   /*--------------------------------------- MAIN PARAMETERS */
 
   assert(parameters != NULL);
+  assert(landscape != NULL);
   _parameters = parameters;
+  _landscape  = landscape;
 
   /*--------------------------------------- GRAPH STRUCTURE */
 
@@ -39,7 +62,26 @@ Graph::Graph( Parameters* parameters )
   _total_log_maximum_likelihood = 0.0;
   _empty_score                  = 0.0;
   _score                        = 0.0;
+  _score_bound                  = 0.0;
   compute_score(true);
+  if (_parameters->isSharded())
+  {
+    /*** The empty score is computed with all the repetitions, as in a complete run ***/
+    for (size_t index = 0; index < _nodes.size(); index++)
+    {
+      _nodes[index]->restrict_to_repetitions(_parameters->get_first_repetition(), _parameters->get_last_repetition());
+    }
+  }
+  if (_parameters->useScoreCutoff() && _parameters->get_typeofdata() == PRESENCE_ABSENCE)
+  {
+    for (size_t index = 0; index < _nodes.size(); index++)
+    {
+      if (_nodes[index]->get_n_obs() > 0.0)
+      {
+        _nodes[index]->compute_score_bounds();
+      }
+    }
+  }
 }
 
 /*----------------------------
@@ -54,18 +96,153 @@ Graph::Graph( Parameters* parameters )
  */
 Graph::~Graph( void )
 {
-  for (std::unordered_map<int, Node*>::iterator it = _map.begin(); it != _map.end(); ++it)
+  for (size_t index = 0; index < _nodes.size(); index++)
   {
-    delete it->second;
-    it->second = NULL;
+    delete _nodes[index];
+    _nodes[index] = NULL;
   }
-  _map.clear();
+  _nodes.clear();
+  _index.clear();
+  _offsets   = NULL;
+  _neighbors = NULL;
+  _weights.clear();
+  _identifiers = NULL;
+  _x           = NULL;
+  _y           = NULL;
+  _human_activity.clear();
+  _tags.clear();
+  _walks.clear();
+  _occupied_nodes.clear();
+  _occupied.clear();
+  _changed_nodes.clear();
+  _changed.clear();
 }
 
 /*----------------------------
  * PUBLIC METHODS
  *----------------------------*/
 
+/**
+ * \brief    Run a self-avoiding random walk from a node
+ * \details  The walk stops when it leaves the map (returns -1), when it comes
+ *           back to the start node, or when the distance is reached. A stuck
+ *           walk stays in its node until the end of the jump. Tags are cleared
+ *           in O(1) by starting a new walk stamp for the thread
+ * \param    int start_index
+ * \param    double distance
+ * \param    Prng* prng
+ * \param    int thread
+ * \param    double* geodesic_distance
+ * \return   \e int
+ */
+int Graph::walk( int start_index, double distance, Prng* prng, int thread, double* geodesic_distance )
+{
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 1) Start a new walk stamp (untags all the nodes)            */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  _walks[thread]++;
+  if (_walks[thread] == 0)
+  {
+    /*** On overflow, old stamps could match again: clear them ***/
+    std::fill(_tags.begin()+(size_t)thread*_nodes.size(), _tags.begin()+(size_t)(thread+1)*_nodes.size(), 0);
+    _walks[thread] = 1;
+  }
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 2) Walk until the distance is reached                       */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  int current_index  = start_index;
+  *geodesic_distance = 0.0;
+  while (*geodesic_distance < distance)
+  {
+    tag(current_index, thread);
+    int next_index = jump(current_index, prng, thread);
+    /*** If the next node is out of the map, stop walking ***/
+    if (next_index == -1)
+    {
+      return -1;
+    }
+    /*** If the next node is self, stop walking ***/
+    else if (next_index == start_index)
+    {
+      return start_index;
+    }
+    /*** If the walk is stuck, it stays in the current node until the end of the jump ***/
+    else if (next_index == current_index)
+    {
+      *geodesic_distance = distance;
+      return current_index;
+    }
+    /*** Else increment the distance ***/
+    else
+    {
+      current_index       = next_index;
+      *geodesic_distance += 1.0;
+    }
+  }
+  return current_index;
+}
+
+/**
+ * \brief    Jump from a node to one of its neighbors
+ * \details  Walks the CSR edge range of the node. Neighbors tagged by the
+ *           calling thread are avoided (self-avoiding random walk). Returns
+ *           the node itself if there is no way to escape it, and -1 if the
+ *           walk leaves the map
+ * \param    int index
+ * \param    Prng* prng
+ * \param    int thread
+ * \return   \e int
+ */
+int Graph::jump( int index, Prng* prng, int thread )
+{
+  const int*          neighbors = _neighbors;
+  const double*       weights   = _weights.data();
+  const unsigned int* tags      = _tags.data()+(size_t)thread*_nodes.size();
+  unsigned int        walk      = _walks[thread];
+  int                 first     = _offsets[index];
+  int                 last      = _offsets[index+1];
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 1) Compute the weight sum (for a self-avoiding random walk) */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  double weight_sum = 0.0;
+  for (int i = first; i < last; i++)
+  {
+    if (neighbors[i] == -1 || tags[neighbors[i]] != walk)
+    {
+      weight_sum += weights[i];
+    }
+  }
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 2) If there is no way to escape the node, break             */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  if (weight_sum == 0.0)
+  {
+    return index;
+  }
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 3) Or draw the next node with roulette wheel                */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  double draw = prng->uniform()*weight_sum;
+  double sum  = 0.0;
+  for (int i = first; i < last; i++)
+  {
+    if (neighbors[i] == -1 || tags[neighbors[i]] != walk)
+    {
+      sum += weights[i];
+      if (draw < sum)
+      {
+        return neighbors[i];
+      }
+    }
+  }
+  printf("Error during jump (Graph::jump() method)...\n");
+  exit(EXIT_FAILURE);
+}
+
 /**
  * \brief    Untag all the nodes
  * \details  --
@@ -74,28 +251,54 @@ Graph::~Graph( void )
  */
 void Graph::untag( void )
 {
-  Node* node = get_first();
-  while (node != NULL)
+  std::fill(_tags.begin(), _tags.end(), 0);
+  std::fill(_walks.begin(), _walks.end(), 1);
+}
+
+/**
+ * \brief    Add an introduction in a node
+ * \details  The node is updated at the next call to update_state()
+ * \param    int index
+ * \param    int rep
+ * \param    double age
+ * \return   \e void
+ */
+void Graph::add_introduction( int index, int rep, double age )
+{
+  _nodes[index]->add_introduction(rep);
+  _nodes[index]->update_invasion_age(age, rep);
+  if (!_changed[index])
   {
-    node->untag();
-    node = get_next();
+    _changed[index] = 1;
+    _changed_nodes.push_back(index);
   }
 }
 
 /**
  * \brief    Update all the node states
- * \details  --
+ * \details  Only the nodes introduced since the last update can change, so
+ *           the work is proportional to the invaded area. Newly occupied
+ *           nodes join the list of occupied nodes
  * \param    void
  * \return   \e void
  */
 void Graph::update_state( void )
 {
-  Node* node = get_first();
-  while (node != NULL)
+  size_t number_of_occupied_nodes = _occupied_nodes.size();
+  for (size_t i = 0; i < _changed_nodes.size(); i++)
   {
-    node->update_state();
-    node = get_next();
+    int index = _changed_nodes[i];
+    _nodes[index]->update_state();
+    _changed[index] = 0;
+    if (!_occupied[index] && _nodes[index]->get_y_sim() > 0.0)
+    {
+      _occupied[index] = 1;
+      _occupied_nodes.push_back(index);
+    }
   }
+  _changed_nodes.clear();
+  std::sort(_occupied_nodes.begin()+number_of_occupied_nodes, _occupied_nodes.end());
+  std::inplace_merge(_occupied_nodes.begin(), _occupied_nodes.begin()+number_of_occupied_nodes, _occupied_nodes.end());
 }
 
 /**
@@ -115,16 +318,15 @@ void Graph::compute_score( bool empty )
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
   if (_parameters->get_typeofdata() == PRESENCE_ONLY)
   {
-    Node* node = get_first();
-    while (node != NULL)
+    for (size_t index = 0; index < _nodes.size(); index++)
     {
+      Node* node = _nodes[index];
       double y_obs = node->get_y_obs();
       if (y_obs > 0.0)
       {
         double nb_intros  = node->get_mean_nb_introductions();
         _score           += (y_obs-nb_intros)*(y_obs-nb_intros);
       }
-      node = get_next();
     }
   }
 
@@ -133,9 +335,9 @@ void Graph::compute_score( bool empty )
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
   else if (_parameters->get_typeofdata() == PRESENCE_ABSENCE)
   {
-    Node* node = get_first();
-    while (node != NULL)
+    for (size_t index = 0; index < _nodes.size(); index++)
     {
+      Node* node = _nodes[index];
       if (node->get_n_obs() > 0.0)
       {
         node->compute_score();
@@ -143,7 +345,6 @@ void Graph::compute_score( bool empty )
         _total_log_maximum_likelihood += node->get_log_maximum_likelihood();
         _score                        += node->get_score();
       }
-      node = get_next();
     }
   }
   if (empty)
@@ -153,6 +354,56 @@ void Graph::compute_score( bool empty )
   }
 }
 
+/**
+ * \brief    Compute a lower bound of the final optimization score
+ * \details  Occupied repetitions never become empty again and the number of
+ *           introductions never decreases, so the contribution of each
+ *           sampled node to the final score is bounded from below by its
+ *           current state. With presence-absence data, the score bounds of
+ *           the sampled nodes must have been computed
+ * \param    void
+ * \return   \e void
+ */
+void Graph::compute_score_bound( void )
+{
+  _score_bound = 0.0;
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 1) If data is presence-only, only overshoots can not be undone        */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  if (_parameters->get_typeofdata() == PRESENCE_ONLY)
+  {
+    for (size_t index = 0; index < _nodes.size(); index++)
+    {
+      Node* node = _nodes[index];
+      double y_obs = node->get_y_obs();
+      if (y_obs > 0.0)
+      {
+        double nb_intros = node->get_mean_nb_introductions();
+        if (nb_intros > y_obs)
+        {
+          _score_bound += (y_obs-nb_intros)*(y_obs-nb_intros);
+        }
+      }
+    }
+  }
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 2) Else if data is presence-absence, sum the node score bounds        */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  else if (_parameters->get_typeofdata() == PRESENCE_ABSENCE)
+  {
+    for (size_t index = 0; index < _nodes.size(); index++)
+    {
+      Node* node = _nodes[index];
+      if (node->get_n_obs() > 0.0)
+      {
+        _score_bound += node->get_score_bound();
+      }
+    }
+  }
+}
+
 /**
  * \brief    Write node set state
  * \details  --
@@ -163,9 +414,9 @@ void Graph::write_state( std::string filename )
 {
   std::ofstream file(filename, std::ios::out | std::ios::trunc);
   file << "id x y y_obs n_obs p_obs total_nb_intros mean_nb_intros var_nb_intros y_sim n_sim p_sim mean_first_invasion var_first_invasion mean_last_invasion var_last_invasion L empty_L max_L empty_score score\n";
-  Node* node = get_first();
-  while (node != NULL)
+  for (size_t index = 0; index < _nodes.size(); index++)
   {
+    Node* node = _nodes[index];
     file << node->get_identifier() << " ";
     file << node->get_x() << " ";
     file << node->get_y() << " ";
@@ -187,66 +438,328 @@ void Graph::write_state( std::string filename )
     file << _total_log_maximum_likelihood << " ";
     file << _empty_score << " ";
     file << _score << "\n";
-    node = get_next();
   }
   file.close();
 }
 
 /**
- * \brief    Write the euclidean distance distribution of invaded nodes (simulated or observed)
- * \details  --
+ * \brief    Append the node set state to the binary state file
+ * \details  The file starts with a header (magic string, format version,
+ *           number of nodes) and the static columns (id as int32, x, y, y_obs,
+ *           n_obs and p_obs as float32), written at the first call. Each call
+ *           then appends a chunk: the iteration and the number of changed
+ *           nodes (int32), the five scores (float64), the indices of the nodes
+ *           whose state changed since the previous chunk (int32), and their
+ *           columns total_nb_intros, y_sim, n_sim (int32), mean_nb_intros,
+ *           var_nb_intros, p_sim, mean_first_invasion, var_first_invasion,
+ *           mean_last_invasion and var_last_invasion (float32). Every array is
+ *           padded to 8 bytes. Data is in native byte order (see
+ *           scripts/states.py)
+ * \param    std::string filename
+ * \param    int iteration
+ * \return   \e void
+ */
+void Graph::write_binary_state( std::string filename, int iteration )
+{
+  int number_of_nodes = (int)_nodes.size();
+  std::ofstream file;
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 1) Write the header at the first call   */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  if (_binary_counts.empty())
+  {
+    file.open(filename, std::ios::out | std::ios::trunc | std::ios::binary);
+    char    magic[8]  = {'H', 'M', 'D', 'S', 'T', 'A', 'T', 'E'};
+    int32_t header[2] = {1, number_of_nodes};
+    file.write(magic, sizeof(magic));
+    file.write((const char*)header, sizeof(header));
+    std::vector<int32_t> identifiers(_identifiers, _identifiers+number_of_nodes);
+    std::vector< std::vector<float> > columns(5, std::vector<float>(number_of_nodes, 0.0f));
+    for (int index = 0; index < number_of_nodes; index++)
+    {
+      columns[0][index] = (float)_x[index];
+      columns[1][index] = (float)_y[index];
+      columns[2][index] = (float)_nodes[index]->get_y_obs();
+      columns[3][index] = (float)_nodes[index]->get_n_obs();
+      columns[4][index] = (float)_nodes[index]->get_p_obs();
+    }
+    write_array(file, identifiers);
+    for (int column = 0; column < 5; column++)
+    {
+      write_array(file, columns[column]);
+    }
+    _binary_counts.assign(3*number_of_nodes, 0);
+    _binary_values.assign(7*number_of_nodes, 0.0f);
+  }
+  else
+  {
+    file.open(filename, std::ios::out | std::ios::app | std::ios::binary);
+  }
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 2) Find the nodes that changed          */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  std::vector<int32_t> changed;
+  for (int index = 0; index < number_of_nodes; index++)
+  {
+    Node*   node      = _nodes[index];
+    int32_t counts[3] = {(int32_t)node->get_total_nb_introductions(), (int32_t)node->get_y_sim(), (int32_t)node->get_n_sim()};
+    float   values[7] = {(float)node->get_mean_nb_introductions(), (float)node->get_var_nb_introductions(), (float)node->get_p_sim(), (float)node->get_mean_first_invasion_age(), (float)node->get_var_first_invasion_age(), (float)node->get_mean_last_invasion_age(), (float)node->get_var_last_invasion_age()};
+    bool    change    = false;
+    for (int column = 0; column < 3; column++)
+    {
+      change = change || (_binary_counts[column*number_of_nodes+index] != counts[column]);
+      _binary_counts[column*number_of_nodes+index] = counts[column];
+    }
+    for (int column = 0; column < 7; column++)
+    {
+      change = change || (memcmp(&_binary_values[column*number_of_nodes+index], &values[column], sizeof(float)) != 0);
+      _binary_values[column*number_of_nodes+index] = values[column];
+    }
+    if (change)
+    {
+      changed.push_back(index);
+    }
+  }
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 3) Append the chunk                     */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  int     number_of_changes = (int)changed.size();
+  int32_t chunk[2]          = {iteration, number_of_changes};
+  double  scores[5]         = {_total_log_likelihood, _total_log_empty_likelihood, _total_log_maximum_likelihood, _empty_score, _score};
+  file.write((const char*)chunk, sizeof(chunk));
+  file.write((const char*)scores, sizeof(scores));
+  write_array(file, changed);
+  for (int column = 0; column < 3; column++)
+  {
+    std::vector<int32_t> counts(number_of_changes, 0);
+    for (int i = 0; i < number_of_changes; i++)
+    {
+      counts[i] = _binary_counts[column*number_of_nodes+changed[i]];
+    }
+    write_array(file, counts);
+  }
+  for (int column = 0; column < 7; column++)
+  {
+    std::vector<float> values(number_of_changes, 0.0f);
+    for (int i = 0; i < number_of_changes; i++)
+    {
+      values[i] = _binary_values[column*number_of_nodes+changed[i]];
+    }
+    write_array(file, values);
+  }
+  file.close();
+}
+
+/**
+ * \brief    Write the sufficient statistics of the node set state
+ * \details  Sums are taken over the simulated repetitions, and written with
+ *           full precision, so that the statistics of the shards of the
+ *           repetitions can be added up
+ * \param    std::string filename
+ * \return   \e void
+ */
+void Graph::write_statistics( std::string filename )
+{
+  std::ofstream file(filename, std::ios::out | std::ios::trunc);
+  file.precision(17);
+  file << "id x y y_obs n_obs p_obs n_sim y_sim total_nb_intros sum_nb_intros sum2_nb_intros nb_first_invasions sum_first_invasion sum2_first_invasion nb_last_invasions sum_last_invasion sum2_last_invasion L empty_L max_L empty_score score\n";
+  for (size_t index = 0; index < _nodes.size(); index++)
+  {
+    Node* node = _nodes[index];
+    file << node->get_identifier() << " ";
+    file << node->get_x() << " ";
+    file << node->get_y() << " ";
+    file << node->get_y_obs() << " ";
+    file << node->get_n_obs() << " ";
+    file << node->get_p_obs() << " ";
+    file << _parameters->get_last_repetition()-_parameters->get_first_repetition() << " ";
+    file << node->get_y_sim() << " ";
+    file << node->get_total_nb_introductions() << " ";
+    file << node->get_sum_nb_introductions() << " ";
+    file << node->get_sum_squared_nb_introductions() << " ";
+    file << node->get_nb_first_invasions() << " ";
+    file << node->get_sum_first_invasion_age() << " ";
+    file << node->get_sum_squared_first_invasion_age() << " ";
+    file << node->get_nb_last_invasions() << " ";
+    file << node->get_sum_last_invasion_age() << " ";
+    file << node->get_sum_squared_last_invasion_age() << " ";
+    file << _total_log_likelihood << " ";
+    file << _total_log_empty_likelihood << " ";
+    file << _total_log_maximum_likelihood << " ";
+    file << _empty_score << " ";
+    file << _score << "\n";
+  }
+  file.close();
+}
+
+/**
+ * \brief    Write the euclidean distance histograms of invaded nodes (simulated or observed)
+ * \details  Pairs of nodes are counted by bin of euclidean distance, for the
+ *           observed invasion (weighted by the observed presences) and for
+ *           the simulated invasion (one count by repetition where both nodes
+ *           are occupied). The occupied nodes are sorted in a spatial grid:
+ *           pairs of grid cells that fall in a single bin are counted from
+ *           the occupation counts of the cells, the others pair by pair
  * \param    std::string observed_filename
  * \param    std::string simulated_filename
  * \return   \e void
  */
 void Graph::write_invasion_euclidean_distributions( std::string observed_filename, std::string simulated_filename )
 {
+  double bin_width = _parameters->get_invasion_distance_bin_width();
+  int    words     = _nodes[0]->get_number_of_state_words();
+  int    reps      = _parameters->get_repetitions();
+  assert(bin_width > 0.0);
+
   /*~~~~~~~~~~~~~~~~~~~~~~~*/
   /* 1) Observed invasion  */
   /*~~~~~~~~~~~~~~~~~~~~~~~*/
+  std::vector<int> observed_nodes;
+  for (size_t index = 0; index < _nodes.size(); index++)
+  {
+    if (_nodes[index]->get_y_obs() > 0.0)
+    {
+      observed_nodes.push_back((int)index);
+    }
+  }
+  std::vector<double> observed;
+  for (size_t i = 0; i < observed_nodes.size(); i++)
+  {
+    for (size_t j = i+1; j < observed_nodes.size(); j++)
+    {
+      size_t bin = (size_t)floor(compute_euclidean_distance(observed_nodes[i], observed_nodes[j])/bin_width);
+      if (bin >= observed.size())
+      {
+        observed.resize(bin+1, 0.0);
+      }
+      observed[bin] += _nodes[observed_nodes[i]]->get_y_obs();
+    }
+  }
   std::ofstream file(observed_filename, std::ios::out | std::ios::trunc);
-  file << "start_node end_node euclidean_dist\n";
-  for (std::unordered_map<int, Node*>::iterator it1 = _map.begin(); it1 != _map.end(); ++it1)
+  file << "distance count\n";
+  for (size_t bin = 0; bin < observed.size(); bin++)
+  {
+    file << bin*bin_width << " " << observed[bin] << "\n";
+  }
+  file.close();
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 2) Sort the occupied nodes in the grid */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  double side = bin_width/DISTANCE_GRID_RESOLUTION;
+  std::vector< std::pair<std::pair<long long, long long>, int> > sorted;
+  sorted.reserve(_occupied_nodes.size());
+  for (size_t i = 0; i < _occupied_nodes.size(); i++)
+  {
+    int index = _occupied_nodes[i];
+    sorted.push_back(std::make_pair(std::make_pair((long long)floor((_x[index]-_min_x_coord)/side), (long long)floor((_y[index]-_min_y_coord)/side)), index));
+  }
+  std::sort(sorted.begin(), sorted.end());
+  std::vector<int>                nodes;
+  std::vector<uint64_t>           states;
+  std::vector<long long>          cell_x;
+  std::vector<long long>          cell_y;
+  std::vector<size_t>             cell_first;
+  std::vector< std::vector<int> > cell_counts;
+  for (size_t i = 0; i < sorted.size(); i++)
   {
-    for (std::unordered_map<int, Node*>::iterator it2 = _map.find(it1->first); it2 != _map.end(); ++it2)
+    if (i == 0 || sorted[i].first != sorted[i-1].first)
     {
-      if (it1->first != it2->first)
+      cell_x.push_back(sorted[i].first.first);
+      cell_y.push_back(sorted[i].first.second);
+      cell_first.push_back(nodes.size());
+    }
+    nodes.push_back(sorted[i].second);
+    for (int word = 0; word < words; word++)
+    {
+      states.push_back(_nodes[sorted[i].second]->get_state_word(word));
+    }
+  }
+  cell_first.push_back(nodes.size());
+  cell_counts.resize(cell_x.size());
+  for (size_t cell = 0; cell < cell_x.size(); cell++)
+  {
+    if (cell_first[cell+1]-cell_first[cell] > 1)
+    {
+      cell_counts[cell].assign(reps, 0);
+      for (size_t i = cell_first[cell]; i < cell_first[cell+1]; i++)
       {
-        double dist = compute_euclidean_distance(it1->second, it2->second);
-        if (it1->second->get_y_obs() > 0.0 && it2->second->get_y_obs() > 0.0)
+        for (int rep = 0; rep < reps; rep++)
         {
-          for (double i = 0; i < it1->second->get_y_obs(); i++)
-          {
-            file << it1->first << " " << it2->first << " " << dist << "\n";
-          }
+          cell_counts[cell][rep] += (int)((states[i*words+rep/64] >> (rep%64)) & 1);
         }
       }
     }
   }
-  file.close();
 
-  /*~~~~~~~~~~~~~~~~~~~~~~~*/
-  /* 3) Simulated invasion */
-  /*~~~~~~~~~~~~~~~~~~~~~~~*/
-  file.open(simulated_filename, std::ios::out | std::ios::trunc);
-  file << "start_node end_node euclidean_dist rep\n";
-  for (std::unordered_map<int, Node*>::iterator it1 = _map.begin(); it1 != _map.end(); ++it1)
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 3) Count the pairs of occupied nodes   */
+  /*    by pair of grid cells               */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  std::vector<unsigned long long> simulated;
+  for (size_t cell1 = 0; cell1 < cell_x.size(); cell1++)
   {
-    for (std::unordered_map<int, Node*>::iterator it2 = _map.find(it1->first); it2 != _map.end(); ++it2)
+    for (size_t cell2 = cell1; cell2 < cell_x.size(); cell2++)
     {
-      if (it1->first != it2->first)
+      double dx       = (double)llabs(cell_x[cell2]-cell_x[cell1]);
+      double dy       = (double)llabs(cell_y[cell2]-cell_y[cell1]);
+      double min_dist = side*sqrt(std::max(dx-1.0, 0.0)*std::max(dx-1.0, 0.0) + std::max(dy-1.0, 0.0)*std::max(dy-1.0, 0.0));
+      double max_dist = side*sqrt((dx+1.0)*(dx+1.0) + (dy+1.0)*(dy+1.0));
+      size_t min_bin  = (size_t)floor(min_dist*(1.0-1e-12)/bin_width);
+      size_t max_bin  = (size_t)floor(max_dist*(1.0+1e-12)/bin_width);
+      size_t size1    = cell_first[cell1+1]-cell_first[cell1];
+      size_t size2    = cell_first[cell2+1]-cell_first[cell2];
+      if (max_bin >= simulated.size())
+      {
+        simulated.resize(max_bin+1, 0);
+      }
+      /*------------------------------------ All the pairs in a single bin */
+      if (min_bin == max_bin && !cell_counts[cell1].empty() && !cell_counts[cell2].empty() && size1*size2*words > (size_t)reps)
       {
-        double dist = compute_euclidean_distance(it1->second, it2->second);
-        for (int i = 0; i < _parameters->get_repetitions(); i++)
+        unsigned long long count = 0;
+        for (int rep = 0; rep < reps; rep++)
         {
-          if (it1->second->isOccupied(i) && it2->second->isOccupied(i))
+          long long n1 = cell_counts[cell1][rep];
+          long long n2 = cell_counts[cell2][rep];
+          count       += (unsigned long long)(cell1 == cell2 ? n1*(n1-1)/2 : n1*n2);
+        }
+        simulated[min_bin] += count;
+      }
+      /*------------------------------------ Pair by pair */
+      else
+      {
+        for (size_t i = cell_first[cell1]; i < cell_first[cell1+1]; i++)
+        {
+          for (size_t j = (cell1 == cell2 ? i+1 : cell_first[cell2]); j < cell_first[cell2+1]; j++)
           {
-            file << it1->first << " " << it2->first << " " << dist << " " << i+1 << "\n";
+            unsigned long long count = 0;
+            for (int word = 0; word < words; word++)
+            {
+              count += (unsigned long long)__builtin_popcountll(states[i*words+word] & states[j*words+word]);
+            }
+            if (count > 0)
+            {
+              size_t bin      = (min_bin == max_bin ? min_bin : (size_t)floor(compute_euclidean_distance(nodes[i], nodes[j])/bin_width));
+              simulated[bin] += count;
+            }
           }
         }
       }
     }
   }
+  while (!simulated.empty() && simulated.back() == 0)
+  {
+    simulated.pop_back();
+  }
+  file.open(simulated_filename, std::ios::out | std::ios::trunc);
+  file << "distance count\n";
+  for (size_t bin = 0; bin < simulated.size(); bin++)
+  {
+    file << bin*bin_width << " " << simulated[bin] << "\n";
+  }
   file.close();
 }
 
@@ -256,145 +769,100 @@ void Graph::write_invasion_euclidean_distributions( std::string observed_filenam
 
 /**
  * \brief    Get the introduction node from the coordinates
- * \details  --
+ * \details  The closest cell is found in the KD-tree of the landscape
  * \param    void
  * \return   \e void
  */
 int Graph::get_introduction_node_from_coordinates( void )
 {
-  double x_intro   = _parameters->get_x_introduction();
-  double y_intro   = _parameters->get_y_introduction();
-  double min_dist  = 1e+10;
-  int    min_intro = 0;
-  Node*  node      = get_first();
-  while (node != NULL)
-  {
-    double dist = sqrt((x_intro-node->get_x())*(x_intro-node->get_x()) + (y_intro-node->get_y())*(y_intro-node->get_y()));
-    if (min_dist > dist)
-    {
-      min_dist  = dist;
-      min_intro = node->get_identifier();
-    }
-    node = get_next();
-  }
-  return min_intro;
+  int cell = _landscape->get_closest_cell(_parameters->get_x_introduction(), _parameters->get_y_introduction());
+  return _landscape->get_identifier(cell);
 }
 
 /**
- * \brief    Load the map from file
- * \details  --
+ * \brief    Load the map from the landscape
+ * \details  Nodes are given a dense index in the map file order. Their
+ *           identifiers and coordinates are read-only arrays of the landscape
+ *           (shared by all the graphs, and by all the processes mapping the
+ *           same binary landscape file)
  * \param    void
  * \return   \e void
  */
 void Graph::load_map( void )
 {
-  _map.clear();
-  std::ifstream file(_parameters->get_map_filename(), std::ios::in);
-  assert(file);
-  std::string line;
-  int    identifier         = 0;
-  double x_coord            = 0.0;
-  double y_coord            = 0.0;
-  double node_area          = 0.0;
-  double suitable_area      = 0.0;
-  double population         = 0.0;
-  double population_density = 0.0;
-  double road_density       = 0.0;
-  while(getline(file, line))
-  {
-    std::stringstream flux;
-    flux.str(line.c_str());
-    flux >> identifier >> x_coord >> y_coord >> node_area >> suitable_area >> population >> population_density >> road_density;
-    assert(_map.find(identifier) == _map.end());
-    _map[identifier] = new Node(_parameters, identifier);
-    _map[identifier]->set_map_data(x_coord, y_coord, node_area, suitable_area, population, population_density, road_density);
+  int number_of_nodes = _landscape->get_number_of_cells();
+  _nodes.clear();
+  _index.clear();
+  _nodes.reserve(number_of_nodes);
+  _index.reserve(number_of_nodes);
+  _identifiers = _landscape->get_identifiers();
+  _x           = _landscape->get_x_coordinates();
+  _y           = _landscape->get_y_coordinates();
+  for (int i = 0; i < number_of_nodes; i++)
+  {
+    int identifier = _landscape->get_identifier(i);
+    assert(_index.find(identifier) == _index.end());
+    Node* node = new Node(_parameters, identifier);
+    node->set_map_data(_landscape->get_x(i), _landscape->get_y(i), _landscape->get_node_area(i), _landscape->get_suitable_area(i), _landscape->get_population(i), _landscape->get_population_density(i), _landscape->get_road_density(i));
+    _index[identifier] = i;
+    _nodes.push_back(node);
   }
-  file.close();
+  _human_activity.assign(number_of_nodes, 0.0);
+  _tags.assign((size_t)_parameters->get_threads()*number_of_nodes, 0);
+  _walks.assign(_parameters->get_threads(), 1);
 }
 
 /**
- * \brief    Load the network from file
- * \details  --
+ * \brief    Load the network from the landscape
+ * \details  Edges are stored in compressed sparse row (CSR) arrays. The
+ *           offsets and neighbors are read-only arrays of the landscape; only
+ *           the weights depend on the parameters. The edges of a node keep the
+ *           order of the network file
  * \param    void
  * \return   \e void
  */
 void Graph::load_network( void )
 {
-  std::ifstream file(_parameters->get_network_filename(), std::ios::in);
-  assert(file);
-  std::string line;
-  std::string param_name;
-  while(getline(file, line))
-  {
-    std::stringstream flux;
-    flux.str(line.c_str());
-    int    identifier1 = 0;
-    int    identifier2 = 0;
-    double roads1      = 0.0;
-    double roads2      = 0.0;
-    double roads3      = 0.0;
-    double roads4      = 0.0;
-    double roads5      = 0.0;
-    double roads6      = 0.0;
-    flux >> identifier1 >> identifier2 >> roads1 >> roads2 >> roads3 >> roads4 >> roads5 >> roads6;
-    assert(roads1 >= 0.0);
-    assert(roads2 >= 0.0);
-    assert(roads3 >= 0.0);
-    assert(roads4 >= 0.0);
-    assert(roads5 >= 0.0);
-    assert(roads6 >= 0.0);
-    double weight  = 0.0;
-    weight        += _parameters->get_w1()*roads1;
-    weight        += _parameters->get_w2()*roads2;
-    weight        += _parameters->get_w3()*roads3;
-    weight        += _parameters->get_w4()*roads4;
-    weight        += _parameters->get_w5()*roads5;
-    weight        += _parameters->get_w6()*roads6;
-    weight         = (weight < _parameters->get_wmin() ? _parameters->get_wmin() : weight);
-    if (identifier1 != -1 && identifier2 != -1)
-    {
-      assert(_map.find(identifier1) != _map.end());
-      assert(_map.find(identifier2) != _map.end());
-      _map[identifier1]->add_neighbor(weight, _map[identifier2]);
-      _map[identifier2]->add_neighbor(weight, _map[identifier1]);
-    }
-    else if (identifier1 != -1 && identifier2 == -1)
-    {
-      assert(_map.find(identifier1) != _map.end());
-      _map[identifier1]->add_neighbor(weight, NULL);
-    }
-    else if (identifier1 == -1 && identifier2 != -1)
-    {
-      assert(_map.find(identifier2) != _map.end());
-      _map[identifier2]->add_neighbor(weight, NULL);
+  int number_of_nodes = (int)_nodes.size();
+  _offsets   = _landscape->get_offsets();
+  _neighbors = _landscape->get_neighbors();
+  _weights.assign(_landscape->get_number_of_slots(), 0.0);
+  for (int index = 0; index < number_of_nodes; index++)
+  {
+    double weights_sum = 0.0;
+    for (int slot = _offsets[index]; slot < _offsets[index+1]; slot++)
+    {
+      int    edge    = _landscape->get_slot_edge(slot);
+      double weight  = 0.0;
+      weight        += _parameters->get_w1()*_landscape->get_edge_roads(edge, 0);
+      weight        += _parameters->get_w2()*_landscape->get_edge_roads(edge, 1);
+      weight        += _parameters->get_w3()*_landscape->get_edge_roads(edge, 2);
+      weight        += _parameters->get_w4()*_landscape->get_edge_roads(edge, 3);
+      weight        += _parameters->get_w5()*_landscape->get_edge_roads(edge, 4);
+      weight        += _parameters->get_w6()*_landscape->get_edge_roads(edge, 5);
+      weight         = (weight < _parameters->get_wmin() ? _parameters->get_wmin() : weight);
+      assert(weight >= 0.0);
+      _weights[slot]  = weight;
+      weights_sum    += weight;
     }
+    _nodes[index]->set_weights_sum(weights_sum);
   }
-  file.close();
 }
 
 /**
- * \brief    Load the sample from file
+ * \brief    Load the sample from the landscape
  * \details  --
  * \param    void
  * \return   \e void
  */
 void Graph::load_sample( void )
 {
-  std::ifstream file(_parameters->get_sample_filename(), std::ios::in);
-  assert(file);
-  std::string line;
-  int    identifier = 0;
-  double y          = 0.0;
-  double n          = 0.0;
-  while(getline(file, line))
-  {
-    std::stringstream flux;
-    flux.str(line.c_str());
-    flux >> identifier >> y >> n;
-    assert(_map.find(identifier) != _map.end());
-    _map[identifier]->set_sample_data(y, n);
+  for (int i = 0; i < _landscape->get_number_of_samples(); i++)
+  {
+    Node* node = get_node(_landscape->get_sample_identifier(i));
+    assert(node != NULL);
+    node->set_sample_data(_landscape->get_sample_y(i), _landscape->get_sample_n(i));
   }
-  file.close();
 }
 
 /**
@@ -424,9 +892,9 @@ void Graph::compute_statistics( void )
   _mean_road_density       = 0.0;
   _max_road_density        = 0.0;
   double n                 = 0.0;
-  Node*  node              = get_first();
-  while (node != NULL)
+  for (size_t index = 0; index < _nodes.size(); index++)
   {
+    Node* node = _nodes[index];
     /*** X coordinate ***/
     if (_min_x_coord > node->get_x())
     {
@@ -494,8 +962,7 @@ void Graph::compute_statistics( void )
     _mean_road_density += node->get_road_density();
 
     /*** Increment n ***/
-    n    += 1.0;
-    node  = get_next();
+    n += 1.0;
   }
   _mean_x_coord            /= n;
   _mean_y_coord            /= n;
@@ -507,24 +974,24 @@ void Graph::compute_statistics( void )
 
 /**
  * \brief    Compute the Human activity index
- * \details  --
+ * \details  The index of each cell is precomputed by the landscape
  * \param    void
  * \return   \e void
  */
 void Graph::compute_human_activity_index( void )
 {
-  Node* node = get_first();
-  while (node != NULL)
+  for (size_t index = 0; index < _nodes.size(); index++)
   {
+    Node* node = _nodes[index];
     if (_parameters->get_human_activity_index())
     {
-      node->set_human_activity_index(node->get_population_density()/_max_population_density);
+      node->set_human_activity_index(_landscape->get_human_activity_index((int)index));
     }
     else
     {
-      node->set_human_activity_index(_mean_population_density/_max_population_density);
+      node->set_human_activity_index(_landscape->get_mean_population_density()/_landscape->get_max_population_density());
     }
-    node = get_next();
+    _human_activity[index] = node->get_human_activity_index();
   }
 }
 
@@ -536,12 +1003,15 @@ void Graph::compute_human_activity_index( void )
  */
 void Graph::reset_states( void )
 {
-  Node* node = get_first();
-  while (node != NULL)
+  for (size_t index = 0; index < _nodes.size(); index++)
   {
+    Node* node = _nodes[index];
     node->reset_state();
-    node = get_next();
   }
+  _occupied_nodes.clear();
+  _occupied.assign(_nodes.size(), 0);
+  _changed_nodes.clear();
+  _changed.assign(_nodes.size(), 0);
   _total_log_likelihood         = 0.0;
   _total_log_maximum_likelihood = 0.0;
   _score                        = 0.0;
@@ -555,21 +1025,30 @@ void Graph::reset_states( void )
  */
 void Graph::set_introduction_node( void )
 {
-  _map[_introduction_node]->set_as_introduction_node();
+  int index = get_index(_introduction_node);
+  _nodes[index]->set_as_introduction_node();
+  /*** The node statistics are completed at the first update ***/
+  _changed[index] = 1;
+  _changed_nodes.push_back(index);
+  if (_nodes[index]->get_y_sim() > 0.0)
+  {
+    _occupied[index] = 1;
+    _occupied_nodes.push_back(index);
+  }
 }
 
 /**
  * \brief    Compute the euclidean distance between two nodes
  * \details  --
- * \param    Node* node1
- * \param    Node* node2
+ * \param    int index1
+ * \param    int index2
  * \return   \e void
  */
-double Graph::compute_euclidean_distance( Node* node1, Node* node2 )
+double Graph::compute_euclidean_distance( int index1, int index2 )
 {
-  double x1 = node1->get_x();
-  double y1 = node1->get_y();
-  double x2 = node2->get_x();
-  double y2 = node2->get_y();
+  double x1 = _x[index1];
+  double y1 = _y[index1];
+  double x2 = _x[index2];
+  double y2 = _y[index2];
   return sqrt((x2-x1)*(x2-x1) + (y2-y1)*(y2-y1));
 }
@@ -6,6 +6,8 @@
 #include <sstream>
 #include <cmath>
 #include <unordered_map>
+#include <algorithm>
+#include <vector>
 #include <cstring>
 #include <stdlib.h>
 #include <assert.h>
@@ -13,6 +15,7 @@
 #include "Enums.h"
 #include "Prng.h"
 #include "Parameters.h"
+#include "Landscape.h"
 #include "Node.h"
 
 
@@ -25,7 +28,7 @@ public:
    * CONSTRUCTORS
    *----------------------------*/
   Graph( void ) = delete;
-  Graph( Parameters* parameters );
+  Graph( Parameters* parameters, Landscape* landscape );
   Graph( const Graph& graph ) = delete;
 
   /*----------------------------
@@ -39,10 +42,25 @@ public:
 
   /*--------------------------------------- GRAPH STRUCTURE */
 
-  inline int   get_number_of_nodes( void );
-  inline Node* get_node( int identifier );
-  inline Node* get_first( void );
-  inline Node* get_next( void );
+  inline int   get_number_of_nodes( void ) const;
+  inline int   get_index( int identifier ) const;
+  inline Node* get_node( int identifier ) const;
+  inline Node* get_node_at( int index ) const;
+
+  /*--------------------------------------- NODE ATTRIBUTES */
+
+  inline int    get_identifier( int index ) const;
+  inline double get_x( int index ) const;
+  inline double get_y( int index ) const;
+  inline double get_human_activity_index( int index ) const;
+
+  /*--------------------------------------- RANDOM WALK */
+
+  inline bool isTagged( int index, int thread ) const;
+
+  /*--------------------------------------- ACTIVE FRONTIER */
+
+  inline std::vector<int>* get_occupied_nodes( void );
 
   /*--------------------------------------- MINIMIZATION SCORES */
 
@@ -51,19 +69,30 @@ public:
   inline double get_total_log_maximum_likelihood( void ) const;
   inline double get_empty_score( void ) const;
   inline double get_score( void ) const;
+  inline double get_score_bound( void ) const;
 
   /*----------------------------
    * SETTERS
    *----------------------------*/
   Graph& operator=(const Graph&) = delete;
 
+  /*--------------------------------------- RANDOM WALK */
+
+  inline void tag( int index, int thread );
+
   /*----------------------------
    * PUBLIC METHODS
    *----------------------------*/
+  int  walk( int start_index, double distance, Prng* prng, int thread, double* geodesic_distance );
+  int  jump( int index, Prng* prng, int thread );
   void untag( void );
+  void add_introduction( int index, int rep, double age );
   void update_state( void );
   void compute_score( bool empty );
+  void compute_score_bound( void );
   void write_state( std::string filename );
+  void write_statistics( std::string filename );
+  void write_binary_state( std::string filename, int iteration );
   void write_invasion_euclidean_distributions( std::string observed_filename, std::string simulated_filename );
 
   /*----------------------------
@@ -83,7 +112,7 @@ protected:
   void   compute_human_activity_index( void );
   void   reset_states( void );
   void   set_introduction_node( void );
-  double compute_euclidean_distance( Node* node1, Node* node2 );
+  double compute_euclidean_distance( int index1, int index2 );
 
   /*----------------------------
    * PROTECTED ATTRIBUTES
@@ -92,11 +121,46 @@ protected:
   /*--------------------------------------- MAIN PARAMETERS */
 
   Parameters* _parameters; /*!< Main parameters */
+  Landscape*  _landscape; /*!< Landscape data  */
 
   /*--------------------------------------- GRAPH STRUCTURE */
 
-  std::unordered_map<int, Node*>           _map; /*!< Nodes map          */
-  std::unordered_map<int, Node*>::iterator _it;  /*!< Nodes map iterator */
+  std::vector<Node*>           _nodes; /*!< Nodes, by dense index (map file order) */
+  std::unordered_map<int, int> _index; /*!< Dense index of each node identifier    */
+
+  /*--------------------------------------- NETWORK (CSR) */
+
+  const int*          _offsets;   /*!< First edge of each node (size N+1, landscape)             */
+  const int*          _neighbors; /*!< Neighbor index of each edge (-1 if out of map, landscape) */
+  std::vector<double> _weights;   /*!< Weight of each edge                                       */
+
+  /*--------------------------------------- NODE ATTRIBUTES (SOA) */
+
+  const int*          _identifiers;    /*!< Node identifiers (landscape)    */
+  const double*       _x;              /*!< Node X coordinates (landscape)  */
+  const double*       _y;              /*!< Node Y coordinates (landscape)  */
+  std::vector<double> _human_activity; /*!< Node human activity indices     */
+
+  /*--------------------------------------- RANDOM WALK */
+
+  std::vector<unsigned int> _tags;  /*!< Walk stamp of each node, by thread (thread*N+index) */
+  std::vector<unsigned int> _walks; /*!< Current walk stamp of each thread                   */
+
+  /*--------------------------------------- ACTIVE FRONTIER */
+
+  std::vector<int>  _occupied_nodes; /*!< Nodes occupied in at least one repetition (sorted) */
+  std::vector<char> _occupied;       /*!< Occupation flag of each node                       */
+  std::vector<int>  _changed_nodes;  /*!< Nodes introduced during the current iteration       */
+  std::vector<char> _changed;        /*!< Change flag of each node                           */
+
+  /*--------------------------------------- BINARY STATE FILE */
+
+  std::vector<int32_t> _binary_counts; /*!< Count columns of the last state written in the binary file (column*N+index) */
+  std::vector<float>   _binary_values; /*!< Value columns of the last state written in the binary file (column*N+index) */
+
+  /*--------------------------------------- INVASION DISTANCES */
+
+  static const int DISTANCE_GRID_RESOLUTION = 4; /*!< Spatial grid cells by histogram bin width */
 
   /*--------------------------------------- GRAPH STATISTICS */
 
@@ -127,6 +191,7 @@ protected:
   double _total_log_maximum_likelihood; /*!< Total log maximum hypergeometric likelihood */
   double _empty_score;                  /*!< Optimization score with empty map           */
   double _score;                        /*!< Optimization score                          */
+  double _score_bound;                  /*!< Lower bound of the final optimization score */
 
 };
 
@@ -143,9 +208,25 @@ protected:
  * \param    void
  * \return   \e int
  */
-inline int Graph::get_number_of_nodes( void )
+inline int Graph::get_number_of_nodes( void ) const
+{
+  return (int)_nodes.size();
+}
+
+/**
+ * \brief    Get the dense index of a node
+ * \details  Returns -1 if the identifier is unknown
+ * \param    int identifier
+ * \return   \e int
+ */
+inline int Graph::get_index( int identifier ) const
 {
-  return (int)_map.size();
+  std::unordered_map<int, int>::const_iterator it = _index.find(identifier);
+  if (it != _index.end())
+  {
+    return it->second;
+  }
+  return -1;
 }
 
 /**
@@ -154,41 +235,101 @@ inline int Graph::get_number_of_nodes( void )
  * \param    int identifier
  * \return   \e Node*
  */
-inline Node* Graph::get_node( int identifier )
+inline Node* Graph::get_node( int identifier ) const
 {
-  if (_map.find(identifier) != _map.end())
+  int index = get_index(identifier);
+  if (index != -1)
   {
-    return _map[identifier];
+    return _nodes[index];
   }
   return NULL;
 }
 
 /**
- * \brief    Get first node
- * \details  --
- * \param    void
+ * \brief    Get node by index
+ * \details  Nodes are indexed in the map file order; this access is thread-safe
+ * \param    int index
  * \return   \e Node*
  */
-inline Node* Graph::get_first( void )
+inline Node* Graph::get_node_at( int index ) const
+{
+  assert(index >= 0);
+  assert(index < (int)_nodes.size());
+  return _nodes[index];
+}
+
+/*--------------------------------------- NODE ATTRIBUTES */
+
+/**
+ * \brief    Get the identifier of a node
+ * \details  --
+ * \param    int index
+ * \return   \e int
+ */
+inline int Graph::get_identifier( int index ) const
+{
+  return _identifiers[index];
+}
+
+/**
+ * \brief    Get the X coordinate of a node
+ * \details  --
+ * \param    int index
+ * \return   \e double
+ */
+inline double Graph::get_x( int index ) const
+{
+  return _x[index];
+}
+
+/**
+ * \brief    Get the Y coordinate of a node
+ * \details  --
+ * \param    int index
+ * \return   \e double
+ */
+inline double Graph::get_y( int index ) const
 {
-  _it = _map.begin();
-  return _it->second;
+  return _y[index];
 }
 
 /**
- * \brief    Get next node
+ * \brief    Get the Human activity index of a node
  * \details  --
+ * \param    int index
+ * \return   \e double
+ */
+inline double Graph::get_human_activity_index( int index ) const
+{
+  return _human_activity[index];
+}
+
+/*--------------------------------------- RANDOM WALK */
+
+/**
+ * \brief    Check if a node is tagged by a thread
+ * \details  A node is tagged if it carries the stamp of the current walk
+ * \param    int index
+ * \param    int thread
+ * \return   \e bool
+ */
+inline bool Graph::isTagged( int index, int thread ) const
+{
+  return _tags[(size_t)thread*_nodes.size()+index] == _walks[thread];
+}
+
+/*--------------------------------------- ACTIVE FRONTIER */
+
+/**
+ * \brief    Get the list of occupied nodes
+ * \details  Nodes occupied in at least one repetition, sorted by index. The
+ *           list only grows during a simulation
  * \param    void
- * \return   \e Node*
+ * \return   \e std::vector<int>*
  */
-inline Node* Graph::get_next( void )
+inline std::vector<int>* Graph::get_occupied_nodes( void )
 {
-  ++_it;
-  if (_it == _map.end())
-  {
-    return NULL;
-  }
-  return _it->second;
+  return &_occupied_nodes;
 }
 
 /*--------------------------------------- MINIMIZATION SCORES */
@@ -248,9 +389,36 @@ inline double Graph::get_score( void ) const
   return _score;
 }
 
+/**
+ * \brief    Get the lower bound of the final optimization score
+ * \details  --
+ * \param    void
+ * \return   \e double
+ */
+inline double Graph::get_score_bound( void ) const
+{
+  return _score_bound;
+}
+
 /*----------------------------
  * SETTERS
  *----------------------------*/
 
+/*--------------------------------------- RANDOM WALK */
+
+/**
+ * \brief    Tag a node for a thread
+ * \details  --
+ * \param    int index
+ * \param    int thread
+ * \return   \e void
+ */
+inline void Graph::tag( int index, int thread )
+{
+  assert(thread >= 0);
+  assert(thread < _parameters->get_threads());
+  _tags[(size_t)thread*_nodes.size()+index] = _walks[thread];
+}
+
 
 #endif /* defined(__HMD_model__Graph__) */
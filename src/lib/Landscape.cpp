@@ -0,0 +1,642 @@
+#include "Landscape.h"
+
+
+/**
+ * \brief    Append an array to the landscape data
+ * \details  The array is padded with zeros to a multiple of 8 bytes, so that
+ *           every array of the data is aligned
+ * \param    std::vector<char>& buffer
+ * \param    const std::vector<T>& array
+ * \return   \e void
+ */
+template<typename T>
+static void append_array( std::vector<char>& buffer, const std::vector<T>& array )
+{
+  size_t size = array.size()*sizeof(T);
+  if (size > 0)
+  {
+    buffer.insert(buffer.end(), (const char*)array.data(), (const char*)array.data()+size);
+  }
+  buffer.insert(buffer.end(), (8-size%8)%8, 0);
+}
+
+/**
+ * \brief    Point an array to the landscape data
+ * \details  Returns false if the array goes beyond the end of the data
+ * \param    const char* data
+ * \param    size_t size
+ * \param    size_t& offset
+ * \param    int length
+ * \param    const T*& array
+ * \return   \e bool
+ */
+template<typename T>
+static bool view_array( const char* data, size_t size, size_t& offset, int length, const T*& array )
+{
+  if (length < 0)
+  {
+    return false;
+  }
+  size_t array_size = (size_t)length*sizeof(T);
+  array             = (const T*)(data+offset);
+  offset           += array_size+(8-array_size%8)%8;
+  return (offset <= size);
+}
+
+
+/*----------------------------
+ * CONSTRUCTORS
+ *----------------------------*/
+
+/**
+ * \brief    Constructor
+ * \details  Parses the input files once; the landscape is then read-only and
+ *           can be shared by any number of graphs
+ * \param    std::string map_filename
+ * \param    std::string network_filename
+ * \param    std::string sample_filename
+ * \return   \e void
+ */
+Landscape::Landscape( std::string map_filename, std::string network_filename, std::string sample_filename )
+{
+  _mapping           = NULL;
+  _size              = 0;
+  _loaded_from_cache = false;
+  _map_hash          = compute_file_hash(map_filename);
+  _network_hash      = compute_file_hash(network_filename);
+  _sample_hash       = compute_file_hash(sample_filename);
+  compile(map_filename, network_filename, sample_filename);
+}
+
+/**
+ * \brief    Constructor with a binary landscape file
+ * \details  The binary file is mapped read-only in memory if it was compiled
+ *           from the same input files (same hashes) and with the same format
+ *           version: all the processes using the file then share the same
+ *           physical pages. Otherwise the input files are parsed and the
+ *           binary file is (re)written
+ * \param    std::string map_filename
+ * \param    std::string network_filename
+ * \param    std::string sample_filename
+ * \param    std::string cache_filename
+ * \return   \e void
+ */
+Landscape::Landscape( std::string map_filename, std::string network_filename, std::string sample_filename, std::string cache_filename )
+{
+  _mapping           = NULL;
+  _size              = 0;
+  _map_hash          = compute_file_hash(map_filename);
+  _network_hash      = compute_file_hash(network_filename);
+  _sample_hash       = compute_file_hash(sample_filename);
+  _loaded_from_cache = load_cache(cache_filename);
+  if (!_loaded_from_cache)
+  {
+    compile(map_filename, network_filename, sample_filename);
+    write_cache(cache_filename);
+  }
+}
+
+/*----------------------------
+ * DESTRUCTORS
+ *----------------------------*/
+
+/**
+ * \brief    Destructor
+ * \details  --
+ * \param    void
+ * \return   \e void
+ */
+Landscape::~Landscape( void )
+{
+  if (_mapping != NULL)
+  {
+    munmap(_mapping, _size);
+    _mapping = NULL;
+  }
+  _buffer.clear();
+}
+
+/*----------------------------
+ * PUBLIC METHODS
+ *----------------------------*/
+
+/**
+ * \brief    Write the binary landscape file
+ * \details  The file starts with a header (magic string, format version,
+ *           sizes, hashes of the input files, population density statistics)
+ *           followed by the arrays of the landscape in native byte order. It
+ *           is written in a temporary file and then renamed, so that
+ *           concurrent runs never read a partial file
+ * \param    std::string filename
+ * \return   \e void
+ */
+void Landscape::write_cache( std::string filename ) const
+{
+  std::stringstream tmp_filename;
+  tmp_filename << filename << ".tmp" << getpid();
+  std::ofstream file(tmp_filename.str(), std::ios::out | std::ios::trunc | std::ios::binary);
+  if (!file)
+  {
+    return;
+  }
+  if (_mapping != NULL)
+  {
+    file.write((const char*)_mapping, _size);
+  }
+  else
+  {
+    file.write(_buffer.data(), _size);
+  }
+  file.close();
+  if (!file || std::rename(tmp_filename.str().c_str(), filename.c_str()) != 0)
+  {
+    std::remove(tmp_filename.str().c_str());
+  }
+}
+
+/**
+ * \brief    Get the cell closest to a point
+ * \details  Searches the KD-tree of the cell coordinates. Returns the same cell
+ *           as a scan of the map: the smallest euclidean distance, and the
+ *           first cell of the map file in case of ties
+ * \param    double x
+ * \param    double y
+ * \return   \e int
+ */
+int Landscape::get_closest_cell( double x, double y ) const
+{
+  int    best_cell = -1;
+  double best_dist = 0.0;
+  search_kdtree(x, y, 0, _number_of_cells, 0, best_cell, best_dist);
+  return best_cell;
+}
+
+/**
+ * \brief    Get the cells closest to a list of points
+ * \details  --
+ * \param    const std::vector<double>& x
+ * \param    const std::vector<double>& y
+ * \return   \e std::vector<int>
+ */
+std::vector<int> Landscape::get_closest_cells( const std::vector<double>& x, const std::vector<double>& y ) const
+{
+  assert(x.size() == y.size());
+  std::vector<int> cells(x.size(), -1);
+  for (size_t i = 0; i < x.size(); i++)
+  {
+    cells[i] = get_closest_cell(x[i], y[i]);
+  }
+  return cells;
+}
+
+/*----------------------------
+ * PROTECTED METHODS
+ *----------------------------*/
+
+/**
+ * \brief    Compile the landscape from the input files
+ * \details  Parses the input files, computes the human activity index of the
+ *           cells, the network in compressed sparse row (CSR) arrays (the
+ *           slots of a cell keep the order of the network file) and the
+ *           KD-tree of the cell coordinates, and stores
+ *           everything in the layout of the binary landscape file
+ * \param    std::string map_filename
+ * \param    std::string network_filename
+ * \param    std::string sample_filename
+ * \return   \e void
+ */
+void Landscape::compile( std::string map_filename, std::string network_filename, std::string sample_filename )
+{
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 1) Parse the input files                */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  std::vector<int>                   identifier;
+  std::vector< std::vector<double> > attributes(7);
+  std::vector<int>                   edge_identifier1;
+  std::vector<int>                   edge_identifier2;
+  std::vector<double>                edge_roads;
+  std::vector<int>                   sample_identifier;
+  std::vector<double>                sample_y;
+  std::vector<double>                sample_n;
+  load_map(map_filename, identifier, attributes);
+  load_network(network_filename, edge_identifier1, edge_identifier2, edge_roads);
+  load_sample(sample_filename, sample_identifier, sample_y, sample_n);
+  int number_of_cells = (int)identifier.size();
+  int number_of_edges = (int)edge_identifier1.size();
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 2) Compute the human activity index     */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  std::vector<double>& population_density = attributes[5];
+  std::vector<double>  human_activity(number_of_cells, 0.0);
+  double               mean_density       = 0.0;
+  double               max_density        = 0.0;
+  for (int cell = 0; cell < number_of_cells; cell++)
+  {
+    if (max_density < population_density[cell])
+    {
+      max_density = population_density[cell];
+    }
+    mean_density += population_density[cell];
+  }
+  mean_density /= (double)number_of_cells;
+  for (int cell = 0; cell < number_of_cells; cell++)
+  {
+    human_activity[cell] = population_density[cell]/max_density;
+  }
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 3) Count the edges of each cell         */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  std::unordered_map<int, int> index;
+  for (int cell = 0; cell < number_of_cells; cell++)
+  {
+    index[identifier[cell]] = cell;
+  }
+  std::vector<int> edge1(number_of_edges, -1);
+  std::vector<int> edge2(number_of_edges, -1);
+  std::vector<int> offsets(number_of_cells+1, 0);
+  for (int i = 0; i < number_of_edges; i++)
+  {
+    if (edge_identifier1[i] != -1)
+    {
+      assert(index.find(edge_identifier1[i]) != index.end());
+      edge1[i] = index[edge_identifier1[i]];
+      offsets[edge1[i]+1]++;
+    }
+    if (edge_identifier2[i] != -1)
+    {
+      assert(index.find(edge_identifier2[i]) != index.end());
+      edge2[i] = index[edge_identifier2[i]];
+      offsets[edge2[i]+1]++;
+    }
+  }
+  for (int cell = 0; cell < number_of_cells; cell++)
+  {
+    offsets[cell+1] += offsets[cell];
+  }
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 4) Fill the neighbors and edges         */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  std::vector<int> position(offsets.begin(), offsets.end()-1);
+  std::vector<int> neighbors(offsets[number_of_cells], -1);
+  std::vector<int> slot_edges(offsets[number_of_cells], -1);
+  for (int i = 0; i < number_of_edges; i++)
+  {
+    /*** An edge with a single cell leads out of the map ***/
+    if (edge1[i] != -1)
+    {
+      neighbors[position[edge1[i]]]  = edge2[i];
+      slot_edges[position[edge1[i]]] = i;
+      position[edge1[i]]++;
+    }
+    if (edge2[i] != -1)
+    {
+      neighbors[position[edge2[i]]]  = edge1[i];
+      slot_edges[position[edge2[i]]] = i;
+      position[edge2[i]]++;
+    }
+  }
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 5) Build the spatial index              */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  std::vector<int> kdtree(number_of_cells, 0);
+  for (int cell = 0; cell < number_of_cells; cell++)
+  {
+    kdtree[cell] = cell;
+  }
+  build_kdtree(kdtree, attributes[0], attributes[1], 0, number_of_cells, 0);
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 6) Store the header and the arrays      */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  char     magic[8]   = {'H', 'M', 'D', 'L', 'A', 'N', 'D', '\0'};
+  int32_t  header[6]  = {CACHE_VERSION, ROAD_CATEGORIES, number_of_cells, number_of_edges, offsets[number_of_cells], (int32_t)sample_identifier.size()};
+  uint64_t hashes[3]  = {_map_hash, _network_hash, _sample_hash};
+  double   density[2] = {mean_density, max_density};
+  _buffer.clear();
+  _buffer.insert(_buffer.end(), magic, magic+8);
+  _buffer.insert(_buffer.end(), (const char*)header, (const char*)header+sizeof(header));
+  _buffer.insert(_buffer.end(), (const char*)hashes, (const char*)hashes+sizeof(hashes));
+  _buffer.insert(_buffer.end(), (const char*)density, (const char*)density+sizeof(density));
+  append_array(_buffer, identifier);
+  for (size_t i = 0; i < attributes.size(); i++)
+  {
+    append_array(_buffer, attributes[i]);
+  }
+  append_array(_buffer, human_activity);
+  append_array(_buffer, edge_identifier1);
+  append_array(_buffer, edge_identifier2);
+  append_array(_buffer, edge_roads);
+  append_array(_buffer, offsets);
+  append_array(_buffer, neighbors);
+  append_array(_buffer, slot_edges);
+  append_array(_buffer, sample_identifier);
+  append_array(_buffer, sample_y);
+  append_array(_buffer, sample_n);
+  append_array(_buffer, kdtree);
+  _buffer.shrink_to_fit();
+  _size = _buffer.size();
+  bool success = attach(_buffer.data(), _size);
+  assert(success);
+  (void)success;
+}
+
+/**
+ * \brief    Load the map from file
+ * \details  The attributes are x, y, node area, suitable area, population,
+ *           population density and road density
+ * \param    std::string filename
+ * \param    std::vector<int>& identifier
+ * \param    std::vector< std::vector<double> >& attributes
+ * \return   \e void
+ */
+void Landscape::load_map( std::string filename, std::vector<int>& identifier, std::vector< std::vector<double> >& attributes )
+{
+  std::ifstream file(filename, std::ios::in);
+  assert(file);
+  std::string line;
+  int    cell_identifier = 0;
+  double values[7];
+  while(getline(file, line))
+  {
+    std::stringstream flux;
+    flux.str(line.c_str());
+    flux >> cell_identifier >> values[0] >> values[1] >> values[2] >> values[3] >> values[4] >> values[5] >> values[6];
+    identifier.push_back(cell_identifier);
+    for (int i = 0; i < 7; i++)
+    {
+      attributes[i].push_back(values[i]);
+    }
+  }
+  file.close();
+}
+
+/**
+ * \brief    Load the network from file
+ * \details  --
+ * \param    std::string filename
+ * \param    std::vector<int>& identifier1
+ * \param    std::vector<int>& identifier2
+ * \param    std::vector<double>& roads
+ * \return   \e void
+ */
+void Landscape::load_network( std::string filename, std::vector<int>& identifier1, std::vector<int>& identifier2, std::vector<double>& roads )
+{
+  std::ifstream file(filename, std::ios::in);
+  assert(file);
+  std::string line;
+  while(getline(file, line))
+  {
+    std::stringstream flux;
+    flux.str(line.c_str());
+    int    edge_identifier1 = 0;
+    int    edge_identifier2 = 0;
+    double edge_roads[ROAD_CATEGORIES];
+    flux >> edge_identifier1 >> edge_identifier2;
+    for (int i = 0; i < ROAD_CATEGORIES; i++)
+    {
+      edge_roads[i] = 0.0;
+      flux >> edge_roads[i];
+      assert(edge_roads[i] >= 0.0);
+    }
+    identifier1.push_back(edge_identifier1);
+    identifier2.push_back(edge_identifier2);
+    roads.insert(roads.end(), edge_roads, edge_roads+ROAD_CATEGORIES);
+  }
+  file.close();
+}
+
+/**
+ * \brief    Load the sample from file
+ * \details  --
+ * \param    std::string filename
+ * \param    std::vector<int>& identifier
+ * \param    std::vector<double>& y
+ * \param    std::vector<double>& n
+ * \return   \e void
+ */
+void Landscape::load_sample( std::string filename, std::vector<int>& identifier, std::vector<double>& y, std::vector<double>& n )
+{
+  std::ifstream file(filename, std::ios::in);
+  assert(file);
+  std::string line;
+  int    sample_identifier = 0;
+  double sample_y          = 0.0;
+  double sample_n          = 0.0;
+  while(getline(file, line))
+  {
+    std::stringstream flux;
+    flux.str(line.c_str());
+    flux >> sample_identifier >> sample_y >> sample_n;
+    identifier.push_back(sample_identifier);
+    y.push_back(sample_y);
+    n.push_back(sample_n);
+  }
+  file.close();
+}
+
+/**
+ * \brief    Map the binary landscape file in memory
+ * \details  The file is mapped read-only and shared. Returns false (and
+ *           leaves nothing mapped) if the file does not exist, has another
+ *           format version, or was compiled from other input files
+ * \param    std::string filename
+ * \return   \e bool
+ */
+bool Landscape::load_cache( std::string filename )
+{
+  int fd = open(filename.c_str(), O_RDONLY);
+  if (fd == -1)
+  {
+    return false;
+  }
+  struct stat file_stat;
+  if (fstat(fd, &file_stat) != 0 || file_stat.st_size < CACHE_HEADER)
+  {
+    close(fd);
+    return false;
+  }
+  void* mapping = mmap(NULL, (size_t)file_stat.st_size, PROT_READ, MAP_SHARED, fd, 0);
+  close(fd);
+  if (mapping == MAP_FAILED)
+  {
+    return false;
+  }
+  if (!attach((const char*)mapping, (size_t)file_stat.st_size))
+  {
+    munmap(mapping, (size_t)file_stat.st_size);
+    return false;
+  }
+  _mapping = mapping;
+  _size    = (size_t)file_stat.st_size;
+  return true;
+}
+
+/**
+ * \brief    Point the landscape arrays to landscape data
+ * \details  Checks the header (format version and hashes of the input
+ *           files) and the size of the data
+ * \param    const char* data
+ * \param    size_t size
+ * \return   \e bool
+ */
+bool Landscape::attach( const char* data, size_t size )
+{
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 1) Read and check the header            */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  int32_t  header[6];
+  uint64_t hashes[3];
+  double   density[2];
+  if (size < (size_t)CACHE_HEADER || strncmp(data, "HMDLAND", 8) != 0)
+  {
+    return false;
+  }
+  memcpy(header, data+8, sizeof(header));
+  memcpy(hashes, data+32, sizeof(hashes));
+  memcpy(density, data+56, sizeof(density));
+  if (header[0] != CACHE_VERSION || header[1] != ROAD_CATEGORIES)
+  {
+    return false;
+  }
+  if (hashes[0] != _map_hash || hashes[1] != _network_hash || hashes[2] != _sample_hash)
+  {
+    return false;
+  }
+  _number_of_cells         = header[2];
+  _number_of_edges         = header[3];
+  _number_of_slots         = header[4];
+  _number_of_samples       = header[5];
+  _mean_population_density = density[0];
+  _max_population_density  = density[1];
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 2) Point the arrays                     */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  size_t offset  = CACHE_HEADER;
+  bool   success = true;
+  success = success && view_array(data, size, offset, _number_of_cells, _identifier);
+  success = success && view_array(data, size, offset, _number_of_cells, _x);
+  success = success && view_array(data, size, offset, _number_of_cells, _y);
+  success = success && view_array(data, size, offset, _number_of_cells, _node_area);
+  success = success && view_array(data, size, offset, _number_of_cells, _suitable_area);
+  success = success && view_array(data, size, offset, _number_of_cells, _population);
+  success = success && view_array(data, size, offset, _number_of_cells, _population_density);
+  success = success && view_array(data, size, offset, _number_of_cells, _road_density);
+  success = success && view_array(data, size, offset, _number_of_cells, _human_activity);
+  success = success && view_array(data, size, offset, _number_of_edges, _edge_identifier1);
+  success = success && view_array(data, size, offset, _number_of_edges, _edge_identifier2);
+  success = success && view_array(data, size, offset, _number_of_edges*ROAD_CATEGORIES, _edge_roads);
+  success = success && view_array(data, size, offset, _number_of_cells+1, _offsets);
+  success = success && view_array(data, size, offset, _number_of_slots, _neighbors);
+  success = success && view_array(data, size, offset, _number_of_slots, _slot_edges);
+  success = success && view_array(data, size, offset, _number_of_samples, _sample_identifier);
+  success = success && view_array(data, size, offset, _number_of_samples, _sample_y);
+  success = success && view_array(data, size, offset, _number_of_samples, _sample_n);
+  success = success && view_array(data, size, offset, _number_of_cells, _kdtree);
+  return (success && offset == size);
+}
+
+/**
+ * \brief    Build the KD-tree of the cell coordinates
+ * \details  The tree is implicit: the middle cell of a range splits it on X
+ *           (even depths) or Y (odd depths), the cells before it having smaller
+ *           coordinates. Ties are ordered by cell index, so that the tree only
+ *           depends on the map
+ * \param    std::vector<int>& kdtree
+ * \param    const std::vector<double>& x
+ * \param    const std::vector<double>& y
+ * \param    int first
+ * \param    int last
+ * \param    int depth
+ * \return   \e void
+ */
+void Landscape::build_kdtree( std::vector<int>& kdtree, const std::vector<double>& x, const std::vector<double>& y, int first, int last, int depth ) const
+{
+  if (last-first <= 1)
+  {
+    return;
+  }
+  int                        middle = first+(last-first)/2;
+  const std::vector<double>& coord  = (depth%2 == 0 ? x : y);
+  std::nth_element(kdtree.begin()+first, kdtree.begin()+middle, kdtree.begin()+last, [&coord]( int cell1, int cell2 )
+  {
+    return (coord[cell1] < coord[cell2] || (coord[cell1] == coord[cell2] && cell1 < cell2));
+  });
+  build_kdtree(kdtree, x, y, first, middle, depth+1);
+  build_kdtree(kdtree, x, y, middle+1, last, depth+1);
+}
+
+/**
+ * \brief    Search the closest cell in a range of the KD-tree
+ * \details  The far side of a split is only skipped when its distance to the
+ *           point, computed as the distance to a cell, exceeds the best
+ *           distance, so that ties are resolved as in a scan of the map
+ * \param    double x
+ * \param    double y
+ * \param    int first
+ * \param    int last
+ * \param    int depth
+ * \param    int& best_cell
+ * \param    double& best_dist
+ * \return   \e void
+ */
+void Landscape::search_kdtree( double x, double y, int first, int last, int depth, int& best_cell, double& best_dist ) const
+{
+  if (first >= last)
+  {
+    return;
+  }
+  int    middle = first+(last-first)/2;
+  int    cell   = _kdtree[middle];
+  double dist   = sqrt((x-_x[cell])*(x-_x[cell]) + (y-_y[cell])*(y-_y[cell]));
+  if (best_cell == -1 || dist < best_dist || (dist == best_dist && cell < best_cell))
+  {
+    best_cell = cell;
+    best_dist = dist;
+  }
+  double delta = (depth%2 == 0 ? x-_x[cell] : y-_y[cell]);
+  if (delta < 0.0)
+  {
+    search_kdtree(x, y, first, middle, depth+1, best_cell, best_dist);
+    if (sqrt(delta*delta) <= best_dist)
+    {
+      search_kdtree(x, y, middle+1, last, depth+1, best_cell, best_dist);
+    }
+  }
+  else
+  {
+    search_kdtree(x, y, middle+1, last, depth+1, best_cell, best_dist);
+    if (sqrt(delta*delta) <= best_dist)
+    {
+      search_kdtree(x, y, first, middle, depth+1, best_cell, best_dist);
+    }
+  }
+}
+
+/**
+ * \brief    Compute the hash of a file
+ * \details  64 bits FNV-1a hash of the content of the file
+ * \param    std::string filename
+ * \return   \e uint64_t
+ */
+uint64_t Landscape::compute_file_hash( std::string filename ) const
+{
+  std::ifstream file(filename, std::ios::in | std::ios::binary);
+  assert(file);
+  uint64_t hash = 14695981039346656037ULL;
+  char     buffer[65536];
+  while (file.read(buffer, sizeof(buffer)) || file.gcount() > 0)
+  {
+    for (std::streamsize i = 0; i < file.gcount(); i++)
+    {
+      hash ^= (uint64_t)(unsigned char)buffer[i];
+      hash *= 1099511628211ULL;
+    }
+  }
+  file.close();
+  return hash;
+}
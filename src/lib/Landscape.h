@@ -0,0 +1,575 @@
+#ifndef __HMD_model__Landscape__
+#define __HMD_model__Landscape__
+
+#include <iostream>
+#include <fstream>
+#include <sstream>
+#include <string>
+#include <vector>
+#include <cstring>
+#include <cstdio>
+#include <stdint.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unordered_map>
+#include <algorithm>
+#include <cmath>
+#include <stdlib.h>
+#include <assert.h>
+
+
+class Landscape
+{
+
+public:
+
+  /*----------------------------
+   * CONSTRUCTORS
+   *----------------------------*/
+  Landscape( void ) = delete;
+  Landscape( std::string map_filename, std::string network_filename, std::string sample_filename );
+  Landscape( std::string map_filename, std::string network_filename, std::string sample_filename, std::string cache_filename );
+  Landscape( const Landscape& landscape ) = delete;
+
+  /*----------------------------
+   * DESTRUCTORS
+   *----------------------------*/
+  ~Landscape( void );
+
+  /*----------------------------
+   * GETTERS
+   *----------------------------*/
+
+  /*--------------------------------------- MAP */
+
+  inline int    get_number_of_cells( void ) const;
+  inline int    get_identifier( int cell ) const;
+  inline double get_x( int cell ) const;
+  inline double get_y( int cell ) const;
+  inline double get_node_area( int cell ) const;
+  inline double get_suitable_area( int cell ) const;
+  inline double get_population( int cell ) const;
+  inline double get_population_density( int cell ) const;
+  inline double get_road_density( int cell ) const;
+  inline double get_human_activity_index( int cell ) const;
+  inline double get_mean_population_density( void ) const;
+  inline double get_max_population_density( void ) const;
+  inline const int*    get_identifiers( void ) const;
+  inline const double* get_x_coordinates( void ) const;
+  inline const double* get_y_coordinates( void ) const;
+
+  /*--------------------------------------- NETWORK */
+
+  inline int    get_number_of_edges( void ) const;
+  inline int    get_edge_identifier1( int edge ) const;
+  inline int    get_edge_identifier2( int edge ) const;
+  inline double get_edge_roads( int edge, int category ) const;
+  inline int    get_offset( int cell ) const;
+  inline int    get_neighbor( int slot ) const;
+  inline int    get_slot_edge( int slot ) const;
+  inline int    get_number_of_slots( void ) const;
+  inline const int* get_offsets( void ) const;
+  inline const int* get_neighbors( void ) const;
+
+  /*--------------------------------------- SAMPLE */
+
+  inline int    get_number_of_samples( void ) const;
+  inline int    get_sample_identifier( int sample ) const;
+  inline double get_sample_y( int sample ) const;
+  inline double get_sample_n( int sample ) const;
+
+  /*--------------------------------------- CACHE */
+
+  inline bool     isLoadedFromCache( void ) const;
+  inline size_t   get_data_size( void ) const;
+  inline uint64_t get_map_hash( void ) const;
+  inline uint64_t get_network_hash( void ) const;
+  inline uint64_t get_sample_hash( void ) const;
+
+  /*----------------------------
+   * SETTERS
+   *----------------------------*/
+  Landscape& operator=(const Landscape&) = delete;
+
+  /*----------------------------
+   * PUBLIC METHODS
+   *----------------------------*/
+  void             write_cache( std::string filename ) const;
+  int              get_closest_cell( double x, double y ) const;
+  std::vector<int> get_closest_cells( const std::vector<double>& x, const std::vector<double>& y ) const;
+
+  /*----------------------------
+   * PUBLIC ATTRIBUTES
+   *----------------------------*/
+
+  static const int ROAD_CATEGORIES = 6;  /*!< Number of road categories by edge        */
+  static const int CACHE_VERSION   = 2;  /*!< Version of the binary landscape file     */
+  static const int CACHE_HEADER    = 72; /*!< Size of the header of the landscape data */
+
+protected:
+
+  /*----------------------------
+   * PROTECTED METHODS
+   *----------------------------*/
+  void compile( std::string map_filename, std::string network_filename, std::string sample_filename );
+  void load_map( std::string filename, std::vector<int>& identifier, std::vector< std::vector<double> >& attributes );
+  void load_network( std::string filename, std::vector<int>& identifier1, std::vector<int>& identifier2, std::vector<double>& roads );
+  void load_sample( std::string filename, std::vector<int>& identifier, std::vector<double>& y, std::vector<double>& n );
+  bool load_cache( std::string filename );
+  bool attach( const char* data, size_t size );
+  void build_kdtree( std::vector<int>& kdtree, const std::vector<double>& x, const std::vector<double>& y, int first, int last, int depth ) const;
+  void search_kdtree( double x, double y, int first, int last, int depth, int& best_cell, double& best_dist ) const;
+  uint64_t compute_file_hash( std::string filename ) const;
+
+  /*----------------------------
+   * PROTECTED ATTRIBUTES
+   *----------------------------*/
+
+  /*--------------------------------------- MAP */
+
+  int           _number_of_cells;         /*!< Number of cells                          */
+  const int*    _identifier;              /*!< Cell identifiers                         */
+  const double* _x;                       /*!< Cell X coordinates                       */
+  const double* _y;                       /*!< Cell Y coordinates                       */
+  const double* _node_area;               /*!< Cell areas                               */
+  const double* _suitable_area;           /*!< Cell suitable areas                      */
+  const double* _population;              /*!< Cell population sizes                    */
+  const double* _population_density;      /*!< Cell population density                  */
+  const double* _road_density;            /*!< Cell road density                        */
+  const double* _human_activity;          /*!< Cell human activity index                */
+  double        _mean_population_density; /*!< Mean population density                 */
+  double        _max_population_density;  /*!< Max population density                  */
+
+  /*--------------------------------------- NETWORK */
+
+  int           _number_of_edges;  /*!< Number of edges                                    */
+  int           _number_of_slots;  /*!< Number of edge ends in the map                     */
+  const int*    _edge_identifier1; /*!< First cell of each edge (-1 if out of the map)     */
+  const int*    _edge_identifier2; /*!< Second cell of each edge (-1 if out of the map)    */
+  const double* _edge_roads;       /*!< Road categories of each edge (row-major)           */
+  const int*    _offsets;          /*!< First slot of each cell (CSR, one slot by edge end) */
+  const int*    _neighbors;        /*!< Neighbor cell of each slot (-1 if out of the map)  */
+  const int*    _slot_edges;       /*!< Edge of each slot                                  */
+
+  /*--------------------------------------- SAMPLE */
+
+  int           _number_of_samples; /*!< Number of sampled cells   */
+  const int*    _sample_identifier; /*!< Sampled cell identifiers  */
+  const double* _sample_y;          /*!< Number of positive traps  */
+  const double* _sample_n;          /*!< Number of traps           */
+
+  /*--------------------------------------- SPATIAL INDEX */
+
+  const int* _kdtree; /*!< Cells in the order of the implicit KD-tree (median of each range splits it) */
+
+  /*--------------------------------------- STORAGE */
+
+  std::vector<char> _buffer;            /*!< Landscape data compiled from the input files       */
+  void*             _mapping;           /*!< Landscape data mapped from the binary file (or NULL) */
+  size_t            _size;              /*!< Size of the landscape data                         */
+  bool              _loaded_from_cache; /*!< Was the landscape loaded from the binary file      */
+  uint64_t          _map_hash;          /*!< Hash of the map file                               */
+  uint64_t          _network_hash;      /*!< Hash of the network file                           */
+  uint64_t          _sample_hash;       /*!< Hash of the sample file                            */
+
+};
+
+
+/*----------------------------
+ * GETTERS
+ *----------------------------*/
+
+/*--------------------------------------- MAP */
+
+/**
+ * \brief    Get the number of cells
+ * \details  --
+ * \param    void
+ * \return   \e int
+ */
+inline int Landscape::get_number_of_cells( void ) const
+{
+  return _number_of_cells;
+}
+
+/**
+ * \brief    Get the identifier of a cell
+ * \details  --
+ * \param    int cell
+ * \return   \e int
+ */
+inline int Landscape::get_identifier( int cell ) const
+{
+  return _identifier[cell];
+}
+
+/**
+ * \brief    Get the X coordinate of a cell
+ * \details  --
+ * \param    int cell
+ * \return   \e double
+ */
+inline double Landscape::get_x( int cell ) const
+{
+  return _x[cell];
+}
+
+/**
+ * \brief    Get the Y coordinate of a cell
+ * \details  --
+ * \param    int cell
+ * \return   \e double
+ */
+inline double Landscape::get_y( int cell ) const
+{
+  return _y[cell];
+}
+
+/**
+ * \brief    Get the area of a cell
+ * \details  --
+ * \param    int cell
+ * \return   \e double
+ */
+inline double Landscape::get_node_area( int cell ) const
+{
+  return _node_area[cell];
+}
+
+/**
+ * \brief    Get the suitable area of a cell
+ * \details  --
+ * \param    int cell
+ * \return   \e double
+ */
+inline double Landscape::get_suitable_area( int cell ) const
+{
+  return _suitable_area[cell];
+}
+
+/**
+ * \brief    Get the population size of a cell
+ * \details  --
+ * \param    int cell
+ * \return   \e double
+ */
+inline double Landscape::get_population( int cell ) const
+{
+  return _population[cell];
+}
+
+/**
+ * \brief    Get the population density of a cell
+ * \details  --
+ * \param    int cell
+ * \return   \e double
+ */
+inline double Landscape::get_population_density( int cell ) const
+{
+  return _population_density[cell];
+}
+
+/**
+ * \brief    Get the road density of a cell
+ * \details  --
+ * \param    int cell
+ * \return   \e double
+ */
+inline double Landscape::get_road_density( int cell ) const
+{
+  return _road_density[cell];
+}
+
+/**
+ * \brief    Get the human activity index of a cell
+ * \details  Population density of the cell over the maximum population density
+ * \param    int cell
+ * \return   \e double
+ */
+inline double Landscape::get_human_activity_index( int cell ) const
+{
+  return _human_activity[cell];
+}
+
+/**
+ * \brief    Get the mean population density of the cells
+ * \details  --
+ * \param    void
+ * \return   \e double
+ */
+inline double Landscape::get_mean_population_density( void ) const
+{
+  return _mean_population_density;
+}
+
+/**
+ * \brief    Get the maximum population density of the cells
+ * \details  --
+ * \param    void
+ * \return   \e double
+ */
+inline double Landscape::get_max_population_density( void ) const
+{
+  return _max_population_density;
+}
+
+/**
+ * \brief    Get the identifiers of the cells
+ * \details  Read-only array of get_number_of_cells() values
+ * \param    void
+ * \return   \e const int*
+ */
+inline const int* Landscape::get_identifiers( void ) const
+{
+  return _identifier;
+}
+
+/**
+ * \brief    Get the X coordinates of the cells
+ * \details  Read-only array of get_number_of_cells() values
+ * \param    void
+ * \return   \e const double*
+ */
+inline const double* Landscape::get_x_coordinates( void ) const
+{
+  return _x;
+}
+
+/**
+ * \brief    Get the Y coordinates of the cells
+ * \details  Read-only array of get_number_of_cells() values
+ * \param    void
+ * \return   \e const double*
+ */
+inline const double* Landscape::get_y_coordinates( void ) const
+{
+  return _y;
+}
+
+/*--------------------------------------- NETWORK */
+
+/**
+ * \brief    Get the number of edges
+ * \details  --
+ * \param    void
+ * \return   \e int
+ */
+inline int Landscape::get_number_of_edges( void ) const
+{
+  return _number_of_edges;
+}
+
+/**
+ * \brief    Get the first cell identifier of an edge
+ * \details  --
+ * \param    int edge
+ * \return   \e int
+ */
+inline int Landscape::get_edge_identifier1( int edge ) const
+{
+  return _edge_identifier1[edge];
+}
+
+/**
+ * \brief    Get the second cell identifier of an edge
+ * \details  --
+ * \param    int edge
+ * \return   \e int
+ */
+inline int Landscape::get_edge_identifier2( int edge ) const
+{
+  return _edge_identifier2[edge];
+}
+
+/**
+ * \brief    Get the quantity of roads of a given category in an edge
+ * \details  Categories are numbered from 0 (category I) to 5 (category VI)
+ * \param    int edge
+ * \param    int category
+ * \return   \e double
+ */
+inline double Landscape::get_edge_roads( int edge, int category ) const
+{
+  assert(category >= 0);
+  assert(category < ROAD_CATEGORIES);
+  return _edge_roads[edge*ROAD_CATEGORIES+category];
+}
+
+/**
+ * \brief    Get the first slot of a cell in the CSR arrays
+ * \details  The slots of a cell range from get_offset(cell) to
+ *           get_offset(cell+1) excluded
+ * \param    int cell
+ * \return   \e int
+ */
+inline int Landscape::get_offset( int cell ) const
+{
+  return _offsets[cell];
+}
+
+/**
+ * \brief    Get the neighbor cell index of a slot
+ * \details  Returns -1 if the edge leads out of the map
+ * \param    int slot
+ * \return   \e int
+ */
+inline int Landscape::get_neighbor( int slot ) const
+{
+  return _neighbors[slot];
+}
+
+/**
+ * \brief    Get the edge of a slot
+ * \details  --
+ * \param    int slot
+ * \return   \e int
+ */
+inline int Landscape::get_slot_edge( int slot ) const
+{
+  return _slot_edges[slot];
+}
+
+/**
+ * \brief    Get the number of slots
+ * \details  --
+ * \param    void
+ * \return   \e int
+ */
+inline int Landscape::get_number_of_slots( void ) const
+{
+  return _number_of_slots;
+}
+
+/**
+ * \brief    Get the CSR offsets of the cells
+ * \details  Read-only array of get_number_of_cells()+1 values
+ * \param    void
+ * \return   \e const int*
+ */
+inline const int* Landscape::get_offsets( void ) const
+{
+  return _offsets;
+}
+
+/**
+ * \brief    Get the neighbor cell index of each slot
+ * \details  Read-only array of get_number_of_slots() values
+ * \param    void
+ * \return   \e const int*
+ */
+inline const int* Landscape::get_neighbors( void ) const
+{
+  return _neighbors;
+}
+
+/*--------------------------------------- SAMPLE */
+
+/**
+ * \brief    Get the number of sampled cells
+ * \details  --
+ * \param    void
+ * \return   \e int
+ */
+inline int Landscape::get_number_of_samples( void ) const
+{
+  return _number_of_samples;
+}
+
+/**
+ * \brief    Get the identifier of a sampled cell
+ * \details  --
+ * \param    int sample
+ * \return   \e int
+ */
+inline int Landscape::get_sample_identifier( int sample ) const
+{
+  return _sample_identifier[sample];
+}
+
+/**
+ * \brief    Get the number of positive traps of a sampled cell
+ * \details  --
+ * \param    int sample
+ * \return   \e double
+ */
+inline double Landscape::get_sample_y( int sample ) const
+{
+  return _sample_y[sample];
+}
+
+/**
+ * \brief    Get the number of traps of a sampled cell
+ * \details  --
+ * \param    int sample
+ * \return   \e double
+ */
+inline double Landscape::get_sample_n( int sample ) const
+{
+  return _sample_n[sample];
+}
+
+/*--------------------------------------- CACHE */
+
+/**
+ * \brief    Check if the landscape was loaded from the binary file
+ * \details  --
+ * \param    void
+ * \return   \e bool
+ */
+inline bool Landscape::isLoadedFromCache( void ) const
+{
+  return _loaded_from_cache;
+}
+
+/**
+ * \brief    Get the size of the landscape data
+ * \details  Same layout as the binary landscape file
+ * \param    void
+ * \return   \e size_t
+ */
+inline size_t Landscape::get_data_size( void ) const
+{
+  return _size;
+}
+
+/**
+ * \brief    Get the hash of the map file
+ * \details  --
+ * \param    void
+ * \return   \e uint64_t
+ */
+inline uint64_t Landscape::get_map_hash( void ) const
+{
+  return _map_hash;
+}
+
+/**
+ * \brief    Get the hash of the network file
+ * \details  --
+ * \param    void
+ * \return   \e uint64_t
+ */
+inline uint64_t Landscape::get_network_hash( void ) const
+{
+  return _network_hash;
+}
+
+/**
+ * \brief    Get the hash of the sample file
+ * \details  --
+ * \param    void
+ * \return   \e uint64_t
+ */
+inline uint64_t Landscape::get_sample_hash( void ) const
+{
+  return _sample_hash;
+}
+
+/*----------------------------
+ * SETTERS
+ *----------------------------*/
+
+
+#endif /* defined(__HMD_model__Landscape__) */
@@ -34,8 +34,6 @@ Node::Node( Parameters* parameters, int identifier )
 
   /*--------------------------------------- NETWORK */
 
-  _neighbors.clear();
-  _weights.clear();
   _weights_sum          = 0.0;
   _human_activity_index = 0.0;
 
@@ -47,17 +45,20 @@ Node::Node( Parameters* parameters, int identifier )
 
   /*--------------------------------------- SIMULATION VARIABLES */
 
-  _tagged                 = false;
-  _current_state          = new int[_parameters->get_repetitions()];
-  _next_state             = new int[_parameters->get_repetitions()];
+  _state_words            = (_parameters->get_repetitions()+63)/64;
+  _current_state          = new uint64_t[_state_words];
+  _next_state             = new uint64_t[_state_words];
   _nb_introductions       = new double[_parameters->get_repetitions()];
   _total_nb_introductions = 0.0;
   _mean_nb_introductions  = 0.0;
   _var_nb_introductions   = 0.0;
+  for (int i = 0; i < _state_words; i++)
+  {
+    _current_state[i] = 0;
+    _next_state[i]    = 0;
+  }
   for (int i = 0; i < _parameters->get_repetitions(); i++)
   {
-    _current_state[i]    = 0;
-    _next_state[i]       = 0;
     _nb_introductions[i] = 0.0;
   }
   _n_sim              = (double)_parameters->get_repetitions();
@@ -75,6 +76,17 @@ Node::Node( Parameters* parameters, int identifier )
   _var_first_invasion_age  = 0.0;
   _var_last_invasion_age   = 0.0;
 
+  /*--------------------------------------- SUFFICIENT STATISTICS */
+
+  _sum_nb_introductions           = 0.0;
+  _sum_squared_nb_introductions   = 0.0;
+  _nb_first_invasions             = 0.0;
+  _sum_first_invasion_age         = 0.0;
+  _sum_squared_first_invasion_age = 0.0;
+  _nb_last_invasions              = 0.0;
+  _sum_last_invasion_age          = 0.0;
+  _sum_squared_last_invasion_age  = 0.0;
+
   /*--------------------------------------- SCORES */
 
   _likelihood             = 0.0;
@@ -85,6 +97,7 @@ Node::Node( Parameters* parameters, int identifier )
   _log_maximum_likelihood = 0.0;
   _empty_score            = 0.0;
   _score                  = 0.0;
+  _score_bounds           = NULL;
 }
 
 /*----------------------------
@@ -99,11 +112,6 @@ Node::Node( Parameters* parameters, int identifier )
  */
 Node::~Node( void )
 {
-  /*--------------------------------------- NETWORK */
-
-  _neighbors.clear();
-  _weights.clear();
-
   /*--------------------------------------- SIMULATION VARIABLES */
 
   delete[] _current_state;
@@ -116,60 +124,17 @@ Node::~Node( void )
   _first_invasion_age = NULL;
   delete[] _last_invasion_age;
   _last_invasion_age = NULL;
+
+  /*--------------------------------------- SCORES */
+
+  delete[] _score_bounds;
+  _score_bounds = NULL;
 }
 
 /*----------------------------
  * PUBLIC METHODS
  *----------------------------*/
 
-/**
- * \brief    Jump to the next node
- * \details  --
- * \param    void
- * \return   \e Node*
- */
-Node* Node::jump( void )
-{
-  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  /* 1) Compute the weight sum (for a self-avoiding random walk) */
-  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  double weight_sum = 0.0;
-  for (size_t i = 0; i < _neighbors.size(); i++)
-  {
-    if (!(_neighbors[i] != NULL && _neighbors[i]->isTagged()))
-    {
-      weight_sum += _weights[i];
-    }
-  }
-
-  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  /* 2) If there is no way to escape the node, break             */
-  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  if (weight_sum == 0.0)
-  {
-    return this;
-  }
-
-  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  /* 3) Or draw the next node with roulette wheel                */
-  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  double draw = _prng->uniform()*weight_sum;
-  double sum  = 0.0;
-  for (size_t i = 0; i < _neighbors.size(); i++)
-  {
-    if (!(_neighbors[i] != NULL && _neighbors[i]->isTagged()))
-    {
-      sum += _weights[i];
-      if (draw < sum)
-      {
-        return _neighbors[i];
-      }
-    }
-  }
-  printf("Error during jump (Node::jump() method)...\n");
-  exit(EXIT_FAILURE);
-}
-
 /**
  * \brief    Update node state
  * \details  This method also computes the next simulated probability of presence
@@ -178,50 +143,58 @@ Node* Node::jump( void )
  */
 void Node::update_state( void )
 {
-  _mean_nb_introductions      = 0.0;
-  _var_nb_introductions       = 0.0;
-  _y_sim                      = 0.0;
-  _p_sim                      = 0.0;
-  _mean_first_invasion_age    = 0.0;
-  _mean_last_invasion_age     = 0.0;
-  _var_first_invasion_age     = 0.0;
-  _var_last_invasion_age      = 0.0;
-  double first_invasion_count = 0.0;
-  double last_invasion_count  = 0.0;
+  _sum_nb_introductions           = 0.0;
+  _sum_squared_nb_introductions   = 0.0;
+  _y_sim                          = 0.0;
+  _p_sim                          = 0.0;
+  _nb_first_invasions             = 0.0;
+  _sum_first_invasion_age         = 0.0;
+  _sum_squared_first_invasion_age = 0.0;
+  _nb_last_invasions              = 0.0;
+  _sum_last_invasion_age          = 0.0;
+  _sum_squared_last_invasion_age  = 0.0;
+  _mean_first_invasion_age        = 0.0;
+  _mean_last_invasion_age         = 0.0;
+  _var_first_invasion_age         = 0.0;
+  _var_last_invasion_age          = 0.0;
+  for (int word = 0; word < _state_words; word++)
+  {
+    _current_state[word] = _next_state[word];
+  }
   for (int rep = 0; rep < _parameters->get_repetitions(); rep++)
   {
-    _current_state[rep]     = _next_state[rep];
-    _mean_nb_introductions += _nb_introductions[rep];
-    _var_nb_introductions  += _nb_introductions[rep]*_nb_introductions[rep];
-    _y_sim                 += (double)_current_state[rep];
-    _p_sim                 += (double)_current_state[rep];
+    double state                   = (double)isOccupied(rep);
+    _sum_nb_introductions         += _nb_introductions[rep];
+    _sum_squared_nb_introductions += _nb_introductions[rep]*_nb_introductions[rep];
+    _y_sim                        += state;
+    _p_sim                        += state;
     if (_first_invasion_age[rep] != -1.0)
     {
-      _mean_first_invasion_age += _first_invasion_age[rep];
-      _var_first_invasion_age  += _first_invasion_age[rep]*_first_invasion_age[rep];
-      first_invasion_count     += 1.0;
+      _sum_first_invasion_age         += _first_invasion_age[rep];
+      _sum_squared_first_invasion_age += _first_invasion_age[rep]*_first_invasion_age[rep];
+      _nb_first_invasions             += 1.0;
     }
     if (_last_invasion_age[rep] != -1.0)
     {
-      _mean_last_invasion_age += _last_invasion_age[rep];
-      _var_last_invasion_age  += _last_invasion_age[rep]*_last_invasion_age[rep];
-      last_invasion_count     += 1.0;
+      _sum_last_invasion_age         += _last_invasion_age[rep];
+      _sum_squared_last_invasion_age += _last_invasion_age[rep]*_last_invasion_age[rep];
+      _nb_last_invasions             += 1.0;
     }
   }
-  _mean_nb_introductions /= _n_sim;
-  _var_nb_introductions  /= _n_sim;
+  _mean_nb_introductions  = _sum_nb_introductions/_n_sim;
+  _var_nb_introductions   = _sum_squared_nb_introductions/_n_sim;
   _var_nb_introductions  -= _mean_nb_introductions*_mean_nb_introductions;
   _p_sim                 /= _n_sim;
-  if (first_invasion_count > 0.0)
+  if (_nb_first_invasions > 0.0)
   {
-    _mean_first_invasion_age /= first_invasion_count;
-    _var_first_invasion_age  /= first_invasion_count;
+    _mean_first_invasion_age  = _sum_first_invasion_age/_nb_first_invasions;
+    _var_first_invasion_age   = _sum_squared_first_invasion_age/_nb_first_invasions;
     _var_first_invasion_age  -= _mean_first_invasion_age*_mean_first_invasion_age;
   }
-  if (last_invasion_count > 0.0)
+  if (_nb_last_invasions > 0.0)
   {
-    _mean_last_invasion_age /= last_invasion_count;
-    _var_last_invasion_age  /= last_invasion_count;
+    _mean_last_invasion_age  = _sum_last_invasion_age/_nb_last_invasions;
+    _var_last_invasion_age   = _sum_squared_last_invasion_age/_nb_last_invasions;
     _var_last_invasion_age  -= _mean_last_invasion_age*_mean_last_invasion_age;
   }
 }
@@ -234,10 +207,13 @@ void Node::update_state( void )
  */
 void Node::reset_state( void )
 {
+  for (int word = 0; word < _state_words; word++)
+  {
+    _current_state[word] = 0;
+    _next_state[word]    = 0;
+  }
   for (int rep = 0; rep < _parameters->get_repetitions(); rep++)
   {
-    _current_state[rep]    = 0;
-    _next_state[rep]       = 0;
     _nb_introductions[rep] = 0.0;
   }
   _total_nb_introductions = 0.0;
@@ -254,6 +230,44 @@ void Node::reset_state( void )
   _mean_last_invasion_age  = 0.0;
   _var_first_invasion_age  = 0.0;
   _var_last_invasion_age   = 0.0;
+  _sum_nb_introductions           = 0.0;
+  _sum_squared_nb_introductions   = 0.0;
+  _nb_first_invasions             = 0.0;
+  _sum_first_invasion_age         = 0.0;
+  _sum_squared_first_invasion_age = 0.0;
+  _nb_last_invasions              = 0.0;
+  _sum_last_invasion_age          = 0.0;
+  _sum_squared_last_invasion_age  = 0.0;
+}
+
+/**
+ * \brief    Clear the repetitions out of a block of repetitions
+ * \details  Used to simulate a shard of the repetitions: the introduction is
+ *           drawn for all the repetitions, then only the block is kept. Must
+ *           be called before the first update of the node state
+ * \param    int first_rep
+ * \param    int last_rep
+ * \return   \e void
+ */
+void Node::restrict_to_repetitions( int first_rep, int last_rep )
+{
+  _y_sim = 0.0;
+  for (int rep = 0; rep < _parameters->get_repetitions(); rep++)
+  {
+    if (rep < first_rep || rep >= last_rep)
+    {
+      _current_state[rep/64]   &= ~((uint64_t)1 << (rep%64));
+      _next_state[rep/64]      &= ~((uint64_t)1 << (rep%64));
+      _nb_introductions[rep]    = 0.0;
+      _first_invasion_age[rep]  = -1.0;
+      _last_invasion_age[rep]   = -1.0;
+    }
+    else if (isOccupied(rep))
+    {
+      _y_sim += 1.0;
+    }
+  }
+  _p_sim = _y_sim/_n_sim;
 }
 
 /**
@@ -289,6 +303,56 @@ void Node::compute_score( void )
   }
 }
 
+/**
+ * \brief    Compute the lowest score reachable from each number of occupied repetitions
+ * \details  The sample data must be loaded. The bound of y_sim occupied
+ *           repetitions is the lowest score over y_sim, ..., n_sim occupied
+ *           repetitions
+ * \param    void
+ * \return   \e void
+ */
+void Node::compute_score_bounds( void )
+{
+  unsigned int n_sim = (unsigned int)_n_sim;
+  delete[] _score_bounds;
+  _score_bounds        = new double[n_sim+1];
+  _score_bounds[n_sim] = compute_score_at(n_sim);
+  for (int y_sim = (int)n_sim-1; y_sim >= 0; y_sim--)
+  {
+    double score         = compute_score_at((unsigned int)y_sim);
+    _score_bounds[y_sim] = (score < _score_bounds[y_sim+1] ? score : _score_bounds[y_sim+1]);
+  }
+}
+
 /*----------------------------
  * PROTECTED METHODS
  *----------------------------*/
+
+/**
+ * \brief    Compute the score for a given number of occupied repetitions
+ * \details  Same computation as compute_score(), without modifying the node
+ * \param    unsigned int y_sim
+ * \return   \e double
+ */
+double Node::compute_score_at( unsigned int y_sim )
+{
+  unsigned int a = y_sim;
+  unsigned int b = (unsigned int)(_y_obs);
+  unsigned int c = (unsigned int)(_n_sim)-y_sim;
+  unsigned int d = (unsigned int)(_n_obs-_y_obs);
+  if (_parameters->get_optimization_function() == LSS)
+  {
+    double p_sim = (double)y_sim/_n_sim;
+    return (p_sim-_p_obs)*(p_sim-_p_obs);
+  }
+  else if (_parameters->get_optimization_function() == LOG_LIKELIHOOD)
+  {
+    return -log(gsl_ran_hypergeometric_pdf(a, a+b, c+d, a+c));
+  }
+  else if (_parameters->get_optimization_function() == LIKELIHOOD_LSS)
+  {
+    double ratio = gsl_ran_hypergeometric_pdf(a, a+b, c+d, a+c)/gsl_ran_hypergeometric_pdf(b, b+b, d+d, b+d);
+    return (1.0-ratio)*(1.0-ratio);
+  }
+  return 0.0;
+}
@@ -3,6 +3,7 @@
 
 #include <iostream>
 #include <vector>
+#include <stdint.h>
 #include <cstring>
 #include <stdlib.h>
 #include <assert.h>
@@ -49,10 +50,8 @@ public:
 
   /*--------------------------------------- NETWORK */
 
-  inline std::vector<Node*>*  get_neighbors( void );
-  inline std::vector<double>* get_weights( void );
-  inline double               get_weights_sum( void ) const;
-  inline double               get_human_activity_index( void ) const;
+  inline double get_weights_sum( void ) const;
+  inline double get_human_activity_index( void ) const;
 
   /*--------------------------------------- SAMPLE */
 
@@ -62,20 +61,29 @@ public:
 
   /*--------------------------------------- SIMULATION VARIABLES */
 
-  inline bool   isTagged( void ) const;
-  inline bool   isOccupied( int rep ) const;
-  inline double get_total_nb_introductions( void ) const;
-  inline double get_mean_nb_introductions( void ) const;
-  inline double get_var_nb_introductions( void ) const;
-  inline double get_n_sim( void ) const;
-  inline double get_y_sim( void ) const;
-  inline double get_p_sim( void ) const;
-  inline double get_first_invasion_age( int rep ) const;
-  inline double get_last_invasion_age( int rep ) const;
-  inline double get_mean_first_invasion_age( void ) const;
-  inline double get_mean_last_invasion_age( void ) const;
-  inline double get_var_first_invasion_age( void ) const;
-  inline double get_var_last_invasion_age( void ) const;
+  inline bool     isOccupied( int rep ) const;
+  inline int      get_number_of_state_words( void ) const;
+  inline uint64_t get_state_word( int word ) const;
+  inline double   get_total_nb_introductions( void ) const;
+  inline double   get_mean_nb_introductions( void ) const;
+  inline double   get_var_nb_introductions( void ) const;
+  inline double   get_n_sim( void ) const;
+  inline double   get_y_sim( void ) const;
+  inline double   get_p_sim( void ) const;
+  inline double   get_first_invasion_age( int rep ) const;
+  inline double   get_last_invasion_age( int rep ) const;
+  inline double   get_mean_first_invasion_age( void ) const;
+  inline double   get_mean_last_invasion_age( void ) const;
+  inline double   get_var_first_invasion_age( void ) const;
+  inline double   get_var_last_invasion_age( void ) const;
+  inline double   get_sum_nb_introductions( void ) const;
+  inline double   get_sum_squared_nb_introductions( void ) const;
+  inline double   get_nb_first_invasions( void ) const;
+  inline double   get_sum_first_invasion_age( void ) const;
+  inline double   get_sum_squared_first_invasion_age( void ) const;
+  inline double   get_nb_last_invasions( void ) const;
+  inline double   get_sum_last_invasion_age( void ) const;
+  inline double   get_sum_squared_last_invasion_age( void ) const;
 
   /*--------------------------------------- SCORES */
 
@@ -87,6 +95,7 @@ public:
   inline double get_log_maximum_likelihood( void ) const;
   inline double get_empty_score( void ) const;
   inline double get_score( void ) const;
+  inline double get_score_bound( void ) const;
 
   /*----------------------------
    * SETTERS
@@ -99,7 +108,7 @@ public:
 
   /*--------------------------------------- NETWORK */
 
-  inline void add_neighbor( double weight, Node* node );
+  inline void set_weights_sum( double weights_sum );
   inline void set_human_activity_index( double human_activity_index );
 
   /*--------------------------------------- SAMPLE */
@@ -108,8 +117,6 @@ public:
 
   /*--------------------------------------- SIMULATION VARIABLES */
 
-  inline void tag( void );
-  inline void untag( void );
   inline void add_introduction( int rep );
   inline void set_as_introduction_node( void );
   inline void update_invasion_age( double age, int rep );
@@ -117,10 +124,11 @@ public:
   /*----------------------------
    * PUBLIC METHODS
    *----------------------------*/
-  Node* jump( void );
-  void  update_state( void );
-  void  reset_state( void );
-  void  compute_score( void );
+  void update_state( void );
+  void reset_state( void );
+  void restrict_to_repetitions( int first_rep, int last_rep );
+  void compute_score( void );
+  void compute_score_bounds( void );
 
   /*----------------------------
    * PUBLIC ATTRIBUTES
@@ -131,6 +139,7 @@ protected:
   /*----------------------------
    * PROTECTED METHODS
    *----------------------------*/
+  double compute_score_at( unsigned int y_sim );
 
   /*----------------------------
    * PROTECTED ATTRIBUTES
@@ -144,10 +153,8 @@ protected:
 
   /*--------------------------------------- NETWORK */
 
-  std::vector<Node*>  _neighbors;            /*!< Vector of neighbors  */
-  std::vector<double> _weights;              /*!< Vector of weights    */
-  double              _weights_sum;          /*!< Sum of weights       */
-  double              _human_activity_index; /*!< Human activity index */
+  double _weights_sum;          /*!< Sum of weights       */
+  double _human_activity_index; /*!< Human activity index */
 
   /*--------------------------------------- MAP */
 
@@ -167,33 +174,45 @@ protected:
 
   /*--------------------------------------- SIMULATION VARIABLES */
 
-  bool    _tagged;                  /*!< Node tag state                          */
-  int*    _current_state;           /*!< Hexagon current state                   */
-  int*    _next_state;              /*!< Hexagon next state                      */
-  double* _nb_introductions;        /*!< Number of introductions                 */
-  double  _total_nb_introductions;  /*!< Total number of introductions           */
-  double  _mean_nb_introductions;   /*!< Mean number of introductions            */
-  double  _var_nb_introductions;    /*!< Variance of the number of introductions */
-  double  _n_sim;                   /*!< Number of virtual sampled cells         */
-  double  _y_sim;                   /*!< Number of occupied cells                */
-  double  _p_sim;                   /*!< Simulated prevalence                    */
-  double* _first_invasion_age;      /*!< Age of the first invasion               */
-  double* _last_invasion_age;       /*!< Age of the last invasion                */
-  double  _mean_first_invasion_age; /*!< Mean age of the first invasion          */
-  double  _mean_last_invasion_age;  /*!< Mean age of the last invasion           */
-  double  _var_first_invasion_age;  /*!< Variance of age of the first invasion   */
-  double  _var_last_invasion_age;   /*!< Variance of age of the last invasion    */
+  int       _state_words;             /*!< Number of words of the state bitsets    */
+  uint64_t* _current_state;           /*!< Hexagon current state (bit by rep)      */
+  uint64_t* _next_state;              /*!< Hexagon next state (bit by rep)         */
+  double*   _nb_introductions;        /*!< Number of introductions                 */
+  double    _total_nb_introductions;  /*!< Total number of introductions           */
+  double    _mean_nb_introductions;   /*!< Mean number of introductions            */
+  double    _var_nb_introductions;    /*!< Variance of the number of introductions */
+  double    _n_sim;                   /*!< Number of virtual sampled cells         */
+  double    _y_sim;                   /*!< Number of occupied cells                */
+  double    _p_sim;                   /*!< Simulated prevalence                    */
+  double*   _first_invasion_age;      /*!< Age of the first invasion               */
+  double*   _last_invasion_age;       /*!< Age of the last invasion                */
+  double    _mean_first_invasion_age; /*!< Mean age of the first invasion          */
+  double    _mean_last_invasion_age;  /*!< Mean age of the last invasion           */
+  double    _var_first_invasion_age;  /*!< Variance of age of the first invasion   */
+  double    _var_last_invasion_age;   /*!< Variance of age of the last invasion    */
+
+  /*--------------------------------------- SUFFICIENT STATISTICS */
+
+  double _sum_nb_introductions;           /*!< Sum of the numbers of introductions             */
+  double _sum_squared_nb_introductions;   /*!< Sum of the squared numbers of introductions     */
+  double _nb_first_invasions;             /*!< Number of repetitions with a first invasion age */
+  double _sum_first_invasion_age;         /*!< Sum of the ages of the first invasion           */
+  double _sum_squared_first_invasion_age; /*!< Sum of the squared ages of the first invasion   */
+  double _nb_last_invasions;              /*!< Number of repetitions with a last invasion age  */
+  double _sum_last_invasion_age;          /*!< Sum of the ages of the last invasion            */
+  double _sum_squared_last_invasion_age;  /*!< Sum of the squared ages of the last invasion    */
 
   /*--------------------------------------- SCORES */
 
-  double _likelihood;             /*!< Fisher's likelihood         */
-  double _empty_likelihood;       /*!< Fisher's empty likelihood   */
-  double _maximum_likelihood;     /*!< Fisher's maximum likelihood */
-  double _log_likelihood;         /*!< Log likelihood              */
-  double _log_empty_likelihood;   /*!< Log empty likelihood        */
-  double _log_maximum_likelihood; /*!< Log maximum likelihood      */
-  double _empty_score;            /*!< Empty score                 */
-  double _score;                  /*!< Score                       */
+  double  _likelihood;             /*!< Fisher's likelihood         */
+  double  _empty_likelihood;       /*!< Fisher's empty likelihood   */
+  double  _maximum_likelihood;     /*!< Fisher's maximum likelihood */
+  double  _log_likelihood;         /*!< Log likelihood              */
+  double  _log_empty_likelihood;   /*!< Log empty likelihood        */
+  double  _log_maximum_likelihood; /*!< Log maximum likelihood      */
+  double  _empty_score;            /*!< Empty score                 */
+  double  _score;                  /*!< Score                       */
+  double* _score_bounds;           /*!< Lowest reachable scores     */
 };
 
 
@@ -295,28 +314,6 @@ inline double Node::get_road_density( void ) const
 
 /*--------------------------------------- NETWORK */
 
-/**
- * \brief    Get the list of neighbors
- * \details  --
- * \param    void
- * \return   \e std::vector<Node*>*
- */
-inline std::vector<Node*>* Node::get_neighbors( void )
-{
-  return &_neighbors;
-}
-
-/**
- * \brief    Get the list of weights
- * \details  --
- * \param    void
- * \return   \e std::vector<double>*
- */
-inline std::vector<double>* Node::get_weights( void )
-{
-  return &_weights;
-}
-
 /**
  * \brief    Get the sum of edge weights
  * \details  --
@@ -377,27 +374,40 @@ inline double Node::get_p_obs( void ) const
 /*--------------------------------------- SIMULATION VARIABLES */
 
 /**
- * \brief    Check if the node is tagged
+ * \brief    Get current state for repetition rep
  * \details  --
- * \param    void
+ * \param    int rep
  * \return   \e bool
  */
-inline bool Node::isTagged( void ) const
+inline bool Node::isOccupied( int rep ) const
 {
-  return _tagged;
+  assert(rep >= 0);
+  assert(rep < _parameters->get_repetitions());
+  return (_current_state[rep/64] >> (rep%64)) & 1;
 }
 
 /**
- * \brief    Get current state for repetition rep
- * \details  --
- * \param    int rep
+ * \brief    Get the number of words of the state bitsets
+ * \details  Repetition rep is the bit rep%64 of the word rep/64
+ * \param    void
  * \return   \e int
  */
-inline bool Node::isOccupied( int rep ) const
+inline int Node::get_number_of_state_words( void ) const
 {
-  assert(rep >= 0);
-  assert(rep < _parameters->get_repetitions());
-  return (bool)_current_state[rep];
+  return _state_words;
+}
+
+/**
+ * \brief    Get a word of the current state bitset
+ * \details  Bits above the number of repetitions are always 0
+ * \param    int word
+ * \return   \e uint64_t
+ */
+inline uint64_t Node::get_state_word( int word ) const
+{
+  assert(word >= 0);
+  assert(word < _state_words);
+  return _current_state[word];
 }
 
 /**
@@ -536,6 +546,94 @@ inline double Node::get_var_last_invasion_age( void ) const
   return _var_last_invasion_age;
 }
 
+/**
+ * \brief    Get the sum of the numbers of introductions over the repetitions
+ * \details  Computed at the last update of the node state
+ * \param    void
+ * \return   \e double
+ */
+inline double Node::get_sum_nb_introductions( void ) const
+{
+  return _sum_nb_introductions;
+}
+
+/**
+ * \brief    Get the sum of the squared numbers of introductions over the repetitions
+ * \details  --
+ * \param    void
+ * \return   \e double
+ */
+inline double Node::get_sum_squared_nb_introductions( void ) const
+{
+  return _sum_squared_nb_introductions;
+}
+
+/**
+ * \brief    Get the number of repetitions with a first invasion age
+ * \details  --
+ * \param    void
+ * \return   \e double
+ */
+inline double Node::get_nb_first_invasions( void ) const
+{
+  return _nb_first_invasions;
+}
+
+/**
+ * \brief    Get the sum of the ages of the first invasion
+ * \details  --
+ * \param    void
+ * \return   \e double
+ */
+inline double Node::get_sum_first_invasion_age( void ) const
+{
+  return _sum_first_invasion_age;
+}
+
+/**
+ * \brief    Get the sum of the squared ages of the first invasion
+ * \details  --
+ * \param    void
+ * \return   \e double
+ */
+inline double Node::get_sum_squared_first_invasion_age( void ) const
+{
+  return _sum_squared_first_invasion_age;
+}
+
+/**
+ * \brief    Get the number of repetitions with a last invasion age
+ * \details  --
+ * \param    void
+ * \return   \e double
+ */
+inline double Node::get_nb_last_invasions( void ) const
+{
+  return _nb_last_invasions;
+}
+
+/**
+ * \brief    Get the sum of the ages of the last invasion
+ * \details  --
+ * \param    void
+ * \return   \e double
+ */
+inline double Node::get_sum_last_invasion_age( void ) const
+{
+  return _sum_last_invasion_age;
+}
+
+/**
+ * \brief    Get the sum of the squared ages of the last invasion
+ * \details  --
+ * \param    void
+ * \return   \e double
+ */
+inline double Node::get_sum_squared_last_invasion_age( void ) const
+{
+  return _sum_squared_last_invasion_age;
+}
+
 /*--------------------------------------- SCORES */
 
 /**
@@ -626,6 +724,20 @@ inline double Node::get_score( void ) const
   return _score;
 }
 
+/**
+ * \brief    Get the lowest score the node can still reach
+ * \details  Occupied repetitions never become empty again, so the final score
+ *           of the node is at least the lowest score over the numbers of
+ *           occupied repetitions not smaller than the current one
+ * \param    void
+ * \return   \e double
+ */
+inline double Node::get_score_bound( void ) const
+{
+  assert(_score_bounds != NULL);
+  return _score_bounds[(int)_y_sim];
+}
+
 
 /*----------------------------
  * SETTERS
@@ -665,18 +777,15 @@ inline void Node::set_map_data( double x, double y, double node_area, double sui
 /*--------------------------------------- NETWORK */
 
 /**
- * \brief    Add a neighbor to the neighbors list
- * \details  --
- * \param    double weight
- * \param    Node* node
+ * \brief    Set the sum of edge weights
+ * \details  The edges themselves are stored in the graph
+ * \param    double weights_sum
  * \return   \e void
  */
-inline void Node::add_neighbor( double weight, Node* node )
+inline void Node::set_weights_sum( double weights_sum )
 {
-  assert(weight >= 0.0);
-  _weights.push_back(weight);
-  _neighbors.push_back(node);
-  _weights_sum += weight;
+  assert(weights_sum >= 0.0);
+  _weights_sum = weights_sum;
 }
 
 /**
@@ -717,28 +826,6 @@ inline void Node::set_sample_data( double y_obs, double n_obs )
 
 /*--------------------------------------- SIMULATION VARIABLES */
 
-/**
- * \brief    Tag the node
- * \details  --
- * \param    void
- * \return   \e void
- */
-inline void Node::tag( void )
-{
-  _tagged = true;
-}
-
-/**
- * \brief    Untag the node
- * \details  --
- * \param    void
- * \return   \e void
- */
-inline void Node::untag( void )
-{
-  _tagged = false;
-}
-
 /**
  * \brief    Add an introduction at repetition rep
  * \details  --
@@ -749,7 +836,7 @@ inline void Node::add_introduction( int rep )
 {
   assert(rep >= 0);
   assert(rep < _parameters->get_repetitions());
-  _next_state[rep]         = 1;
+  _next_state[rep/64]     |= (uint64_t)1 << (rep%64);
   _nb_introductions[rep]  += 1.0;
   _total_nb_introductions += 1.0;
 }
@@ -763,20 +850,20 @@ inline void Node::add_introduction( int rep )
 inline void Node::set_as_introduction_node( void )
 {
   _y_sim = 0.0;
+  for (int word = 0; word < _state_words; word++)
+  {
+    _current_state[word] = 0;
+    _next_state[word]    = 0;
+  }
   for (int rep = 0; rep < _parameters->get_repetitions(); rep++)
   {
     if (_prng->uniform() < _parameters->get_p_introduction())
     {
-      _current_state[rep]     = 1;
-      _next_state[rep]        = 1;
+      _current_state[rep/64] |= (uint64_t)1 << (rep%64);
+      _next_state[rep/64]    |= (uint64_t)1 << (rep%64);
       _nb_introductions[rep] += 1.0;
       _y_sim                 += 1.0;
     }
-    else
-    {
-      _current_state[rep] = 0;
-      _next_state[rep]    = 0;
-    }
   }
   _p_sim = _y_sim/_n_sim;
 }
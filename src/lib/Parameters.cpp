@@ -20,9 +20,10 @@ Parameters::Parameters( void )
 
   /*------------------------------------------------------------------ Input data filenames */
 
-  _map_filename     = "";
-  _network_filename = "";
-  _sample_filename  = "";
+  _map_filename       = "";
+  _network_filename   = "";
+  _sample_filename    = "";
+  _landscape_filename = "";
 
   /*------------------------------------------------------------------ Main parameters */
 
@@ -55,9 +56,30 @@ Parameters::Parameters( void )
 
   /*------------------------------------------------------------------ Extra statistics */
 
-  _save_outputs    = false;
-  _save_all_states = false;
+  _save_outputs                = false;
+  _save_all_states             = false;
+  _binary_states               = false;
+  _invasion_distance_bin_width = 0.0;
 
+  /*------------------------------------------------------------------ Lineage tree */
+
+  _lineage_output      = LINEAGE_TEXT;
+  _lineage_repetitions = 0;
+  _lineage_bin_width   = 1000.0;
+
+  /*------------------------------------------------------------------ Parallel computing */
+
+  _threads = 1;
+
+  /*------------------------------------------------------------------ Early stopping */
+
+  _score_cutoff     = 0.0;
+  _use_score_cutoff = false;
+
+  /*------------------------------------------------------------------ Shards of repetitions */
+
+  _shard  = 0;
+  _shards = 1;
 }
 
 /*----------------------------
@@ -122,7 +144,13 @@ void Parameters::write_parameters( std::string filename )
   file << "w6" << " ";
   file << "wmin" << " ";
   file << "save-outputs" << " ";
-  file << "save-all-states" << "\n";
+  file << "save-all-states" << " ";
+  file << "binary-states" << " ";
+  file << "invasion-dist-bin" << " ";
+  file << "lineage" << " ";
+  file << "lineage-reps" << " ";
+  file << "lineage-bin" << " ";
+  file << "threads" << "\n";
 
   /*~~~~~~~~~~~~~~~~~*/
   /* 3) Write data   */
@@ -192,7 +220,24 @@ void Parameters::write_parameters( std::string filename )
   file << _w6 << " ";
   file << _wmin << " ";
   file << _save_outputs << " ";
-  file << _save_all_states << "\n";
+  file << _save_all_states << " ";
+  file << _binary_states << " ";
+  file << _invasion_distance_bin_width << " ";
+  if (_lineage_output == LINEAGE_TEXT)
+  {
+    file << "TEXT" << " ";
+  }
+  else if (_lineage_output == LINEAGE_BINARY)
+  {
+    file << "BINARY" << " ";
+  }
+  else if (_lineage_output == LINEAGE_SUMMARY)
+  {
+    file << "SUMMARY" << " ";
+  }
+  file << _lineage_repetitions << " ";
+  file << _lineage_bin_width << " ";
+  file << _threads << "\n";
 
   /*---------------*/
   /* 4) Close file */
@@ -44,6 +44,8 @@ public:
   inline std::string get_map_filename( void ) const;
   inline std::string get_network_filename( void ) const;
   inline std::string get_sample_filename( void ) const;
+  inline std::string get_landscape_filename( void ) const;
+  inline bool        useLandscapeFile( void ) const;
 
   /*------------------------------------------------------------------ Main parameters */
 
@@ -76,10 +78,42 @@ public:
 
   /*------------------------------------------------------------------ Extra statistics */
 
-  inline bool get_save_outputs( void ) const;
-  inline bool saveOutputs( void ) const;
-  inline bool get_save_all_states( void ) const;
-  inline bool saveAllStates( void ) const;
+  inline bool   get_save_outputs( void ) const;
+  inline bool   saveOutputs( void ) const;
+  inline bool   get_save_all_states( void ) const;
+  inline bool   saveAllStates( void ) const;
+  inline bool   get_binary_states( void ) const;
+  inline bool   saveBinaryStates( void ) const;
+  inline double get_invasion_distance_bin_width( void ) const;
+  inline bool   saveInvasionDistances( void ) const;
+
+  /*------------------------------------------------------------------ Lineage tree */
+
+  inline lineage_output get_lineage_output( void ) const;
+  inline int            get_lineage_repetitions( void ) const;
+  inline double         get_lineage_bin_width( void ) const;
+  inline bool           isRecordedInLineage( int rep ) const;
+
+  /*------------------------------------------------------------------ Parallel computing */
+
+  inline int get_threads( void ) const;
+
+  /*------------------------------------------------------------------ Early stopping */
+
+  inline double get_score_cutoff( void ) const;
+  inline bool   useScoreCutoff( void ) const;
+
+  /*------------------------------------------------------------------ Score horizons */
+
+  inline std::vector<int>* get_score_iterations( void );
+
+  /*------------------------------------------------------------------ Shards of repetitions */
+
+  inline int  get_shard( void ) const;
+  inline int  get_shards( void ) const;
+  inline bool isSharded( void ) const;
+  inline int  get_first_repetition( void ) const;
+  inline int  get_last_repetition( void ) const;
 
   /*----------------------------
    * SETTERS
@@ -95,6 +129,7 @@ public:
   inline void set_map_filename( std::string filename );
   inline void set_network_filename( std::string filename );
   inline void set_sample_filename( std::string filename );
+  inline void set_landscape_filename( std::string filename );
 
   /*------------------------------------------------------------------ Main parameters */
 
@@ -129,6 +164,30 @@ public:
 
   inline void set_save_outputs( bool save_outputs );
   inline void set_save_all_states( bool save_all_states );
+  inline void set_binary_states( bool binary_states );
+  inline void set_invasion_distance_bin_width( double bin_width );
+
+  /*------------------------------------------------------------------ Lineage tree */
+
+  inline void set_lineage_output( lineage_output output );
+  inline void set_lineage_repetitions( int repetitions );
+  inline void set_lineage_bin_width( double bin_width );
+
+  /*------------------------------------------------------------------ Parallel computing */
+
+  inline void set_threads( int threads );
+
+  /*------------------------------------------------------------------ Early stopping */
+
+  inline void set_score_cutoff( double score_cutoff );
+
+  /*------------------------------------------------------------------ Score horizons */
+
+  inline void add_score_iteration( int iteration );
+
+  /*------------------------------------------------------------------ Shards of repetitions */
+
+  inline void set_shard( int shard, int shards );
 
   /*----------------------------
    * PUBLIC METHODS
@@ -156,9 +215,10 @@ protected:
 
   /*------------------------------------------------------------------ Data filenames */
 
-  std::string _map_filename;     /*!< Map filename     */
-  std::string _network_filename; /*!< Network filename */
-  std::string _sample_filename;  /*!< Sample filename  */
+  std::string _map_filename;       /*!< Map filename                        */
+  std::string _network_filename;   /*!< Network filename                    */
+  std::string _sample_filename;    /*!< Sample filename                     */
+  std::string _landscape_filename; /*!< Binary landscape filename (or "") */
 
   /*------------------------------------------------------------------ Main parameters */
 
@@ -192,8 +252,34 @@ protected:
 
   /*------------------------------------------------------------------ Extra statistics */
 
-  bool _save_outputs;    /*!< Save simulation outputs    */
-  bool _save_all_states; /*!< Save all simulation states */
+  bool   _save_outputs;                /*!< Save simulation outputs                                   */
+  bool   _save_all_states;             /*!< Save all simulation states                                */
+  bool   _binary_states;               /*!< Save the states in binary                                 */
+  double _invasion_distance_bin_width; /*!< Bin width of the invasion distance histograms (0 for none) */
+
+  /*------------------------------------------------------------------ Lineage tree */
+
+  lineage_output _lineage_output;      /*!< Lineage tree output (text, binary records or summary) */
+  int            _lineage_repetitions; /*!< Number of repetitions recorded (0 for all)            */
+  double         _lineage_bin_width;   /*!< Bin width of the dispersal kernel histograms          */
+
+  /*------------------------------------------------------------------ Parallel computing */
+
+  int _threads; /*!< Number of threads sharing the repetitions */
+
+  /*------------------------------------------------------------------ Early stopping */
+
+  double _score_cutoff;     /*!< Score above which the simulation is stopped */
+  bool   _use_score_cutoff; /*!< Stop the simulation above the score cutoff  */
+
+  /*------------------------------------------------------------------ Score horizons */
+
+  std::vector<int> _score_iterations; /*!< Iterations at which the score is computed */
+
+  /*------------------------------------------------------------------ Shards of repetitions */
+
+  int _shard;  /*!< Index of the simulated shard of repetitions */
+  int _shards; /*!< Number of shards of repetitions             */
 
 };
 
@@ -261,6 +347,28 @@ inline std::string Parameters::get_sample_filename( void ) const
   return _sample_filename;
 }
 
+/**
+ * \brief    Get the binary landscape filename
+ * \details  --
+ * \param    void
+ * \return   \e std::string
+ */
+inline std::string Parameters::get_landscape_filename( void ) const
+{
+  return _landscape_filename;
+}
+
+/**
+ * \brief    Check if the landscape is loaded from a binary file
+ * \details  --
+ * \param    void
+ * \return   \e bool
+ */
+inline bool Parameters::useLandscapeFile( void ) const
+{
+  return !_landscape_filename.empty();
+}
+
 /*------------------------------------------------------------------ Main parameters */
 
 /**
@@ -533,6 +641,208 @@ inline bool Parameters::saveAllStates( void ) const
   return _save_all_states;
 }
 
+/**
+ * \brief    Get save simulation states in binary
+ * \details  --
+ * \param    void
+ * \return   \e bool
+ */
+inline bool Parameters::get_binary_states( void ) const
+{
+  return _binary_states;
+}
+
+/**
+ * \brief    Save simulation states in binary?
+ * \details  States are then saved in output/states.bin instead of
+ *           output/state_<iteration>.txt
+ * \param    void
+ * \return   \e bool
+ */
+inline bool Parameters::saveBinaryStates( void ) const
+{
+  return _binary_states;
+}
+
+/**
+ * \brief    Get the bin width of the invasion distance histograms
+ * \details  0 when the histograms are not saved
+ * \param    void
+ * \return   \e double
+ */
+inline double Parameters::get_invasion_distance_bin_width( void ) const
+{
+  return _invasion_distance_bin_width;
+}
+
+/**
+ * \brief    Save the invasion distance histograms?
+ * \details  Histograms of the euclidean distances between the observed or
+ *           simulated invaded nodes, in output/observed_euclidean_distribution.txt
+ *           and output/simulated_euclidean_distribution.txt
+ * \param    void
+ * \return   \e bool
+ */
+inline bool Parameters::saveInvasionDistances( void ) const
+{
+  return (_invasion_distance_bin_width > 0.0);
+}
+
+/*------------------------------------------------------------------ Lineage tree */
+
+/**
+ * \brief    Get the lineage tree output
+ * \details  --
+ * \param    void
+ * \return   \e lineage_output
+ */
+inline lineage_output Parameters::get_lineage_output( void ) const
+{
+  return _lineage_output;
+}
+
+/**
+ * \brief    Get the number of repetitions recorded in the lineage tree
+ * \details  0 if all the repetitions are recorded
+ * \param    void
+ * \return   \e int
+ */
+inline int Parameters::get_lineage_repetitions( void ) const
+{
+  return _lineage_repetitions;
+}
+
+/**
+ * \brief    Get the bin width of the dispersal kernel histograms
+ * \details  --
+ * \param    void
+ * \return   \e double
+ */
+inline double Parameters::get_lineage_bin_width( void ) const
+{
+  return _lineage_bin_width;
+}
+
+/**
+ * \brief    Is a repetition recorded in the lineage tree?
+ * \details  Only the first repetitions are recorded when the number of
+ *           recorded repetitions is set (repetitions are numbered from 0)
+ * \param    int rep
+ * \return   \e bool
+ */
+inline bool Parameters::isRecordedInLineage( int rep ) const
+{
+  return (_lineage_repetitions == 0 || rep < _lineage_repetitions);
+}
+
+/*------------------------------------------------------------------ Parallel computing */
+
+/**
+ * \brief    Get the number of threads
+ * \details  --
+ * \param    void
+ * \return   \e int
+ */
+inline int Parameters::get_threads( void ) const
+{
+  return _threads;
+}
+
+/*------------------------------------------------------------------ Early stopping */
+
+/**
+ * \brief    Get the score cutoff
+ * \details  --
+ * \param    void
+ * \return   \e double
+ */
+inline double Parameters::get_score_cutoff( void ) const
+{
+  return _score_cutoff;
+}
+
+/**
+ * \brief    Check if the simulation stops above the score cutoff
+ * \details  --
+ * \param    void
+ * \return   \e bool
+ */
+inline bool Parameters::useScoreCutoff( void ) const
+{
+  return _use_score_cutoff;
+}
+
+/*------------------------------------------------------------------ Score horizons */
+
+/**
+ * \brief    Get the iterations at which the score is computed
+ * \details  Iterations are in increasing order. If the list is empty, the
+ *           score is only computed at the last iteration
+ * \param    void
+ * \return   \e std::vector<int>*
+ */
+inline std::vector<int>* Parameters::get_score_iterations( void )
+{
+  return &_score_iterations;
+}
+
+/*------------------------------------------------------------------ Shards of repetitions */
+
+/**
+ * \brief    Get the index of the simulated shard of repetitions
+ * \details  --
+ * \param    void
+ * \return   \e int
+ */
+inline int Parameters::get_shard( void ) const
+{
+  return _shard;
+}
+
+/**
+ * \brief    Get the number of shards of repetitions
+ * \details  --
+ * \param    void
+ * \return   \e int
+ */
+inline int Parameters::get_shards( void ) const
+{
+  return _shards;
+}
+
+/**
+ * \brief    Check if only a shard of the repetitions is simulated
+ * \details  --
+ * \param    void
+ * \return   \e bool
+ */
+inline bool Parameters::isSharded( void ) const
+{
+  return _shards > 1;
+}
+
+/**
+ * \brief    Get the first repetition of the simulated shard
+ * \details  Shards are split as the blocks of repetitions of the threads
+ * \param    void
+ * \return   \e int
+ */
+inline int Parameters::get_first_repetition( void ) const
+{
+  return (int)((long)_repetitions*_shard/_shards);
+}
+
+/**
+ * \brief    Get the end of the simulated shard (excluded)
+ * \details  --
+ * \param    void
+ * \return   \e int
+ */
+inline int Parameters::get_last_repetition( void ) const
+{
+  return (int)((long)_repetitions*(_shard+1)/_shards);
+}
+
 /*----------------------------
  * SETTERS
  *----------------------------*/
@@ -586,6 +896,17 @@ inline void Parameters::set_sample_filename( std::string filename )
   _sample_filename = std::string(filename);
 }
 
+/**
+ * \brief    Set binary landscape filename
+ * \details  --
+ * \param    std::string filename
+ * \return   \e void
+ */
+inline void Parameters::set_landscape_filename( std::string filename )
+{
+  _landscape_filename = std::string(filename);
+}
+
 /*------------------------------------------------------------------ Main parameters */
 
 /**
@@ -858,5 +1179,127 @@ inline void Parameters::set_save_all_states( bool save_all_states )
   _save_all_states = save_all_states;
 }
 
+/**
+ * \brief    Set save simulation states in binary
+ * \details  --
+ * \param    bool binary_states
+ * \return   \e void
+ */
+inline void Parameters::set_binary_states( bool binary_states )
+{
+  _binary_states = binary_states;
+}
+
+/**
+ * \brief    Set the bin width of the invasion distance histograms
+ * \details  --
+ * \param    double bin_width
+ * \return   \e void
+ */
+inline void Parameters::set_invasion_distance_bin_width( double bin_width )
+{
+  assert(bin_width > 0.0);
+  _invasion_distance_bin_width = bin_width;
+}
+
+/*------------------------------------------------------------------ Lineage tree */
+
+/**
+ * \brief    Set the lineage tree output
+ * \details  --
+ * \param    lineage_output output
+ * \return   \e void
+ */
+inline void Parameters::set_lineage_output( lineage_output output )
+{
+  _lineage_output = output;
+}
+
+/**
+ * \brief    Set the number of repetitions recorded in the lineage tree
+ * \details  0 to record all the repetitions
+ * \param    int repetitions
+ * \return   \e void
+ */
+inline void Parameters::set_lineage_repetitions( int repetitions )
+{
+  assert(repetitions >= 0);
+  _lineage_repetitions = repetitions;
+}
+
+/**
+ * \brief    Set the bin width of the dispersal kernel histograms
+ * \details  --
+ * \param    double bin_width
+ * \return   \e void
+ */
+inline void Parameters::set_lineage_bin_width( double bin_width )
+{
+  assert(bin_width > 0.0);
+  _lineage_bin_width = bin_width;
+}
+
+/*------------------------------------------------------------------ Parallel computing */
+
+/**
+ * \brief    Set the number of threads
+ * \details  --
+ * \param    int threads
+ * \return   \e void
+ */
+inline void Parameters::set_threads( int threads )
+{
+  assert(threads > 0);
+  _threads = threads;
+}
+
+/*------------------------------------------------------------------ Early stopping */
+
+/**
+ * \brief    Set the score cutoff
+ * \details  The simulation is stopped as soon as a lower bound of the final
+ *           score exceeds the cutoff
+ * \param    double score_cutoff
+ * \return   \e void
+ */
+inline void Parameters::set_score_cutoff( double score_cutoff )
+{
+  _score_cutoff     = score_cutoff;
+  _use_score_cutoff = true;
+}
+
+/*------------------------------------------------------------------ Score horizons */
+
+/**
+ * \brief    Add an iteration at which the score is computed
+ * \details  Iterations must be added in increasing order
+ * \param    int iteration
+ * \return   \e void
+ */
+inline void Parameters::add_score_iteration( int iteration )
+{
+  assert(iteration >= 0);
+  assert(_score_iterations.empty() || iteration > _score_iterations.back());
+  _score_iterations.push_back(iteration);
+}
+
+/*------------------------------------------------------------------ Shards of repetitions */
+
+/**
+ * \brief    Set the simulated shard of repetitions
+ * \details  --
+ * \param    int shard
+ * \param    int shards
+ * \return   \e void
+ */
+inline void Parameters::set_shard( int shard, int shards )
+{
+  assert(shards > 0);
+  assert(shard >= 0);
+  assert(shard < shards);
+  _shard  = shard;
+  _shards = shards;
+}
+
 
 #endif /* defined(__HMD_model__Parameters__) */
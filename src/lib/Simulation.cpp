@@ -9,28 +9,76 @@
  * \brief    Constructor
  * \details  --
  * \param    Parameters* parameters
+ * \param    Landscape* landscape
  * \return   \e void
  */
-Simulation::Simulation( Parameters* parameters )
+Simulation::Simulation( Parameters* parameters, Landscape* landscape )
 {
   assert(parameters != NULL);
+  assert(landscape != NULL);
 
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
   /* 1) Initialize the simulation  */
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
   _parameters = parameters;
   _prng       = parameters->get_prng();
-  _graph      = new Graph(_parameters);
+  _graph      = new Graph(_parameters, landscape);
   _iteration  = 0;
 
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  /* 2) Save lineage tree if asked */
+  /* 2) Initialize the threads     */
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  if (_parameters->saveOutputs())
+  _threads = std::min(_parameters->get_threads(), _parameters->get_repetitions());
+  _thread_prngs.clear();
+  if (_parameters->isSharded())
+  {
+    /*** A shard runs the block of its thread in a run with one thread by shard ***/
+    unsigned long int seed = 0;
+    for (int shard = 0; shard <= _parameters->get_shard(); shard++)
+    {
+      seed = (unsigned long int)_prng->uniform(1, 100000000);
+    }
+    _threads = 1;
+    _thread_prngs.push_back(new Prng(seed));
+  }
+  else if (_threads == 1)
+  {
+    /*** A single thread keeps the main prng stream ***/
+    _thread_prngs.push_back(_prng);
+  }
+  else
+  {
+    /*** Else each thread gets its own stream, seeded from the main prng ***/
+    for (int thread = 0; thread < _threads; thread++)
+    {
+      _thread_prngs.push_back(new Prng((unsigned long int)_prng->uniform(1, 100000000)));
+    }
+  }
+  _intro_nodes.assign(_threads, std::vector<int>());
+  _intro_reps.assign(_threads, std::vector<int>());
+  _lineage_buffers.assign(_threads, std::vector<lineage_record>());
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 3) Save lineage tree if asked */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  if (_parameters->saveOutputs() && _parameters->get_lineage_output() != LINEAGE_SUMMARY)
+  {
+    /*** The file stays open, with a large write buffer ***/
+    _lineage_file_buffer.assign(1<<20, 0);
+    _lineage_file.rdbuf()->pubsetbuf(_lineage_file_buffer.data(), _lineage_file_buffer.size());
+  }
+  if (_parameters->saveOutputs() && _parameters->get_lineage_output() == LINEAGE_TEXT)
+  {
+    _lineage_file.open("output/lineage_tree.txt", std::ios::out | std::ios::trunc);
+    _lineage_file << "repetition start_node end_node geodesic_dist euclidean_dist iteration\n";
+  }
+  else if (_parameters->saveOutputs() && _parameters->get_lineage_output() == LINEAGE_BINARY)
   {
-    std::ofstream tree_file("output/lineage_tree.txt", std::ios::out | std::ios::trunc);
-    tree_file << "repetition start_node end_node geodesic_dist euclidean_dist iteration\n";
-    tree_file.close();
+    char    magic[8]  = {'H', 'M', 'D', 'L', 'I', 'N', 'E', 'A'};
+    int32_t header[2] = {1, (int32_t)sizeof(lineage_record)};
+    _lineage_file.open("output/lineage_tree.bin", std::ios::out | std::ios::trunc | std::ios::binary);
+    _lineage_file.write(magic, sizeof(magic));
+    _lineage_file.write((const char*)header, sizeof(header));
   }
 }
 
@@ -46,8 +94,21 @@ Simulation::Simulation( Parameters* parameters )
  */
 Simulation::~Simulation( void )
 {
+  if (_lineage_file.is_open())
+  {
+    _lineage_file.close();
+  }
   delete _graph;
   _graph = NULL;
+  for (int thread = 0; thread < _threads; thread++)
+  {
+    if (_thread_prngs[thread] != _prng)
+    {
+      delete _thread_prngs[thread];
+      _thread_prngs[thread] = NULL;
+    }
+  }
+  _thread_prngs.clear();
 }
 
 /**----------------------------
@@ -56,92 +117,60 @@ Simulation::~Simulation( void )
 
 /**
  * \brief    Compute the next iteration
- * \details  --
+ * \details  Repetitions are split in contiguous blocks, one by thread. Each
+ *           thread buffers its introductions, which are applied in thread
+ *           order once all the threads are done
  * \param    void
  * \return   \e void
  */
 void Simulation::compute_next_iteration( void )
 {
-  std::ofstream tree_file;
-  if (_parameters->saveOutputs())
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 1) Run the jumps of each block of repetitions     */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  int repetitions = _parameters->get_repetitions();
+  if (_parameters->isSharded())
+  {
+    compute_repetitions(0, _parameters->get_first_repetition(), _parameters->get_last_repetition());
+  }
+  else if (_threads == 1)
   {
-    tree_file.open("output/lineage_tree.txt", std::ios::out | std::ios::app);
+    compute_repetitions(0, 0, repetitions);
+  }
+  else
+  {
+    std::vector<std::thread> workers;
+    for (int thread = 0; thread < _threads; thread++)
+    {
+      int first_rep = (int)((long)repetitions*thread/_threads);
+      int last_rep  = (int)((long)repetitions*(thread+1)/_threads);
+      workers.push_back(std::thread(&Simulation::compute_repetitions, this, thread, first_rep, last_rep));
+    }
+    for (size_t i = 0; i < workers.size(); i++)
+    {
+      workers[i].join();
+    }
   }
-  std::vector<Node*> tagged_nodes;
-  tagged_nodes.reserve(sizeof(Node*)*_graph->get_number_of_nodes());
 
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  /* 1) For each node of the graph and each repetition */
+  /* 2) Merge the introductions and the lineage tree   */
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  Node* start_node = _graph->get_first();
-  while (start_node != NULL)
+  for (int thread = 0; thread < _threads; thread++)
   {
-    /*-----------------------------------------------*/
-    /* 1.1) For each repetition, run the jump module */
-    /*-----------------------------------------------*/
-    for (int rep = 0; rep < _parameters->get_repetitions(); rep++)
+    for (size_t i = 0; i < _intro_nodes[thread].size(); i++)
     {
-      if (start_node->isOccupied(rep))
-      {
-        int number_of_jumps = draw_number_of_jumps(start_node->get_human_activity_index());
-        for (int jump = 0; jump < number_of_jumps; jump++)
-        {
-          Node*  current_node     = start_node;
-          int    current_id       = current_node->get_identifier();
-          double distance         = draw_jump_size();
-          double current_distance = 0.0;
-          while (current_distance < distance)
-          {
-            current_node->tag();
-            tagged_nodes.push_back(current_node);
-            current_node = current_node->jump();
-            /*** If the current node is out of the map, stop walking ***/
-            if (current_node == NULL)
-            {
-              break;
-            }
-            /*** If the current node is self, stop walking ***/
-            else if (current_node->get_identifier() == current_id)
-            {
-              break;
-            }
-            /*** Else increment the distance ***/
-            else
-            {
-              current_distance += 1.0;
-            }
-          }
-          if (current_node != NULL)
-          {
-            current_node->add_introduction(rep);
-            current_node->update_invasion_age((double)_iteration, rep);
-            if (_parameters->saveOutputs())
-            {
-              double euclidean_dist = compute_euclidean_distance(start_node, current_node);
-              tree_file << rep+1 << " " << start_node->get_identifier() << " " << current_node->get_identifier() << " " << current_distance << " " << euclidean_dist << " " << _iteration << "\n";
-            }
-          }
-          for (size_t i = 0; i < tagged_nodes.size(); i++)
-          {
-            tagged_nodes[i]->untag();
-          }
-          tagged_nodes.clear();
-        }
-      }
+      _graph->add_introduction(_intro_nodes[thread][i], _intro_reps[thread][i], (double)_iteration);
     }
-
-    /*-----------------------------------------------*/
-    /* 1.2) Go to the next cell                      */
-    /*-----------------------------------------------*/
-    start_node = _graph->get_next();
+    _intro_nodes[thread].clear();
+    _intro_reps[thread].clear();
   }
   if (_parameters->saveOutputs())
   {
-    tree_file.close();
+    write_lineage();
   }
 
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
-  /* 2) Update all the cell states                     */
+  /* 3) Update all the cell states                     */
   /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
   _graph->update_state();
   _iteration++;
@@ -158,6 +187,18 @@ void Simulation::compute_score( void )
   _graph->compute_score(false);
 }
 
+/**
+ * \brief    Compute a lower bound of the final optimization score
+ * \details  The bound only depends on the current state and holds for any
+ *           further iteration
+ * \param    void
+ * \return   \e void
+ */
+void Simulation::compute_score_bound( void )
+{
+  _graph->compute_score_bound();
+}
+
 /**
  * \brief    Write simulation state
  * \details  --
@@ -170,7 +211,29 @@ void Simulation::write_state( std::string filename )
 }
 
 /**
- * \brief    Write unique pairs of occupied nodes with euclidean distances
+ * \brief    Write the sufficient statistics of the simulation state
+ * \details  --
+ * \param    std::string filename
+ * \return   \e void
+ */
+void Simulation::write_statistics( std::string filename )
+{
+  _graph->write_statistics(filename);
+}
+
+/**
+ * \brief    Append the simulation state to the binary state file
+ * \details  --
+ * \param    std::string filename
+ * \return   \e void
+ */
+void Simulation::write_binary_state( std::string filename )
+{
+  _graph->write_binary_state(filename, _iteration);
+}
+
+/**
+ * \brief    Write the euclidean distance histograms of invaded nodes (simulated or observed)
  * \details  --
  * \param    std::string observed_filename
  * \param    std::string simulated_filename
@@ -181,35 +244,214 @@ void Simulation::write_invasion_euclidean_distributions( std::string observed_fi
   _graph->write_invasion_euclidean_distributions(observed_filename, simulated_filename);
 }
 
+/**
+ * \brief    Write the summary of the lineage tree
+ * \details  With the lineage output SUMMARY, writes the dispersal kernels
+ *           (number of jumps by bin of geodesic and euclidean distance, the
+ *           bin being given by its lower bound) and the number of jumps of each
+ *           recorded repetition at each iteration
+ * \param    std::string kernel_filename
+ * \param    std::string events_filename
+ * \return   \e void
+ */
+void Simulation::write_lineage_summary( std::string kernel_filename, std::string events_filename )
+{
+  if (_parameters->get_lineage_output() != LINEAGE_SUMMARY)
+  {
+    return;
+  }
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 1) Write the dispersal kernels          */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  std::ofstream kernel_file(kernel_filename, std::ios::out | std::ios::trunc);
+  kernel_file << "distance geodesic_count euclidean_count\n";
+  size_t number_of_bins = std::max(_geodesic_kernel.size(), _euclidean_kernel.size());
+  for (size_t bin = 0; bin < number_of_bins; bin++)
+  {
+    kernel_file << (double)bin*_parameters->get_lineage_bin_width() << " ";
+    kernel_file << (bin < _geodesic_kernel.size() ? _geodesic_kernel[bin] : 0) << " ";
+    kernel_file << (bin < _euclidean_kernel.size() ? _euclidean_kernel[bin] : 0) << "\n";
+  }
+  kernel_file.close();
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 2) Write the number of jumps            */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  int first_rep = (_parameters->isSharded() ? _parameters->get_first_repetition() : 0);
+  int last_rep  = (_parameters->isSharded() ? _parameters->get_last_repetition() : _parameters->get_repetitions());
+  std::ofstream events_file(events_filename, std::ios::out | std::ios::trunc);
+  events_file << "repetition iteration nb_events\n";
+  for (size_t iteration = 0; iteration < _lineage_events.size(); iteration++)
+  {
+    for (int rep = first_rep; rep < last_rep && _parameters->isRecordedInLineage(rep); rep++)
+    {
+      events_file << rep+1 << " " << iteration << " " << _lineage_events[iteration][rep] << "\n";
+    }
+  }
+  events_file.close();
+}
+
 /*----------------------------
  * PROTECTED METHODS
  *----------------------------*/
 
+/**
+ * \brief    Run the jumps of a block of repetitions
+ * \details  Only reads the current states; introductions and lineage tree
+ *           lines are buffered for the thread. Only the occupied nodes are
+ *           visited, and their occupied repetitions are read from the state
+ *           bitsets, in the same order as a full sweep
+ * \param    int thread
+ * \param    int first_rep
+ * \param    int last_rep
+ * \return   \e void
+ */
+void Simulation::compute_repetitions( int thread, int first_rep, int last_rep )
+{
+  std::vector<int>*  occupied_nodes = _graph->get_occupied_nodes();
+  int                first_word     = first_rep/64;
+  int                last_word      = (last_rep-1)/64;
+
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  /* 1) For each occupied node and each occupied repetition    */
+  /*~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~*/
+  for (size_t i = 0; i < occupied_nodes->size(); i++)
+  {
+    int   start_index = (*occupied_nodes)[i];
+    Node* start_node  = _graph->get_node_at(start_index);
+    for (int word = first_word; word <= last_word; word++)
+    {
+      uint64_t bits = start_node->get_state_word(word);
+      if (word == first_word)
+      {
+        bits &= ~(uint64_t)0 << (first_rep%64);
+      }
+      if (word == last_word && last_rep%64 != 0)
+      {
+        bits &= ((uint64_t)1 << (last_rep%64))-1;
+      }
+      while (bits != 0)
+      {
+        int rep  = word*64+__builtin_ctzll(bits);
+        bits    &= bits-1;
+        compute_jumps(thread, start_index, rep);
+      }
+    }
+  }
+}
+
+/**
+ * \brief    Run the jumps from an occupied node in a repetition
+ * \details  --
+ * \param    int thread
+ * \param    int start_index
+ * \param    int rep
+ * \return   \e void
+ */
+void Simulation::compute_jumps( int thread, int start_index, int rep )
+{
+  Prng* prng            = _thread_prngs[thread];
+  int   number_of_jumps = draw_number_of_jumps(prng, _graph->get_human_activity_index(start_index));
+  for (int jump = 0; jump < number_of_jumps; jump++)
+  {
+    double distance          = draw_jump_size(prng);
+    double geodesic_distance = 0.0;
+    int    end_index         = _graph->walk(start_index, distance, prng, thread, &geodesic_distance);
+    if (end_index != -1)
+    {
+      _intro_nodes[thread].push_back(end_index);
+      _intro_reps[thread].push_back(rep);
+      if (_parameters->saveOutputs() && _parameters->isRecordedInLineage(rep))
+      {
+        lineage_record record;
+        record.repetition     = rep+1;
+        record.start_node     = _graph->get_identifier(start_index);
+        record.end_node       = _graph->get_identifier(end_index);
+        record.iteration      = _iteration;
+        record.geodesic_dist  = geodesic_distance;
+        record.euclidean_dist = compute_euclidean_distance(start_index, end_index);
+        _lineage_buffers[thread].push_back(record);
+      }
+    }
+  }
+}
+
+/**
+ * \brief    Write the lineage tree records of the iteration
+ * \details  The records buffered by each thread are written in thread order,
+ *           as text lines or binary records, or added to the histograms of the
+ *           summary
+ * \param    void
+ * \return   \e void
+ */
+void Simulation::write_lineage( void )
+{
+  lineage_output output = _parameters->get_lineage_output();
+  if (output == LINEAGE_SUMMARY)
+  {
+    _lineage_events.push_back(std::vector<int>(_parameters->get_repetitions(), 0));
+  }
+  for (int thread = 0; thread < _threads; thread++)
+  {
+    std::vector<lineage_record>& records = _lineage_buffers[thread];
+    if (output == LINEAGE_TEXT)
+    {
+      for (size_t i = 0; i < records.size(); i++)
+      {
+        _lineage_file << records[i].repetition << " " << records[i].start_node << " " << records[i].end_node << " " << records[i].geodesic_dist << " " << records[i].euclidean_dist << " " << records[i].iteration << "\n";
+      }
+    }
+    else if (output == LINEAGE_BINARY && !records.empty())
+    {
+      _lineage_file.write((const char*)records.data(), records.size()*sizeof(lineage_record));
+    }
+    else if (output == LINEAGE_SUMMARY)
+    {
+      for (size_t i = 0; i < records.size(); i++)
+      {
+        size_t geodesic_bin  = (size_t)floor(records[i].geodesic_dist/_parameters->get_lineage_bin_width());
+        size_t euclidean_bin = (size_t)floor(records[i].euclidean_dist/_parameters->get_lineage_bin_width());
+        if (geodesic_bin >= _geodesic_kernel.size())
+        {
+          _geodesic_kernel.resize(geodesic_bin+1, 0);
+        }
+        if (euclidean_bin >= _euclidean_kernel.size())
+        {
+          _euclidean_kernel.resize(euclidean_bin+1, 0);
+        }
+        _geodesic_kernel[geodesic_bin]++;
+        _euclidean_kernel[euclidean_bin]++;
+        _lineage_events.back()[records[i].repetition-1]++;
+      }
+    }
+    records.clear();
+  }
+}
+
 /**
  * \brief    Draw the number of jumps
  * \details  --
+ * \param    Prng* prng
  * \param    double human_activity_index
  * \return   \e int
  */
-int Simulation::draw_number_of_jumps( double human_activity_index )
+int Simulation::draw_number_of_jumps( Prng* prng, double human_activity_index )
 {
   /* Nb effective jumps = sampling_probability ([0,1]) * Poisson(Lambda*Human_activity_index).
    Human_activity_index = normalized population density ([0,1]).
    */
   assert(human_activity_index >= 0.0);
   assert(human_activity_index <= 1.0);
-  return _prng->poisson(human_activity_index*_parameters->get_lambda());
+  return prng->poisson(human_activity_index*_parameters->get_lambda());
 }
 
 /**
  * \brief    Draw the jump size
  * \details  --
- * \param    void
+ * \param    Prng* prng
  * \return   \e double
  */
-double Simulation::draw_jump_size( void )
+double Simulation::draw_jump_size( Prng* prng )
 {
-  Prng*                 prng     = _parameters->get_prng();
   double                mu       = _parameters->get_mu();
   double                sigma    = _parameters->get_sigma();
   double                gamma    = _parameters->get_gamma();
@@ -237,15 +479,15 @@ double Simulation::draw_jump_size( void )
 /**
  * \brief    Compute the euclidean distance between two nodes
  * \details  --
- * \param    Node* node1
- * \param    Node* node2
+ * \param    int index1
+ * \param    int index2
  * \return   \e void
  */
-double Simulation::compute_euclidean_distance( Node* node1, Node* node2 )
+double Simulation::compute_euclidean_distance( int index1, int index2 )
 {
-  double x1 = node1->get_x();
-  double y1 = node1->get_y();
-  double x2 = node2->get_x();
-  double y2 = node2->get_y();
+  double x1 = _graph->get_x(index1);
+  double y1 = _graph->get_y(index1);
+  double x2 = _graph->get_x(index2);
+  double y2 = _graph->get_y(index2);
   return sqrt((x2-x1)*(x2-x1) + (y2-y1)*(y2-y1));
 }
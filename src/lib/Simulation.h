@@ -2,7 +2,12 @@
 #define __HMD_model__Simulation__
 
 #include <iostream>
+#include <fstream>
+#include <sstream>
+#include <string>
 #include <vector>
+#include <thread>
+#include <algorithm>
 #include <map>
 #include <cmath>
 #include <cstring>
@@ -12,10 +17,27 @@
 #include "Enums.h"
 #include "Prng.h"
 #include "Parameters.h"
+#include "Landscape.h"
 #include "Node.h"
 #include "Graph.h"
 
 
+/**
+ * \brief   Lineage tree record
+ * \details One successful jump, with the layout of the binary lineage tree
+ *          file (see scripts/lineage.py)
+ */
+struct lineage_record
+{
+  int32_t repetition;     /*!< Repetition (from 1)               */
+  int32_t start_node;     /*!< Identifier of the start node      */
+  int32_t end_node;       /*!< Identifier of the end node        */
+  int32_t iteration;      /*!< Iteration of the jump             */
+  double  geodesic_dist;  /*!< Distance walked on the network    */
+  double  euclidean_dist; /*!< Distance between start and end    */
+};
+
+
 class Simulation
 {
 
@@ -25,7 +47,7 @@ public:
    * CONSTRUCTORS
    *----------------------------*/
   Simulation( void ) = delete;
-  Simulation( Parameters* parameters );
+  Simulation( Parameters* parameters, Landscape* landscape );
   Simulation( const Simulation& sim ) = delete;
 
   /*----------------------------
@@ -42,6 +64,7 @@ public:
   inline double get_total_log_maximum_likelihood( void ) const;
   inline double get_empty_score( void ) const;
   inline double get_score( void ) const;
+  inline double get_score_bound( void ) const;
 
   /*----------------------------
    * SETTERS
@@ -53,8 +76,12 @@ public:
    *----------------------------*/
   void compute_next_iteration( void );
   void compute_score( void );
+  void compute_score_bound( void );
   void write_state( std::string filename );
+  void write_statistics( std::string filename );
+  void write_binary_state( std::string filename );
   void write_invasion_euclidean_distributions( std::string observed_filename, std::string simulated_filename );
+  void write_lineage_summary( std::string kernel_filename, std::string events_filename );
 
   /*----------------------------
    * PUBLIC ATTRIBUTES
@@ -65,9 +92,12 @@ protected:
   /*----------------------------
    * PROTECTED METHODS
    *----------------------------*/
-  int    draw_number_of_jumps( double human_activity_index );
-  double draw_jump_size( void );
-  double compute_euclidean_distance( Node* node1, Node* node2 );
+  void   compute_repetitions( int thread, int first_rep, int last_rep );
+  void   compute_jumps( int thread, int start_index, int rep );
+  void   write_lineage( void );
+  int    draw_number_of_jumps( Prng* prng, double human_activity_index );
+  double draw_jump_size( Prng* prng );
+  double compute_euclidean_distance( int index1, int index2 );
 
   /*----------------------------
    * PROTECTED ATTRIBUTES
@@ -78,6 +108,22 @@ protected:
   Graph*      _graph;      /*!< Graph structure   */
   int         _iteration;  /*!< Current iteration */
 
+  /*--------------------------------------- PARALLEL COMPUTING */
+
+  int                             _threads;         /*!< Number of threads                                */
+  std::vector<Prng*>              _thread_prngs;    /*!< Prng stream of each thread                       */
+  std::vector< std::vector<int> > _intro_nodes;     /*!< Introduced node indices buffered by each thread  */
+  std::vector< std::vector<int> > _intro_reps;      /*!< Introduction repetitions buffered by each thread */
+  std::vector< std::vector<lineage_record> > _lineage_buffers; /*!< Lineage tree records buffered by each thread */
+
+  /*--------------------------------------- LINEAGE TREE */
+
+  std::vector<char>                _lineage_file_buffer; /*!< Write buffer of the lineage tree file            */
+  std::ofstream                    _lineage_file;        /*!< Lineage tree file (open during the simulation)   */
+  std::vector<unsigned long long>  _geodesic_kernel;     /*!< Number of jumps by bin of geodesic distance      */
+  std::vector<unsigned long long>  _euclidean_kernel;    /*!< Number of jumps by bin of euclidean distance     */
+  std::vector< std::vector<int> >  _lineage_events;      /*!< Number of jumps by iteration and repetition      */
+
 };
 
 
@@ -151,6 +197,17 @@ inline double Simulation::get_score( void ) const
   return _graph->get_score();
 }
 
+/**
+ * \brief    Get the lower bound of the final optimization score
+ * \details  --
+ * \param    void
+ * \return   \e double
+ */
+inline double Simulation::get_score_bound( void ) const
+{
+  return _graph->get_score_bound();
+}
+
 /*----------------------------
  * SETTERS
  *----------------------------*/
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import os
+import sys
+import math
+import pytest
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+import evaluation
+
+SCENARIOS = ["1-isotropic", "2-human_activity", "3-road_network", "4-combined"]
+METRICS   = ["AUC", "d_th", "d", "TPR", "FPR", "ACC_th", "ACC", "F1_th", "F1", "KAPPA_th", "KAPPA", "QDIS", "ADIS", "TSS_th", "TSS"]
+
+### Load a row of score_distribution.txt (values as printed) ###
+def load_score_row( filename, rep ):
+  f      = open(filename, "r")
+  header = f.readline().strip("\n").split(" ")
+  for l in f:
+    row = dict(zip(header, l.strip("\n").split(" ")))
+    if row["REP"] == str(rep):
+      f.close()
+      return row
+  f.close()
+  return {}
+
+### The metrics of the last repetition (kept in output/) match evaluation.R to the printed precision ###
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_evaluate_final_state( scenario ):
+  folder = os.path.join(ROOT, "4_models_evaluation", scenario)
+  row    = load_score_row(os.path.join(folder, "score_distribution.txt"), 100)
+  result = evaluation.evaluate_final_state(os.path.join(folder, "output", "final_state.txt"))
+  for name in METRICS:
+    decimals = (len(row[name].split(".")[1]) if "." in row[name] else 0)
+    assert abs(result[name]-float(row[name])) <= 0.5*10**(-decimals)+1e-12, name+": "+str(result[name])+" != "+row[name]
+
+### Without spread, KAPPA is NaN at every threshold: the first threshold is kept, as in evaluation.R ###
+def test_no_spread():
+  p_obs   = np.array([1.0, 0.0, 1.0, 0.0])
+  n_obs   = np.array([1.0, 1.0, 1.0, 1.0])
+  p_sim   = np.zeros(4)
+  metrics = evaluation.compute_evaluation_metrics(p_obs, n_obs, p_sim)
+  result  = evaluation.build_best_metrics(metrics)
+  assert result["KAPPA_th"] == 0.0
+  assert math.isnan(result["KAPPA"])
+  assert result["TPR"] == 1.0
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import io
+import os
+import sys
+from multiprocessing.pool import ThreadPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+import HMD_model_optimize
+
+### Landscape returning fixed scores (score, censored flag) by run, in population order ###
+class Fixed_Landscape:
+
+  def __init__( self, results ):
+    self.results = results
+    self.runs    = 0
+
+  def run( self, run_params, repetitions, iterations, seed, score_cutoff=None, score_at=None ):
+    self.runs += 1
+    score, censored = self.results[self.runs-1]
+    return [[0.0, 0.0, 0.0, 0.0, score, censored]]
+
+### A censored candidate (lower bound 216, real score 5255) ranks after an uncensored one (300) ###
+def test_censored_candidate_ranks_last( tmpdir, monkeypatch ):
+  monkeypatch.chdir(str(tmpdir))
+  optimizer                     = HMD_model_optimize.Optimizer()
+  optimizer.score_cutoff_margin = 10.0
+  optimizer.best_score          = 200.0
+  optimizer.landscape           = Fixed_Landscape([(216.0, 1.0), (300.0, 0.0)])
+  optimizer.pool                = ThreadPool(1)
+  optimizer.open_output_file()
+  optimizer.write_output_file_header()
+  population = [optimizer.build_vector_of_parameters() for i in range(2)]
+  scores     = optimizer.evaluate_population(population)
+  optimizer.close_output_file()
+  optimizer.close_worker_pool()
+  assert scores[1] == 300.0
+  assert scores[0] > scores[1]
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  # The bound is written as it was        #
+  # returned, with its censored flag      #
+  #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+  f     = open("optimization.txt", "r")
+  lines = [l.strip("\n").split(" ") for l in f]
+  f.close()
+  assert lines[1][3] == "216.0" and lines[1][-1] == "1"
+  assert lines[2][3] == "300.0" and lines[2][-1] == "0"
+
+### Without uncensored candidates, the bounds are kept ###
+def test_all_censored():
+  optimizer = HMD_model_optimize.Optimizer()
+  assert optimizer.rank_censored_scores([216.0, 250.0], [True, True]) == [216.0, 250.0]
+
+### The extension module scores are written as HMD_model_run prints them ###
+def test_extension_scores_match_command_line():
+  extension = HMD_model_optimize.Optimizer()
+  extension.read_HMD_model_horizons([(227.3362195653372, 230.995386833232, 33.471072261700456, 230.995386833232, 227.3362195653372),
+                                     (525.9377081387921, 230.995386833232, 33.471072261700456, 230.995386833232, 525.9377081387921)])
+  command_line = HMD_model_optimize.Optimizer()
+  command_line.read_HMD_model_output("227.336 230.995 33.4711 230.995 227.336\n525.938 230.995 33.4711 230.995 525.938\n")
+  for optimizer in [extension, command_line]:
+    optimizer.score_iterations = [5]
+    optimizer.output_file      = io.StringIO()
+    optimizer.write_output_file_data()
+  assert extension.output_file.getvalue() == command_line.output_file.getvalue()
+  assert extension.current_score == 525.938 and extension.horizon_scores == [227.336, 525.938]